@@ -0,0 +1,70 @@
+import calendar
+
+import numpy as np
+import pytest
+
+from uniswap.buckets import bucket_boundaries
+from uniswap.buckets import get_bucket_index
+from uniswap.buckets import valid_tz_offset
+
+def utc(year, month, day, hour=0):
+    return calendar.timegm((year, month, day, hour, 0, 0));
+
+def test_day_boundaries():
+    starts = bucket_boundaries("day", utc(2019, 3, 1, 5), utc(2019, 3, 3));
+
+    assert starts.tolist() == [utc(2019, 3, 1), utc(2019, 3, 2), utc(2019, 3, 3)];
+
+def test_weeks_start_on_monday():
+    # 2019-03-06 was a wednesday
+    starts = bucket_boundaries("week", utc(2019, 3, 6), utc(2019, 3, 20));
+
+    assert starts.tolist() == [utc(2019, 3, 4), utc(2019, 3, 11), utc(2019, 3, 18)];
+
+def test_months_have_their_own_lengths():
+    starts = bucket_boundaries("month", utc(2019, 1, 15), utc(2019, 3, 15));
+
+    assert starts.tolist() == [utc(2019, 1, 1), utc(2019, 2, 1), utc(2019, 3, 1)];
+
+def test_boundaries_in_a_timezone():
+    # two hours east of utc, local midnight is 22:00 utc the day before
+    starts = bucket_boundaries("month", utc(2019, 3, 10), utc(2019, 3, 10), tz_offset_seconds=2 * 3600);
+
+    assert starts.tolist() == [utc(2019, 2, 28, 22)];
+
+def test_unknown_unit():
+    with pytest.raises(ValueError):
+        bucket_boundaries("fortnight", utc(2019, 1, 1), utc(2019, 2, 1));
+
+def test_timestamps_map_to_the_bucket_they_start_or_fall_in():
+    index = get_bucket_index("hour");
+
+    position = int(index.bucket_of(utc(2019, 3, 1, 13)));
+
+    assert index.bucket_start(position) == utc(2019, 3, 1, 13);
+    assert index.bucket_end(position) == utc(2019, 3, 1, 14) - 1;
+
+    assert index.bucket_of(np.array([utc(2019, 3, 1, 13) - 1, utc(2019, 3, 1, 14) - 1, utc(2019, 3, 1, 14)])).tolist() == [position - 1, position, position + 1];
+
+def test_before_the_first_bucket():
+    index = get_bucket_index("day");
+
+    assert int(index.bucket_of(utc(2016, 12, 31))) == -1;
+
+    # ranges starting before the first bucket are clamped to it
+    assert index.bucket_range(utc(2016, 12, 31), utc(2017, 1, 2)) == (0, 1);
+
+def test_labels():
+    index = get_bucket_index("month", 2 * 3600);
+
+    first, last = index.bucket_range(utc(2019, 2, 10), utc(2019, 4, 10));
+
+    assert index.labels(first, last) == ["2019-02", "2019-03", "2019-04"];
+
+def test_tz_offsets():
+    # utc, india, nepal, chatham islands, kiribati, baker island
+    for tz_offset in [0, 19800, 20700, 49500, 50400, -43200]:
+        assert valid_tz_offset(tz_offset);
+
+    for tz_offset in [1, -30, 50460, -50460, 10 ** 9]:
+        assert valid_tz_offset(tz_offset) == False;
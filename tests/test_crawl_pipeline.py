@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("eth_utils")
+
+from uniswap.crawl_pipeline import commit_batches
+from uniswap.crawl_pipeline import timestamp_pages
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+
+def batch(from_block, to_block, log_count):
+    return {"from_block" : from_block, "to_block" : to_block, "log_count" : log_count, "rows" : [], "transfers" : []};
+
+# records each commit and checkpoints past the batch like commit_batch
+class Committer:
+    def __init__(self):
+        self.commits = [];
+
+    def __call__(self, batch, checkpoint_block_number):
+        self.commits.append((checkpoint_block_number, batch["from_block"], batch["to_block"]));
+
+        return batch["to_block"] + 1;
+
+def test_empty_batches_are_checkpointed_with_the_next_batch_with_logs():
+    committer = Committer();
+
+    checkpoint = commit_batches(iter([batch(1, 10, 0), batch(11, 20, 3), batch(21, 30, 0), batch(31, 40, 0)]), committer, 1);
+
+    # the first empty batch is covered by the second's checkpoint, the trailing empty ones by one commit at the end
+    assert committer.commits == [(1, 11, 20), (21, 31, 40)];
+    assert checkpoint == 41;
+
+def test_a_range_without_logs_is_still_checkpointed_once():
+    committer = Committer();
+
+    assert commit_batches(iter([batch(1, 10, 0), batch(11, 20, 0)]), committer, 1) == 21;
+    assert committer.commits == [(1, 11, 20)];
+
+def test_each_batch_is_committed_before_the_next_is_produced():
+    events = [];
+
+    def batches():
+        for from_block in [1, 11, 21]:
+            events.append("produce " + str(from_block));
+            yield batch(from_block, from_block + 9, 1);
+
+    def commit(batch, checkpoint_block_number):
+        events.append("commit " + str(batch["from_block"]));
+        return batch["to_block"] + 1;
+
+    commit_batches(batches(), commit, 1);
+
+    assert events == ["produce 1", "commit 1", "produce 11", "commit 11", "produce 21", "commit 21"];
+
+def test_a_failed_commit_keeps_the_earlier_checkpoints():
+    committer = Committer();
+
+    def commit(batch, checkpoint_block_number):
+        if (batch["from_block"] == 21):
+            raise Exception("insert failed");
+
+        return committer(batch, checkpoint_block_number);
+
+    with pytest.raises(Exception):
+        commit_batches(iter([batch(1, 10, 1), batch(11, 20, 0), batch(21, 30, 1), batch(31, 40, 1)]), commit, 1);
+
+    # the empty batch before the failure was never checkpointed, the next crawl covers it again
+    assert committer.commits == [(1, 1, 10)];
+
+def test_pages_stop_short_of_the_first_block_without_a_timestamp():
+    pages = iter([
+        (1, 10, [{"blockNumber" : 5}, {"blockNumber" : 7}]),
+        (11, 20, [{"blockNumber" : 12}])
+    ]);
+
+    timestamped = list(timestamp_pages(EXCHANGE, pages, lambda block_numbers: {5 : 1550000000}));
+
+    # block 7 can't be timed yet, so the page ends at block 6 and nothing after it is crawled
+    assert [(page_from, page_to, [log["blockNumber"] for log in logs]) for page_from, page_to, logs in timestamped] == [(1, 6, [5])];
+    assert timestamped[0][2][0]["blockTimestamp"] == 1550000000;
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from uniswap import history_table
+
+from uniswap.history_export import export_page
+from uniswap.history_export import split_page
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+
+# 3 rows in every 5th transaction (an add liquidity with its transfers, say), one in the rest
+ROWS = [{"tx_order" : tx_order, "event" : str(i)} for tx_order in range(10000, 10050) for i in range(3 if (tx_order % 5 == 0) else 1)];
+
+@pytest.fixture(autouse=True)
+def normalized_table(monkeypatch):
+    monkeypatch.setattr(history_table, "has_normalized_columns", lambda exchange_address, version=1: True);
+
+# runs an export query over ROWS, honoring its tx_order bounds and limit like bigquery would
+class FakeQuery:
+    def __init__(self):
+        self.sql = [];
+
+    def __call__(self, sql):
+        self.sql.append(sql);
+
+        after = re.search(r"tx_order as INT64\) > (\d+)", sql);
+        to = re.search(r"tx_order as INT64\) <= (\d+)", sql);
+        limit = re.search(r"LIMIT (\d+)", sql);
+
+        rows = [row for row in ROWS if ((after is None) or (row["tx_order"] > int(after.group(1)))) and ((to is None) or (row["tx_order"] <= int(to.group(1))))];
+
+        return iter(rows[:int(limit.group(1))] if (limit is not None) else rows);
+
+def export_all(query, page_rows, after_tx_order=None, to_tx_order=None):
+    pages = [];
+
+    while (True):
+        rows, next_cursor = export_page(EXCHANGE, after_tx_order, to_tx_order, page_rows, query);
+        pages.append(rows);
+
+        if (next_cursor is None):
+            return pages;
+
+        after_tx_order = next_cursor;
+
+def test_following_the_cursor_exports_every_row_once():
+    query = FakeQuery();
+
+    pages = export_all(query, 7);
+
+    assert [row for page in pages for row in page] == ROWS;
+
+    # pages never end part way through a transaction's rows
+    for page, next_page in zip(pages, pages[1:]):
+        assert page[-1]["tx_order"] < next_page[0]["tx_order"];
+
+    assert all(["LIMIT 7" in sql for sql in query.sql]);
+
+def test_resuming_from_a_cursor_picks_up_after_it():
+    rows, next_cursor = export_page(EXCHANGE, None, None, 8, FakeQuery());
+
+    # tx 10005 has 3 rows and the 8th row is its first, so the page stops at 10004
+    assert [row["tx_order"] for row in rows] == [10000, 10000, 10000, 10001, 10002, 10003, 10004];
+    assert next_cursor == 10004;
+
+    rows, next_cursor = export_page(EXCHANGE, next_cursor, None, 8, FakeQuery());
+
+    assert rows[0]["tx_order"] == 10005;
+
+def test_the_last_page_has_no_cursor():
+    pages = export_all(FakeQuery(), 7, 10040, 10045);
+
+    assert [row for page in pages for row in page] == [row for row in ROWS if (10040 < row["tx_order"] <= 10045)];
+
+    rows, next_cursor = export_page(EXCHANGE, 10049, None, 7, FakeQuery());
+
+    assert (rows, next_cursor) == ([], None);
+
+def test_a_page_of_one_transaction_is_not_cut():
+    rows = [{"tx_order" : 10000}] * 3;
+
+    assert split_page(rows, 3) == (rows, 10000);
+    assert split_page(rows, 4) == (rows, None);
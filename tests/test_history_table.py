@@ -0,0 +1,29 @@
+import pytest
+
+from uniswap import history_table
+
+from uniswap.history_table import normalized_column
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+
+@pytest.fixture
+def normalized(monkeypatch):
+    monkeypatch.setattr(history_table, "has_normalized_columns", lambda exchange_address, version=1: True);
+
+@pytest.fixture
+def unnormalized(monkeypatch):
+    monkeypatch.setattr(history_table, "has_normalized_columns", lambda exchange_address, version=1: False);
+
+def test_normalized_columns_are_read_as_they_are(normalized):
+    assert normalized_column("tokens_norm", EXCHANGE, 1) == "tokens_norm";
+    assert normalized_column("price_after", EXCHANGE, 1, token_decimals=6) == "price_after";
+
+def test_rows_not_yet_backfilled_fall_back_to_their_amounts(normalized):
+    assert normalized_column("tokens_norm", EXCHANGE, 1, token_decimals=6) == "IFNULL(tokens_norm, CAST(CAST(tokens as BIGNUMERIC) as FLOAT64) / 1e6)";
+    assert normalized_column("eth_norm", EXCHANGE, 1, token_decimals=6) == "IFNULL(eth_norm, CAST(CAST(eth as BIGNUMERIC) as FLOAT64) / 1e18)";
+
+def test_tables_without_the_columns_compute_what_they_can(unnormalized):
+    assert normalized_column("cur_eth_norm", EXCHANGE, 1) == "CAST(CAST(cur_eth_total as BIGNUMERIC) as FLOAT64) / 1e18";
+    assert normalized_column("tokens_norm", EXCHANGE, 1) == "CAST(NULL as FLOAT64)";
+    assert normalized_column("tokens_norm", EXCHANGE, 1, token_decimals=0) == "CAST(CAST(tokens as BIGNUMERIC) as FLOAT64) / 1e0";
+    assert normalized_column("price_before", EXCHANGE, 1, token_decimals=18) == "CAST(NULL as FLOAT64)";
@@ -0,0 +1,144 @@
+import pytest
+
+pytest.importorskip("eth_utils")
+datastore = pytest.importorskip("google.cloud.datastore")
+
+from uniswap import price_index
+
+from uniswap.price_index import PriceIndex
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+
+# just enough of datastore.Client for the price index, counting the chunks each call reads
+class FakeDatastore:
+    def __init__(self):
+        self.entities = {};
+        self.chunk_reads = [];
+
+    def key(self, kind, name):
+        return datastore.Key(kind, name, project="test");
+
+    def get(self, key):
+        return self.entities.get(key.flat_path);
+
+    def get_multi(self, keys):
+        self.chunk_reads += [key.name for key in keys];
+
+        return [self.entities[key.flat_path] for key in keys if (key.flat_path in self.entities)];
+
+    def put(self, entity):
+        self.entities[entity.key.flat_path] = entity;
+
+    def put_multi(self, entities):
+        for entity in entities:
+            self.put(entity);
+
+def history_rows(first, last):
+    rows = [];
+
+    for i in range(first, last):
+        rows.append({
+            "tx_order" : i * 10000,
+            "timestamp" : 1550000000 + (i * 60),
+            "event" : "TokenPurchase",
+            "eth" : str(10 ** 18),
+            "tokens" : str(-(10 ** 18)),
+            "cur_eth_total" : str((100 + i) * (10 ** 18)),
+            "cur_tokens_total" : str((1000 - i) * (10 ** 18))
+        });
+
+    return rows;
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(price_index, "PRICE_INDEX_CHUNK_SIZE", 4);
+
+def assert_same_index(index, expected):
+    assert len(index) == len(expected);
+    assert index.tx_orders == expected.tx_orders;
+    assert index.eth_totals == expected.eth_totals;
+    assert index.cum_price_time == pytest.approx(expected.cum_price_time);
+    assert index.cum_volume == expected.cum_volume;
+    assert index.cum_volume_rate == pytest.approx(expected.cum_volume_rate);
+
+def test_batches_appended_across_chunks_match_one_build():
+    ds_client = FakeDatastore();
+
+    price_index.create_price_index(ds_client, EXCHANGE);
+
+    for first, last in [(0, 3), (3, 9), (9, 10), (10, 17)]:
+        price_index.update_price_index(ds_client, EXCHANGE, history_rows(first, last));
+
+    stored = PriceIndex(EXCHANGE);
+    assert price_index.refresh_price_index(ds_client, stored);
+
+    expected = PriceIndex(EXCHANGE);
+    expected.append_rows(history_rows(0, 17));
+
+    assert_same_index(stored, expected);
+
+def test_update_reads_only_the_last_chunk():
+    ds_client = FakeDatastore();
+
+    price_index.create_price_index(ds_client, EXCHANGE);
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(0, 10));
+
+    ds_client.chunk_reads = [];
+
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(10, 12));
+
+    # 10 snapshots fill chunks 0 and 1, the last one (8 and 9) is in chunk 2
+    assert ds_client.chunk_reads == [price_index.chunk_key_name(EXCHANGE, 2)];
+
+def test_retried_batch_appends_nothing():
+    ds_client = FakeDatastore();
+
+    price_index.create_price_index(ds_client, EXCHANGE);
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(0, 6));
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(3, 6));
+
+    stored = PriceIndex(EXCHANGE);
+    price_index.refresh_price_index(ds_client, stored);
+
+    assert len(stored) == 6;
+
+def test_refresh_pulls_only_new_chunks():
+    ds_client = FakeDatastore();
+
+    price_index.create_price_index(ds_client, EXCHANGE);
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(0, 9));
+
+    cached = PriceIndex(EXCHANGE);
+    price_index.refresh_price_index(ds_client, cached);
+
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(9, 14));
+
+    ds_client.chunk_reads = [];
+
+    price_index.refresh_price_index(ds_client, cached);
+
+    # starts from the chunk its last snapshot was in, which has grown since
+    assert ds_client.chunk_reads == [price_index.chunk_key_name(EXCHANGE, 2), price_index.chunk_key_name(EXCHANGE, 3)];
+
+    expected = PriceIndex(EXCHANGE);
+    expected.append_rows(history_rows(0, 14));
+
+    assert_same_index(cached, expected);
+
+def test_no_index_until_built():
+    ds_client = FakeDatastore();
+
+    price_index.update_price_index(ds_client, EXCHANGE, history_rows(0, 3));
+
+    assert price_index.refresh_price_index(ds_client, PriceIndex(EXCHANGE)) == False;
+
+def test_position_at_block_and_timestamp():
+    index = PriceIndex(EXCHANGE);
+    index.append_rows(history_rows(0, 5));
+
+    # block numbers cover every transaction in the block
+    assert index.position_at(2) == 2;
+    assert index.position_at(1550000000 + 150) == 2;
+
+    # before the first snapshot
+    assert index.position_at(1549999999) == -1;
@@ -0,0 +1,98 @@
+import copy
+import decimal
+import datetime
+
+from uniswap.query_cache import QueryResultCache
+from uniswap.query_cache import RedisResultStore
+from uniswap.query_cache import snap_end_time
+from uniswap.query_cache import encode_entry
+from uniswap.query_cache import decode_entry
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+
+# 10:05 on a 15 minute bucket
+NOW = 1550000000 - (1550000000 % 900) + 300
+
+def test_open_end_times_run_to_the_end_of_the_bucket():
+    # "now", a client clock a little behind, and the future all cover every trade up to now
+    for end_time in [NOW, NOW - 30, NOW + 60, NOW + 86400]:
+        assert snap_end_time(end_time, 900, NOW) == NOW + 600;
+
+def test_closed_end_times_are_left_alone():
+    assert snap_end_time(NOW - 600, 900, NOW) == NOW - 600;
+    assert snap_end_time(NOW - 86400, 900, NOW) == NOW - 86400;
+
+def test_a_boundary_is_its_own_bucket_end():
+    assert snap_end_time(NOW - 300, 900, NOW - 300) == NOW - 300;
+
+def test_rows_crawled_into_an_open_range_invalidate_it():
+    cache = QueryResultCache();
+
+    end_time = snap_end_time(NOW, 900, NOW);
+
+    cache.put("open", [{"n" : 1}], EXCHANGE, end_time);
+    cache.put("closed", [{"n" : 2}], EXCHANGE, NOW - 86400);
+
+    cache.invalidate_exchange(EXCHANGE, NOW + 10);
+
+    assert cache.get("open", EXCHANGE) is None;
+    assert cache.get("closed", EXCHANGE) == [{"n" : 2}];
+
+# what a result row can hold, as the bigquery client hands it back
+ROWS = [
+    {
+        "tx_order" : 70000010001,
+        "eth" : decimal.Decimal("123456789012345678901234567890.123456789"),
+        "eth_norm" : 1.5,
+        "timestamp" : datetime.datetime(2019, 2, 1, 12, 30, 15, 250000, tzinfo=datetime.timezone.utc),
+        "day" : datetime.date(2019, 2, 1),
+        "time" : datetime.time(12, 30, 15),
+        "tx_hash" : "0xabc",
+        "raw" : b"\x00\xff",
+        "user" : None,
+        "flags" : [True, False],
+        "tags" : ["a", "b"]
+    }
+]
+
+# just the redis commands RedisResultStore uses
+class FakeRedis:
+    def __init__(self):
+        self.values = {};
+
+    def get(self, key):
+        return self.values.get(key);
+
+    def set(self, key, value, ex=None):
+        assert isinstance(value, bytes);
+
+        self.values[key] = value;
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, b"0")) + 1).encode("utf-8");
+
+def redis_store(fake_redis):
+    store = RedisResultStore.__new__(RedisResultStore);
+    store.redis = fake_redis;
+
+    return store;
+
+def test_a_redis_hit_returns_the_rows_a_fresh_query_did():
+    fake_redis = FakeRedis();
+
+    # the instance that ran the query, and another that only has redis
+    querying = QueryResultCache(shared=redis_store(fake_redis));
+    other = QueryResultCache(shared=redis_store(fake_redis));
+
+    querying.put("key", copy.deepcopy(ROWS), EXCHANGE, NOW);
+
+    rows = other.get("key", EXCHANGE);
+
+    assert rows == ROWS;
+    assert [[type(value) for value in row.values()] for row in rows] == [[type(value) for value in row.values()] for row in ROWS];
+
+def test_values_json_cant_carry_round_trip_as_their_own_type():
+    for value in [decimal.Decimal("-0.000000000000000001"), datetime.datetime(2019, 2, 1), datetime.date(2019, 2, 1), datetime.time(0, 0), b""]:
+        decoded = decode_entry(encode_entry({"rows" : [{"value" : value}]}))["rows"][0]["value"];
+
+        assert (decoded, type(decoded)) == (value, type(value));
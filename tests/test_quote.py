@@ -0,0 +1,69 @@
+import pytest
+
+from uniswap.constant_product import PROVIDER_FEE
+from uniswap.constant_product import get_input_price
+from uniswap.constant_product import quote_amounts
+
+# 1000 eth against 2,000,000 of an 18 decimal token, 2000 tokens per eth
+RESERVES = {
+    "address" : "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667",
+    "token_address" : "0x0F5D2fB29fb7d3CFeE444a200298f468908cC942",
+    "symbol" : "MANA",
+    "token_decimals" : 18,
+
+    "eth" : 1000 * 10 ** 18,
+    "tokens" : 2000000 * 10 ** 18
+}
+
+def test_input_price_is_the_contracts_integer_payout():
+    input_amount = 12345678901234567890;
+
+    expected = (input_amount * 997 * RESERVES["tokens"]) // (RESERVES["eth"] * 1000 + input_amount * 997);
+
+    # amounts and reserves well past 2 ** 53, where floats would be off in the last wei
+    assert get_input_price(input_amount, RESERVES["eth"], RESERVES["tokens"]) == expected;
+
+def test_input_price_keeps_k_and_never_drains_the_pool():
+    outputs = [get_input_price(10 ** exponent, RESERVES["eth"], RESERVES["tokens"]) for exponent in range(10, 30)];
+
+    assert outputs == sorted(outputs);
+    assert all([output < RESERVES["tokens"] for output in outputs]);
+
+    for input_amount, output in zip([10 ** exponent for exponent in range(10, 30)], outputs):
+        assert (RESERVES["eth"] + input_amount) * (RESERVES["tokens"] - output) >= RESERVES["eth"] * RESERVES["tokens"];
+
+def test_input_price_of_nothing_and_of_an_empty_pool():
+    assert get_input_price(0, RESERVES["eth"], RESERVES["tokens"]) == 0;
+    assert get_input_price(10 ** 18, 0, 0) == 0;
+    assert get_input_price(0, 0, 0) == 0;
+
+def test_small_buys_fill_at_the_marginal_price_less_the_fee():
+    input_amounts, output_amounts, prices, price_impacts = quote_amounts(RESERVES, "buy", [0, 10 ** 12, 10 ** 20, 10 ** 21]);
+
+    assert input_amounts == [0, 10 ** 12, 10 ** 20, 10 ** 21];
+    assert output_amounts == [get_input_price(amount, RESERVES["eth"], RESERVES["tokens"]) for amount in input_amounts];
+
+    assert price_impacts[0] == 0;
+    assert prices[0] == 0;
+
+    assert price_impacts[1] == pytest.approx(PROVIDER_FEE, abs=1e-6);
+    assert prices[1] == pytest.approx(2000 * (1 - PROVIDER_FEE), rel=1e-6);
+
+    # bigger trades move the price further
+    assert price_impacts[1] < price_impacts[2] < price_impacts[3] < 1;
+
+def test_sells_give_up_more_tokens_per_eth():
+    input_amounts, output_amounts, prices, price_impacts = quote_amounts(RESERVES, "sell", [1, 10 ** 15, 10 ** 22]);
+
+    assert output_amounts == [get_input_price(amount, RESERVES["tokens"], RESERVES["eth"]) for amount in input_amounts];
+
+    # one base unit of the token pays out no eth at all
+    assert output_amounts[0] == 0;
+    assert price_impacts[0] == 1;
+    assert prices[0] == 0;
+
+    # tokens per eth, like the buy side, so a small sell is the marginal price plus the fee
+    assert prices[1] == pytest.approx(2000 / (1 - PROVIDER_FEE), rel=1e-6);
+    assert price_impacts[1] == pytest.approx(1 / (1 - PROVIDER_FEE) - 1, rel=1e-4);
+
+    assert price_impacts[1] < price_impacts[2];
@@ -0,0 +1,187 @@
+import random
+
+import numpy as np
+
+from uniswap.sketches import SpaceSaving
+from uniswap.sketches import HyperLogLog
+from uniswap.sketches import TDigest
+from uniswap.sketches import encode_sketch
+from uniswap.sketches import decode_sketch
+
+# a skewed stream of (address, weight): a few whales and a long tail
+def trades(seed, count, addresses):
+    rng = random.Random(seed);
+
+    return [("0x" + str(int(rng.paretovariate(1.2)) % addresses).zfill(40), rng.randint(1, 10 ** 18) * 10 ** 6) for i in range(count)];
+
+def true_totals(stream):
+    totals = {};
+
+    for item, weight in stream:
+        totals[item] = totals.get(item, 0) + weight;
+
+    return totals;
+
+def space_saving(stream, capacity):
+    sketch = SpaceSaving(capacity);
+
+    for item, weight in stream:
+        sketch.update(item, weight);
+
+    return sketch;
+
+def assert_bounds(sketch, totals):
+    for item, count, error in sketch.top(sketch.capacity):
+        assert count - error <= totals[item] <= count;
+
+    # anything not tracked totals at most min_count
+    for item, total in totals.items():
+        if ((item in sketch.counters) == False):
+            assert total <= sketch.min_count();
+
+def test_space_saving_is_exact_under_capacity():
+    stream = trades(1, 500, 20);
+    totals = true_totals(stream);
+
+    sketch = space_saving(stream, 50);
+
+    assert sketch.min_count() == 0;
+    assert sorted([(item, count) for item, count, error in sketch.top(50)]) == sorted(totals.items());
+    assert all([error == 0 for item, count, error in sketch.top(50)]);
+
+def test_space_saving_bounds_hold_past_capacity():
+    stream = trades(2, 5000, 1000);
+    totals = true_totals(stream);
+
+    sketch = space_saving(stream, 50);
+
+    assert len(sketch.counters) == 50;
+    assert_bounds(sketch, totals);
+
+    # the heaviest item is the top counter, largest first
+    top = sketch.top(5);
+
+    assert top[0][0] == max(totals.keys(), key=lambda item: totals[item]);
+    assert [count for item, count, error in top] == sorted([count for item, count, error in top], reverse=True);
+
+def test_space_saving_merge_bounds_both_streams():
+    first = trades(3, 3000, 1000);
+    second = trades(4, 3000, 1000);
+
+    totals = true_totals(first + second);
+
+    merged = space_saving(first, 50).merge(space_saving(second, 50));
+
+    assert len(merged.counters) == 50;
+    assert_bounds(merged, totals);
+
+def test_space_saving_round_trips_wei_counts():
+    sketch = space_saving(trades(5, 2000, 500), 50);
+
+    decoded = decode_sketch(SpaceSaving, encode_sketch(sketch));
+
+    assert decoded.capacity == 50;
+    assert decoded.counters == sketch.counters;
+
+def addresses(start, count):
+    return ["0x" + str(i).zfill(40) for i in range(start, start + count)];
+
+def hyper_log_log(items):
+    sketch = HyperLogLog();
+
+    for item in items:
+        sketch.add(item);
+
+    return sketch;
+
+def test_hyper_log_log_counts_within_its_error():
+    for count in [0, 10, 1000, 50000]:
+        sketch = hyper_log_log(addresses(0, count));
+
+        assert abs(sketch.count() - count) <= 3 * sketch.relative_error() * count + 1;
+
+def test_hyper_log_log_ignores_repeats():
+    sketch = hyper_log_log(addresses(0, 1000) * 5);
+
+    assert sketch.count() == hyper_log_log(addresses(0, 1000)).count();
+
+def test_hyper_log_log_merge_is_the_union():
+    first = addresses(0, 30000);
+    second = addresses(20000, 30000);
+
+    merged = hyper_log_log(first).merge(hyper_log_log(second));
+
+    # exactly the sketch of both streams, overlap counted once
+    assert (merged.registers == hyper_log_log(first + second).registers).all();
+    assert abs(merged.count() - 50000) <= 3 * merged.relative_error() * 50000;
+
+def test_hyper_log_log_round_trips():
+    sketch = hyper_log_log(addresses(0, 5000));
+
+    decoded = decode_sketch(HyperLogLog, encode_sketch(sketch));
+
+    assert decoded.precision == sketch.precision;
+    assert (decoded.registers == sketch.registers).all();
+    assert decoded.count() == sketch.count();
+
+QUANTILES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+def t_digest(values):
+    sketch = TDigest();
+
+    for value in values:
+        sketch.add(value);
+
+    return sketch;
+
+def test_t_digest_quantiles_of_a_uniform_stream():
+    values = np.random.RandomState(6).uniform(0, 1000, 20000);
+
+    sketch = t_digest(values);
+
+    # uniform on [0, 1000], so quantile q is 1000 q, and the tails are tighter than the middle
+    for q, estimate in zip(QUANTILES, sketch.quantiles(QUANTILES)):
+        assert abs(estimate - np.quantile(values, q)) <= 1000 * max(0.01 * min(q, 1 - q) * 4, 0.001);
+
+    assert len(sketch.means) <= 2 * sketch.compression;
+    assert sketch.total_weight() == 20000;
+
+def test_t_digest_ends_are_the_exact_min_and_max():
+    values = np.random.RandomState(7).lognormal(0, 2, 5000);
+
+    sketch = t_digest(values);
+
+    assert sketch.quantiles([0, 1]) == [values.min(), values.max()];
+    assert (sketch.min, sketch.max) == (values.min(), values.max());
+
+def test_t_digest_merge_matches_one_digest_of_both_streams():
+    rng = np.random.RandomState(8);
+
+    first = rng.uniform(0, 500, 10000);
+    second = rng.uniform(500, 1000, 10000);
+
+    merged = t_digest(first).merge(t_digest(second));
+    both = np.concatenate([first, second]);
+
+    assert merged.total_weight() == 20000;
+    assert (merged.min, merged.max) == (both.min(), both.max());
+
+    for q, estimate in zip(QUANTILES, merged.quantiles(QUANTILES)):
+        assert abs(estimate - np.quantile(both, q)) <= 1000 * max(0.01 * min(q, 1 - q) * 4, 0.001);
+
+def test_t_digest_merge_into_empty():
+    merged = TDigest().merge(t_digest([3, 1, 2]));
+
+    assert merged.quantiles([0, 1]) == [1, 3];
+
+def test_t_digest_without_values():
+    assert TDigest().quantiles([0.5, 0.99]) == [None, None];
+    assert TDigest().total_weight() == 0;
+
+def test_t_digest_round_trips():
+    sketch = t_digest(np.random.RandomState(9).uniform(0, 1000, 5000));
+
+    decoded = decode_sketch(TDigest, encode_sketch(sketch));
+
+    assert decoded.compression == sketch.compression;
+    assert decoded.quantiles(QUANTILES) == sketch.quantiles(QUANTILES);
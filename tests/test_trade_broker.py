@@ -0,0 +1,140 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("eth_utils")
+
+from uniswap import trade_broker
+
+from uniswap.trade_broker import TradeBroker
+from uniswap.trade_broker import publish_trades
+
+EXCHANGE = "0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667"
+OTHER_EXCHANGE = "0x09cabEC1eAd1c0Ba254B09efb3EE13841712bE14"
+
+def row(tx_order):
+    return {
+        "tx_order" : tx_order,
+        "event" : "TokenPurchase",
+        "user" : "0x0000000000000000000000000000000000000001",
+        "timestamp" : 1550000000,
+        "tx_hash" : "0x" + str(tx_order).zfill(64),
+        "block" : tx_order // 10000,
+        "tx_index" : tx_order % 10000,
+        "eth" : str(10 ** 18),
+        "tokens" : str(-2 * 10 ** 18),
+        "cur_eth_total" : str(100 * 10 ** 18),
+        "cur_tokens_total" : str(200 * 10 ** 18)
+    }
+
+def drain(subscription):
+    messages = [];
+
+    while (subscription.queue.empty() == False):
+        messages.append(subscription.queue.get_nowait());
+
+    return messages;
+
+# an in-memory stand in for the redis channel, shared by the brokers of several "instances"
+class FakeChannel:
+    def __init__(self):
+        self.listeners = [];
+        self.published = [];
+
+    def publish(self, topic, messages):
+        self.published.append((topic, messages));
+
+        for deliver in self.listeners:
+            for message in messages:
+                deliver(topic, message);
+
+    # blocks like redis pubsub, for as long as the test runs
+    def listen(self, deliver):
+        self.listeners.append(deliver);
+
+        threading.Event().wait();
+
+def test_messages_reach_only_their_topic():
+    broker = TradeBroker();
+
+    subscription = broker.subscribe(EXCHANGE);
+    other = broker.subscribe(OTHER_EXCHANGE);
+
+    broker.publish(EXCHANGE, [{"n" : 1}, {"n" : 2}]);
+
+    assert drain(subscription) == [{"n" : 1}, {"n" : 2}];
+    assert drain(other) == [];
+
+def test_subscribers_are_capped_per_instance():
+    broker = TradeBroker(max_subscribers=2);
+
+    first = broker.subscribe(EXCHANGE);
+    assert broker.subscribe(OTHER_EXCHANGE) is not None;
+    assert broker.subscribe(EXCHANGE) is None;
+
+    broker.unsubscribe(first);
+
+    assert broker.subscribe(EXCHANGE) is not None;
+
+def test_a_slow_subscriber_is_dropped_without_holding_up_the_rest():
+    broker = TradeBroker(max_queued=2);
+
+    slow = broker.subscribe(EXCHANGE);
+    fast = broker.subscribe(EXCHANGE);
+
+    for n in range(3):
+        broker.publish(EXCHANGE, [{"n" : n}]);
+
+        # the fast subscriber keeps up
+        assert drain(fast) == [{"n" : n}];
+
+    assert slow.dropped;
+    assert fast.dropped == False;
+    assert broker.subscriber_count(EXCHANGE) == 1;
+
+def test_a_shared_channel_reaches_subscribers_on_every_instance():
+    channel = FakeChannel();
+
+    crawling = TradeBroker(channel=channel);
+    serving = TradeBroker(channel=channel);
+
+    # the first subscriber starts the serving instance's listener
+    subscription = serving.subscribe(EXCHANGE);
+
+    deadline = time.time() + 5;
+
+    while ((len(channel.listeners) == 0) and (time.time() < deadline)):
+        time.sleep(0.01);
+
+    assert channel.listeners == [serving.deliver];
+
+    crawling.publish(EXCHANGE, [{"n" : 1}]);
+
+    assert drain(subscription) == [{"n" : 1}];
+
+def test_publish_trades_sends_rows_in_tx_order(monkeypatch):
+    broker = TradeBroker();
+
+    monkeypatch.setattr(trade_broker, "get_trade_broker", lambda: broker);
+
+    subscription = broker.subscribe(EXCHANGE);
+
+    publish_trades(EXCHANGE, [row(20002), row(20001)]);
+
+    messages = drain(subscription);
+
+    assert [message["transaction_index"] for message in messages] == [1, 2];
+    assert messages[0]["ethAmount"] == str(10 ** 18);
+    assert messages[0]["price"] == 2;
+
+def test_publish_trades_goes_through_the_channel_even_without_local_subscribers(monkeypatch):
+    channel = FakeChannel();
+    broker = TradeBroker(channel=channel);
+
+    monkeypatch.setattr(trade_broker, "get_trade_broker", lambda: broker);
+
+    publish_trades(EXCHANGE, [row(20001)]);
+    publish_trades(EXCHANGE, []);
+
+    assert [(topic, len(messages)) for topic, messages in channel.published] == [(EXCHANGE, 1)];
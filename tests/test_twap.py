@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("eth_utils")
+
+from uniswap.price_index import PriceIndex
+
+# price 10 tokens per eth from t=100, a buy moves it to 2.5 at t=200 and a sell moves it back to 10 at t=400
+ROWS = [
+    {"tx_order" : 10000, "timestamp" : 100, "event" : "AddLiquidity", "eth" : "100", "tokens" : "1000", "cur_eth_total" : "100", "cur_tokens_total" : "1000"},
+    {"tx_order" : 20000, "timestamp" : 200, "event" : "TokenPurchase", "eth" : "100", "tokens" : "-500", "cur_eth_total" : "200", "cur_tokens_total" : "500"},
+    {"tx_order" : 40000, "timestamp" : 400, "event" : "EthPurchase", "eth" : "-100", "tokens" : "500", "cur_eth_total" : "100", "cur_tokens_total" : "1000"}
+]
+
+@pytest.fixture
+def index():
+    index = PriceIndex("0x2a1530C4C41db0B0b2bB646CB5Eb1A67b7158667");
+    index.append_rows(ROWS);
+
+    return index;
+
+def test_twap_weights_each_price_by_how_long_it_held(index):
+    assert index.twap(100, 400) == pytest.approx(((10 * 100) + (2.5 * 200)) / 300);
+    assert index.twap(150, 250) == pytest.approx(((10 * 50) + (2.5 * 50)) / 100);
+
+    # the last price holds past the last snapshot
+    assert index.twap(400, 500) == pytest.approx(10);
+
+def test_twap_ignores_time_before_the_first_snapshot(index):
+    assert index.twap(0, 200) == pytest.approx(10);
+
+    assert index.twap(0, 50) is None;
+
+def test_twap_of_an_instant_is_the_price_then(index):
+    assert index.twap(300, 300) == pytest.approx(2.5);
+
+def test_vwap_weights_trades_by_eth_volume_at_the_price_before_them(index):
+    price, volume = index.vwap(0, 1000);
+
+    assert volume == 200;
+    assert price == pytest.approx(((100 * 10) + (100 * 2.5)) / 200);
+
+def test_vwap_window_is_inclusive(index):
+    assert index.vwap(200, 200) == (pytest.approx(10), 100);
+    assert index.vwap(200, 400)[0] == pytest.approx(6.25);
+
+def test_vwap_without_trades(index):
+    # liquidity events aren't trades
+    assert index.vwap(0, 150) == (None, 0);
+    assert index.vwap(250, 300) == (None, 0);
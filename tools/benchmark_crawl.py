@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+from collections import OrderedDict
+
+# make the uniswap package importable when run as python tools/benchmark_crawl.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Runs the crawl pipeline for one exchange over a block range, crawl by crawl like /tasks/crawl, and reports
+# logs/sec, rows/sec and the time spent in each phase.
+#
+# Record the provider traffic for a range once, then replay it offline as often as needed (optionally with
+# injected latency and errors, see uniswap/rpc_fixtures.py):
+#   python tools/benchmark_crawl.py record --exchange 0x... --from-block 7000000 --to-block 7100000 --fixtures fixtures/
+#   python tools/benchmark_crawl.py replay --exchange 0x... --from-block 7000000 --to-block 7100000 --fixtures fixtures/ --latency-ms 50
+#
+# Each crawl goes through the crawler's own fetch_log_pages -> timestamp_pages -> decode_pages -> commit_batches, so
+# paging (CRAWL_PAGE_BLOCKS), transfers, normalization and the empty page deferral are the crawler's. Block
+# timestamps come from the provider (the crawler's backfill path) rather than bigquery, and in place of
+# commit_batch each page's rows are serialized for insertion and appended to an in-memory price index without
+# writing to bigquery / datastore, so only the rpc side needs fixtures. Running totals start from zero at
+# --from-block.
+
+# getLogs, timestamps and decode are the pipeline's generator stages, timed by what each adds to the one before
+PIPELINE_PHASES = ["getLogs", "timestamps", "decode"]
+
+PHASES = ["getBlock"] + PIPELINE_PHASES + ["commit"]
+
+class PhaseTimer:
+	def __init__(self):
+		self.seconds = OrderedDict([(phase, 0.0) for phase in PHASES]);
+
+	def time(self, phase, function, *args):
+		start = time.perf_counter();
+
+		try:
+			return function(*args);
+		finally:
+			self.seconds[phase] += time.perf_counter() - start;
+
+	# passes a generator stage's items through, adding the time spent producing them (upstream stages included) to phase
+	def stage(self, phase, items):
+		items = iter(items);
+
+		while (True):
+			start = time.perf_counter();
+
+			try:
+				item = next(items);
+			except StopIteration:
+				return;
+			finally:
+				self.seconds[phase] += time.perf_counter() - start;
+
+			yield item;
+
+	# seconds per phase, with each pipeline stage's upstream time taken out
+	def own_seconds(self):
+		seconds = OrderedDict(self.seconds);
+
+		for upstream, phase in reversed(list(zip(PIPELINE_PHASES, PIPELINE_PHASES[1:]))):
+			seconds[phase] -= self.seconds[upstream];
+
+		return seconds;
+
+# what commit_batch does to a decoded page short of writing it: the insert_rows payloads for every history table
+# version we write, and the price index append. returns the new checkpoint like commit_batch
+def benchmark_commit(exchange_address, price_index, batch, totals):
+	from uniswap.config import HISTORY_WRITE_VERSIONS
+
+	from uniswap.crawl import INSERT_BATCH_SIZE
+
+	from uniswap.history_table import history_row
+
+	rows = batch["rows"];
+
+	for version in HISTORY_WRITE_VERSIONS:
+		for start in range(0, len(rows), INSERT_BATCH_SIZE):
+			json.dumps([history_row(exchange_address, row, version) for row in rows[start:start + INSERT_BATCH_SIZE]]);
+
+	price_index.append_rows(rows);
+
+	totals["logs"] += batch["log_count"];
+	totals["rows"] += len(rows);
+	totals["transfers"] += len(batch["transfers"]);
+
+	totals["cur_eth_total"] = batch["cur_eth_total"];
+	totals["cur_tokens_total"] = batch["cur_tokens_total"];
+
+	return batch["to_block"] + 1;
+
+# one /tasks/crawl call over [from_block, to_block], returns the checkpoint it got to
+def crawl(web3, exchange_address, from_block, to_block, token_decimals, timer, price_index, totals):
+	from uniswap.config import CRAWL_PAGE_BLOCKS
+
+	from uniswap.blocks import fetch_block_timestamps
+
+	from uniswap.crawl_pipeline import fetch_log_pages
+	from uniswap.crawl_pipeline import timestamp_pages
+	from uniswap.crawl_pipeline import decode_pages
+	from uniswap.crawl_pipeline import commit_batches
+
+	timer.time("getBlock", web3.eth.getBlock, "latest");
+
+	pages = timer.stage("getLogs", fetch_log_pages(web3, exchange_address, from_block, to_block, CRAWL_PAGE_BLOCKS));
+	pages = timer.stage("timestamps", timestamp_pages(exchange_address, pages, fetch_block_timestamps));
+
+	batches = timer.stage("decode", decode_pages(pages, totals["cur_eth_total"], totals["cur_tokens_total"], token_decimals));
+
+	checkpoint = {"block" : from_block};
+
+	def commit(batch, checkpoint_block_number):
+		checkpoint["block"] = timer.time("commit", benchmark_commit, exchange_address, price_index, batch, totals);
+
+		return checkpoint["block"];
+
+	try:
+		commit_batches(batches, commit, from_block);
+	except Exception as e:
+		# the crawler returns a 500 and the next crawl picks up from the last committed page
+		print("  blocks " + str(checkpoint["block"]) + "-" + str(to_block) + " failed: " + str(e));
+
+	return checkpoint["block"];
+
+def main():
+	parser = argparse.ArgumentParser(description="benchmark the crawl pipeline against recorded rpc fixtures")
+	parser.add_argument("mode", choices=["record", "replay"])
+	parser.add_argument("--exchange", required=True)
+	parser.add_argument("--from-block", type=int, required=True)
+	parser.add_argument("--to-block", type=int, required=True)
+	parser.add_argument("--fixtures", required=True, help="fixture directory to record to / replay from")
+	parser.add_argument("--token-decimals", type=int, default=18, help="decimals of the exchange's token, for the normalized amounts")
+	parser.add_argument("--blocks-per-crawl", type=int, help="blocks per crawl (default the crawler's MAX_BLOCKS_TO_CRAWL)")
+	parser.add_argument("--latency-ms", type=float, default=0, help="replay only: latency added to every rpc round trip")
+	parser.add_argument("--error-rate", type=float, default=0, help="replay only: fraction of rpc round trips that fail")
+	parser.add_argument("--max-retries", type=int, default=3, help="failed crawls in a row before giving up on the range")
+	args = parser.parse_args()
+
+	# the rpc provider is picked from the environment when it's first created
+	if (args.mode == "record"):
+		os.environ["RPC_RECORD_DIR"] = args.fixtures;
+	else:
+		os.environ["RPC_REPLAY_DIR"] = args.fixtures;
+		os.environ["RPC_REPLAY_LATENCY_MS"] = str(args.latency_ms);
+		os.environ["RPC_REPLAY_ERROR_RATE"] = str(args.error_rate);
+
+	from uniswap.clients import get_web3
+
+	from uniswap.crawl import MAX_BLOCKS_TO_CRAWL
+
+	from uniswap.price_index import PriceIndex
+
+	from eth_utils import to_checksum_address
+
+	exchange_address = to_checksum_address(args.exchange);
+
+	blocks_per_crawl = args.blocks_per_crawl or MAX_BLOCKS_TO_CRAWL;
+
+	web3 = get_web3();
+
+	timer = PhaseTimer();
+
+	price_index = PriceIndex(exchange_address);
+
+	totals = {"logs" : 0, "rows" : 0, "transfers" : 0, "cur_eth_total" : 0, "cur_tokens_total" : 0};
+
+	failed_crawls = 0;
+	failures_in_a_row = 0;
+
+	checkpoint = args.from_block;
+
+	start = time.perf_counter();
+
+	while (checkpoint <= args.to_block):
+		to_block = min(checkpoint + blocks_per_crawl - 1, args.to_block);
+
+		next_checkpoint = crawl(web3, exchange_address, checkpoint, to_block, args.token_decimals, timer, price_index, totals);
+
+		# a crawl that stops short failed part way, the next one retries from where it got to
+		if (next_checkpoint <= to_block):
+			failed_crawls += 1;
+			failures_in_a_row += 1;
+
+			if (failures_in_a_row > args.max_retries):
+				print("  giving up on blocks " + str(next_checkpoint) + "-" + str(to_block));
+				next_checkpoint = to_block + 1;
+		else:
+			failures_in_a_row = 0;
+
+		checkpoint = next_checkpoint;
+
+	elapsed = time.perf_counter() - start;
+
+	print(args.mode + " " + exchange_address + " blocks " + str(args.from_block) + "-" + str(args.to_block) + " in " + str(round(elapsed, 3)) + "s");
+	print("  " + str(totals["logs"]) + " logs (" + str(round(totals["logs"] / elapsed, 1)) + " logs/sec), "
+		+ str(totals["rows"]) + " rows (" + str(round(totals["rows"] / elapsed, 1)) + " rows/sec), "
+		+ str(totals["transfers"]) + " transfers, " + str(failed_crawls) + " failed crawls");
+
+	for phase, seconds in timer.own_seconds().items():
+		print("  " + phase.ljust(12) + str(round(seconds, 3)).rjust(10) + "s " + str(round(100 * seconds / elapsed, 1)).rjust(6) + "%");
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# make the uniswap package importable when run as python tools/benchmark_ticker.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.query_cache import snap_end_time
+
+from uniswap.ticker import TICKER_NUM_HOURS
+from uniswap.ticker import ticker_rows_sql
+from uniswap.ticker import ticker_aggregate_sql
+from uniswap.ticker import aggregate_ticker_rows
+from uniswap.ticker import ticker_stats_from_aggregate
+
+from uniswap.clients import get_bigquery_client
+
+from eth_utils import to_checksum_address
+
+# Computes one exchange's ticker both ways (see TICKER_AGGREGATION in uniswap/config.py) with bigquery's cache
+# off, and reports wall time, bytes processed and the size of the result each pulls back, then checks that both
+# produce the same stats.
+#   python tools/benchmark_ticker.py --exchange 0x... --runs 5
+
+def run(bq_client, sql):
+	from google.cloud import bigquery
+
+	job_config = bigquery.QueryJobConfig();
+	job_config.use_query_cache = False;
+
+	start = time.perf_counter();
+
+	query_job = bq_client.query(sql, job_config=job_config);
+	rows = [dict(row.items()) for row in query_job.result()];
+
+	return rows, time.perf_counter() - start, query_job.total_bytes_processed;
+
+def main():
+	parser = argparse.ArgumentParser(description="compare the aggregate ticker query against aggregating every row in python")
+	parser.add_argument("--exchange", required=True)
+	parser.add_argument("--runs", type=int, default=3, help="runs of each query")
+	args = parser.parse_args()
+
+	exchange_address = to_checksum_address(args.exchange);
+
+	end_time = snap_end_time(int(time.time()));
+	start_time = end_time - (60 * 60 * TICKER_NUM_HOURS);
+
+	bq_client = get_bigquery_client();
+
+	stats = {};
+
+	for mode, sql, aggregate in [
+		("python", ticker_rows_sql(exchange_address, start_time, end_time), aggregate_ticker_rows),
+		("sql", ticker_aggregate_sql(exchange_address, start_time, end_time), lambda rows: ticker_stats_from_aggregate(rows[0]))]:
+		timings = [];
+
+		for i in range(args.runs):
+			rows, seconds, bytes_processed = run(bq_client, sql);
+
+			aggregate_start = time.perf_counter();
+			stats[mode] = aggregate(rows);
+			timings.append(seconds + time.perf_counter() - aggregate_start);
+
+		print(mode.ljust(8) + " median " + str(round(sorted(timings)[len(timings) // 2], 3)) + "s, "
+			+ str(bytes_processed) + " bytes processed, " + str(len(rows)) + " rows / "
+			+ str(len(json.dumps(rows, default=str))) + " bytes returned");
+
+	# floats summed in a different order can differ in the last few bits
+	for key in sorted(stats["python"].keys()):
+		python_value = stats["python"][key];
+		sql_value = stats["sql"][key];
+
+		if (isinstance(python_value, float) or isinstance(sql_value, float)):
+			same = abs(float(python_value) - float(sql_value)) <= 1e-9 * max(1, abs(float(python_value)));
+		else:
+			same = (python_value == sql_value);
+
+		if (same == False):
+			print("  mismatch " + key + ": python " + str(python_value) + ", sql " + str(sql_value));
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import argparse
+
+# make the uniswap package importable when run as python tools/build_daily_sketches.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.query_cache import iter_query
+
+from uniswap.daily_sketches import SKETCHES
+from uniswap.daily_sketches import row_day
+from uniswap.daily_sketches import load_day_entities
+from uniswap.daily_sketches import feed_entities
+
+# Backfills the daily trade sketches (see uniswap/daily_sketches.py) from history crawled before the crawler fed
+# them, or before a sketch was added to SKETCHES.
+#
+# Only rows below the exchange's checkpoint when we start, and below the first block the crawler fed each day's
+# sketch, are backfilled, each day in one transaction that then marks the sketch complete for that day (first
+# block 0). So this is safe to run while the crawler is running and to re-run.
+
+def history_sql(exchange_address, before_block):
+	return """
+		SELECT CAST(event as STRING) as event, CAST(user as STRING) as user, CAST(block as INT64) as block,
+			""" + timestamp_column() + """ as timestamp, CAST(eth as STRING) as eth
+		FROM """ + history_table_name(exchange_address) + """
+		WHERE """ + history_filter(exchange_address) + """ and block < """ + str(before_block) + """
+		GROUP BY event, tx_hash, user, block, timestamp, eth, tokens
+		ORDER BY timestamp asc""";
+
+# feeds one day's rows to the given sketches of the exchange's day entity and its all exchanges shard's
+def backfill_day(ds_client, exchange_address, day, rows, names, before_block):
+	fed = 0;
+
+	with ds_client.transaction():
+		exchange_day, all_day = load_day_entities(ds_client, exchange_address, [day])[0];
+
+		first_blocks = json.loads(exchange_day["first_blocks"]);
+
+		for name in names:
+			# already complete for this day
+			if (first_blocks.get(name) == 0):
+				continue;
+
+			limit = min(first_blocks.get(name, before_block), before_block);
+
+			day_rows = [row for row in rows if row["block"] < limit];
+
+			feed_entities([exchange_day, all_day], name, day_rows);
+
+			first_blocks[name] = 0;
+
+			fed += len(day_rows);
+
+		exchange_day["first_blocks"] = json.dumps(first_blocks);
+
+		ds_client.put_multi([exchange_day, all_day]);
+
+	return fed;
+
+def build_exchange(ds_client, exchange_info, names):
+	exchange_address = exchange_info["address"];
+
+	# the crawler feeds everything from its checkpoint on
+	before_block = exchange_info["last_updated_block"];
+
+	fed = 0;
+
+	day = None;
+	rows = [];
+
+	for row in iter_query(history_sql(exchange_address, before_block)):
+		if ((day is not None) and (row_day(row) != day)):
+			fed += backfill_day(ds_client, exchange_address, day, rows, names, before_block);
+			rows = [];
+
+		day = row_day(row);
+		rows.append(row);
+
+	if (day is not None):
+		fed += backfill_day(ds_client, exchange_address, day, rows, names, before_block);
+
+	print("fed " + str(fed) + " history rows to the " + ", ".join(names) + " sketches of " + exchange_address);
+
+def main():
+	parser = argparse.ArgumentParser(description="backfill the daily trade sketches from exchange history")
+	parser.add_argument("--exchange", help="only backfill this exchange address (default all exchanges in datastore)")
+	parser.add_argument("--sketch", action="append", choices=list(SKETCHES.keys()), help="only backfill this sketch (default all of them)")
+	args = parser.parse_args()
+
+	ds_client = get_datastore_client();
+
+	for exchange_info in ds_client.query(kind='exchange').fetch():
+		if ((args.exchange is None) or (exchange_info["address"].lower() == args.exchange.lower())):
+			build_exchange(ds_client, exchange_info, args.sketch or list(SKETCHES.keys()));
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import argparse
+
+# make the uniswap package importable when run as python tools/build_lp_shares.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.config import GENSIS_BLOCK_NUMBER
+
+from uniswap.clients import get_datastore_client
+from uniswap.clients import get_web3
+
+from uniswap.blocks import fetch_block_timestamps
+
+from uniswap.decode import serialize_log
+from uniswap.decode import load_topic_hashes
+from uniswap.decode import decode_transfer_log
+
+from uniswap.lp_shares import apply_transfers
+
+from eth_utils import to_checksum_address
+
+# Indexes the pool token Transfer events of exchanges crawled before the crawler indexed them (see
+# uniswap/lp_shares.py), from the uniswap genesis block up to each exchange's crawl checkpoint.
+#
+# The crawler keeps going meanwhile but leaves transfers alone until the exchange has a pool_token_supply, so we
+# catch up to its checkpoint and only set the supply in a transaction that sees the checkpoint we caught up to.
+
+BLOCKS_PER_REQUEST = 10000
+
+def transfer_topic():
+	for topic_hash, event in load_topic_hashes().items():
+		if (event["event"] == "Transfer"):
+			return "0x" + topic_hash;
+
+def fetch_transfers(web3, exchange_address, from_block, to_block):
+	logs = [];
+
+	for start in range(from_block, to_block + 1, BLOCKS_PER_REQUEST):
+		logs += [serialize_log(log) for log in web3.eth.getLogs({
+			"fromBlock" : start,
+			"toBlock" : min(start + BLOCKS_PER_REQUEST - 1, to_block),
+			"address" : [exchange_address],
+			"topics" : [transfer_topic()]
+		})];
+
+	block_timestamps = fetch_block_timestamps(sorted(set([log["blockNumber"] for log in logs])));
+
+	return [decode_transfer_log(log, block_timestamps[log["blockNumber"]]) for log in logs];
+
+# sets the pool token supply if the exchange is still checkpointed at checkpoint_block, returns whether it was
+def finish_exchange(ds_client, exchange_key, checkpoint_block, supply):
+	with ds_client.transaction():
+		exchange_info = ds_client.get(exchange_key);
+
+		if ((exchange_info["last_updated_block"] != checkpoint_block) or ("pool_token_supply" in exchange_info)):
+			return False;
+
+		exchange_info["pool_token_supply"] = str(supply);
+
+		ds_client.put(exchange_info);
+
+	return True;
+
+def build_exchange(ds_client, web3, exchange_key):
+	exchange_info = ds_client.get(exchange_key);
+
+	if ("pool_token_supply" in exchange_info):
+		print(exchange_info["address"] + " already indexed");
+		return;
+
+	exchange_address = to_checksum_address(exchange_info["address"]);
+
+	from_block = GENSIS_BLOCK_NUMBER;
+
+	supply = 0;
+	transfer_count = 0;
+
+	while (True):
+		checkpoint_block = exchange_info["last_updated_block"];
+
+		if (checkpoint_block > from_block):
+			transfers = fetch_transfers(web3, exchange_address, from_block, checkpoint_block - 1);
+
+			supply = apply_transfers(ds_client, exchange_address, transfers, supply);
+			transfer_count += len(transfers);
+
+			from_block = checkpoint_block;
+
+		if (finish_exchange(ds_client, exchange_key, checkpoint_block, supply)):
+			break;
+
+		# the crawler checkpointed past us, catch up again
+		exchange_info = ds_client.get(exchange_key);
+
+		if ("pool_token_supply" in exchange_info):
+			break;
+
+	print("indexed " + str(transfer_count) + " transfers for " + exchange_address + ", pool token supply " + str(supply));
+
+def main():
+	parser = argparse.ArgumentParser(description="index pool token transfers for exchanges crawled before they were indexed")
+	parser.add_argument("--exchange", help="only index this exchange address (default all exchanges in datastore)")
+	args = parser.parse_args()
+
+	ds_client = get_datastore_client();
+
+	web3 = get_web3();
+
+	for exchange_info in ds_client.query(kind='exchange').fetch():
+		if ((args.exchange is None) or (exchange_info["address"].lower() == args.exchange.lower())):
+			build_exchange(ds_client, web3, exchange_info.key);
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import argparse
+
+# make the uniswap package importable when run as python tools/build_price_index.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.query_cache import run_query
+
+from uniswap.price_index import PriceIndex
+from uniswap.price_index import save_price_index
+
+# Builds (or rebuilds, after PRICE_INDEX_VERSION changes) the point in time price index and its running TWAP / VWAP
+# totals (see uniswap/price_index.py) for exchanges that already have history.
+# Once an index exists the crawler keeps it up to date. Rows the crawler commits while we're building are picked
+# up by the catch up queries at the end.
+
+PAGE_SIZE = 50000
+
+def history_page_sql(exchange_address, after_tx_order):
+	return """
+		SELECT CAST(tx_order as INT64) as tx_order, """ + timestamp_column() + """ as timestamp, event,
+			CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens,
+			CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total
+		FROM """ + history_table_name(exchange_address) + """
+		WHERE """ + history_filter(exchange_address) + """ and CAST(tx_order as INT64) > """ + str(after_tx_order) + """
+		GROUP BY tx_order, timestamp, event, eth, tokens, cur_eth_total, cur_tokens_total
+		ORDER BY tx_order asc
+		LIMIT """ + str(PAGE_SIZE);
+
+# appends every history row after the index's last snapshot, returns how many were added
+def fill_index(index):
+	appended = 0;
+
+	while (True):
+		rows = run_query(history_page_sql(index.exchange_address, index.last_tx_order()), use_cache=False);
+
+		appended += index.append_rows(rows);
+
+		if (len(rows) < PAGE_SIZE):
+			return appended;
+
+def build_index(ds_client, exchange_address):
+	index = PriceIndex(exchange_address);
+
+	fill_index(index);
+
+	save_price_index(ds_client, index);
+
+	# catch up with anything the crawler wrote while we were building
+	while (True):
+		first_position = len(index);
+
+		if (fill_index(index) == 0):
+			break;
+
+		save_price_index(ds_client, index, first_position);
+
+	print("built price index for " + exchange_address + " with " + str(len(index)) + " snapshots");
+
+def main():
+	parser = argparse.ArgumentParser(description="build the point in time price index from exchange history")
+	parser.add_argument("--exchange", help="only build this exchange address (default all exchanges in datastore)")
+	args = parser.parse_args()
+
+	ds_client = get_datastore_client();
+
+	if (args.exchange is not None):
+		exchange_addresses = [args.exchange];
+	else:
+		exchange_addresses = [entity["address"] for entity in ds_client.query(kind='exchange').fetch()];
+
+	for exchange_address in exchange_addresses:
+		build_index(ds_client, exchange_address);
+
+if __name__ == '__main__':
+	main()
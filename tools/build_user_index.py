@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+
+# make the uniswap package importable when run as python tools/build_user_index.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+from uniswap.history_table import normalized_select
+from uniswap.history_table import normalized_group_by
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.query_cache import iter_query
+
+from uniswap.user_history import index_user_trades
+
+# Backfills the per-user trade index (see uniswap/user_history.py) from history the crawler wrote before the
+# index existed. Safe to re-run, entities are keyed by row so existing ones are just overwritten.
+
+BATCH_SIZE = 500
+
+def history_sql(exchange_address):
+	return """
+		SELECT CAST(event as STRING) as event, CAST(tx_hash as STRING) as tx_hash, CAST(user as STRING) as user,
+			CAST(tx_index as INT64) as tx_index, CAST(tx_order as INT64) as tx_order, CAST(block as INT64) as block,
+			""" + timestamp_column() + """ as timestamp,
+			CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens,
+			CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total,
+			""" + ", ".join(normalized_select(exchange_address)) + """
+		FROM """ + history_table_name(exchange_address) + """
+		WHERE """ + history_filter(exchange_address) + """ and user is not null
+		GROUP BY """ + ", ".join(["event", "tx_hash", "user", "tx_index", "tx_order", "block", "timestamp", "eth", "tokens", "cur_eth_total", "cur_tokens_total"] + normalized_group_by(exchange_address));
+
+def build_exchange(ds_client, exchange_address):
+	indexed = 0;
+
+	batch = [];
+
+	for row in iter_query(history_sql(exchange_address)):
+		batch.append(row);
+
+		if (len(batch) == BATCH_SIZE):
+			indexed += index_user_trades(ds_client, exchange_address, batch);
+			batch = [];
+
+	indexed += index_user_trades(ds_client, exchange_address, batch);
+
+	print("indexed " + str(indexed) + " user trades for " + exchange_address);
+
+def main():
+	parser = argparse.ArgumentParser(description="backfill the per-user trade index from exchange history")
+	parser.add_argument("--exchange", help="only index this exchange address (default all exchanges in datastore)")
+	args = parser.parse_args()
+
+	ds_client = get_datastore_client();
+
+	if (args.exchange is not None):
+		exchange_addresses = [args.exchange];
+	else:
+		exchange_addresses = [entity["address"] for entity in ds_client.query(kind='exchange').fetch()];
+
+	for exchange_address in exchange_addresses:
+		build_exchange(ds_client, exchange_address);
+
+if __name__ == '__main__':
+	main()
@@ -1,33 +1,40 @@
 import os
-from datetime import datetime, timezone, timedelta
+import sys
+import argparse
 
-now = datetime.utcnow()
+# make the uniswap package importable when run as python tools/generate_timestamps.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-date = datetime(2017, 1, 1, tzinfo=timezone.utc)
+from uniswap.buckets import BUCKET_UNITS
+from uniswap.buckets import get_bucket_index
 
-timestamps = [];
+# writes the UTC start and end timestamp and label of every bucket (default days) from 2017 for 20 years,
+# as generated by uniswap/buckets.py
+def main():
+	parser = argparse.ArgumentParser(description="write bucket boundary timestamps to a csv")
+	parser.add_argument("--unit", default="day", choices=BUCKET_UNITS)
+	parser.add_argument("--tz-offset", type=int, default=0, help="seconds east of utc that buckets start in")
+	parser.add_argument("--output", default="timestamps.csv")
+	args = parser.parse_args()
 
-num_days_to_output = 365 * 20 # 20 years
+	bucket_index = get_bucket_index(args.unit, args.tz_offset);
 
-# determine the UTC timestamp for the start and end of each day
-for x in range (num_days_to_output):
-	start_of_day = round(date.timestamp());
+	# the last boundary only closes the bucket before it
+	num_buckets = len(bucket_index) - 1;
 
-	date_name = date.strftime("%Y-%m-%d")
+	labels = bucket_index.labels(0, num_buckets - 1);
 
-	date += timedelta(days=1)
+	timestamps = [str(bucket_index.bucket_start(position)) + "," + str(bucket_index.bucket_end(position)) + "," + labels[position] for position in range(num_buckets)];
 
-	end_of_day = round(date.timestamp() - 1);
+	# delete previous logs if found
+	if (os.path.exists(args.output)):
+		os.remove(args.output);
 
-	timestamps.append(str(start_of_day) + "," + str(end_of_day) + "," + str(date_name));
+	# write new logs file
+	with open(args.output, 'a') as the_file:
+		the_file.write('\n'.join(timestamps));
 
-# delete previous logs if found
-fname = 'timestamps.csv'
-if (os.path.exists(fname)):
-    os.remove(fname);
+	print("wrote " + str(num_buckets) + " " + args.unit + " timestamps to " + args.output)
 
-# write new logs file
-with open(fname, 'a') as the_file:
-    the_file.write('\n'.join(timestamps));
-
-print("wrote timestamps to " + fname)
\ No newline at end of file
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Measures cold start cost of the api: how long a fresh interpreter takes to import main.py and then
+# import what the first request for each route needs, plus which heavy client libraries that pulls in.
+#
+# To compare against an older revision, check it out next to this one and point --path at it, e.g.
+#   git worktree add /tmp/uniswap-baseline <rev>
+#   python tools/measure_cold_start.py --path /tmp/uniswap-baseline
+#   python tools/measure_cold_start.py
+
+# route -> the handler module that route imports
+ROUTE_MODULES = {
+	"/api/v1/price" : "uniswap.price",
+	"/api/v1/exchange" : "uniswap.exchange",
+	"/api/v1/directory" : "uniswap.directory",
+	"/api/v1/stats" : "uniswap.stats",
+	"/api/v1/ticker" : "uniswap.ticker",
+	"/api/v1/history" : "uniswap.history",
+	"/api/v1/chart" : "uniswap.charts",
+	"/api/v1/user" : "uniswap.user",
+	"/tasks/crawl" : "uniswap.crawl",
+}
+
+# modules we want to know about if a route ends up loading them
+HEAVY_MODULES = [
+	"google.cloud.bigquery",
+	"google.cloud.datastore",
+	"google.cloud.tasks_v2beta3",
+	"web3",
+	"eth_utils",
+]
+
+# runs inside the fresh interpreter, prints a json result line
+PROBE_SCRIPT = """
+import sys
+import json
+import time
+import importlib
+
+start = time.perf_counter()
+import main
+main_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+route_seconds = time.perf_counter() - start
+
+print(json.dumps({
+	"main_seconds" : main_seconds,
+	"route_seconds" : route_seconds,
+	"loaded" : [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+}))
+"""
+
+def probe(path, module_name):
+	output = subprocess.check_output(
+		[sys.executable, "-c", PROBE_SCRIPT, module_name, json.dumps(HEAVY_MODULES)],
+		cwd=path
+	)
+
+	return json.loads(output.decode("utf-8").strip().splitlines()[-1]);
+
+def median(values):
+	values = sorted(values);
+
+	return values[len(values) // 2];
+
+def main():
+	parser = argparse.ArgumentParser(description="measure api cold start import cost per route")
+	parser.add_argument("--path", default=os.path.join(os.path.dirname(__file__), ".."), help="root of the tree to measure")
+	parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start per route")
+	args = parser.parse_args()
+
+	path = os.path.abspath(args.path);
+
+	print("measuring " + path + " (median of " + str(args.runs) + " runs)");
+
+	for route, module_name in ROUTE_MODULES.items():
+		results = [probe(path, module_name) for x in range(args.runs)];
+
+		main_ms = median([result["main_seconds"] for result in results]) * 1000;
+		route_ms = median([result["route_seconds"] for result in results]) * 1000;
+
+		print("%-20s import main %7.1f ms, first request imports %7.1f ms, total %7.1f ms, loads %s" % (
+			route, main_ms, route_ms, main_ms + route_ms, ", ".join(results[-1]["loaded"])));
+
+if __name__ == '__main__':
+	main()
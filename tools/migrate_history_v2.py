@@ -0,0 +1,77 @@
+import os
+import sys
+import argparse
+
+# make the uniswap package importable when run as python tools/migrate_history_v2.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.history_table import HISTORY_V2_DDL
+from uniswap.history_table import HISTORY_V2_TABLE_NAME
+from uniswap.history_table import v1_table_name
+from uniswap.history_table import normalized_columns_ddl
+from uniswap.history_table import normalized_select
+from uniswap.history_table import NORMALIZED_COLUMNS
+
+from uniswap.clients import get_bigquery_client
+from uniswap.clients import get_datastore_client
+
+# Copies exchange history from the per exchange v1 tables into the single partitioned v2 table.
+#
+# Cut over in this order so no rows are missed:
+#   1. deploy with HISTORY_WRITE_VERSIONS=1,2 so the crawler writes new rows to both layouts
+#   2. run this tool, which copies every v1 row older than the first row the crawler already wrote to v2
+#   3. deploy with HISTORY_READ_VERSION=2 (and later HISTORY_WRITE_VERSIONS=2)
+#
+# Duplicate rows in v1 (from retried inserts) are dropped on the way over. Running the tool again for an
+# exchange that's already migrated copies nothing. The normalized columns are copied as they are, a v1 table
+# tools/normalize_history.py hasn't filled in yet copies nulls, which it fills in on v2 just the same.
+
+def migration_sql(exchange_address):
+	return """
+		INSERT INTO """ + HISTORY_V2_TABLE_NAME + """
+			(exchange, event, tx_hash, user, eth, tokens, cur_eth_total, cur_tokens_total, block, timestamp, tx_index, tx_order, day, month, year,
+			""" + ", ".join(NORMALIZED_COLUMNS) + """)
+		SELECT DISTINCT
+			'""" + exchange_address + """' as exchange, event, tx_hash, user,
+			CAST(eth as BIGNUMERIC), CAST(tokens as BIGNUMERIC), CAST(cur_eth_total as BIGNUMERIC), CAST(cur_tokens_total as BIGNUMERIC),
+			block, TIMESTAMP_SECONDS(CAST(timestamp as INT64)), tx_index, CAST(tx_order as INT64), day, month, year,
+			""" + ", ".join(normalized_select(exchange_address, version=1)) + """
+		FROM """ + v1_table_name(exchange_address) + """
+		WHERE CAST(tx_order as INT64) < IFNULL((
+			SELECT MIN(tx_order) FROM """ + HISTORY_V2_TABLE_NAME + """ WHERE exchange = '""" + exchange_address + """'
+		), 9223372036854775807)""";
+
+def main():
+	parser = argparse.ArgumentParser(description="copy exchange history from the v1 tables into the v2 table")
+	parser.add_argument("--exchange", help="only migrate this exchange address (default all exchanges in datastore)")
+	parser.add_argument("--dry-run", action="store_true", help="print the sql without running it")
+	args = parser.parse_args()
+
+	if (args.exchange is not None):
+		exchange_addresses = [args.exchange];
+	else:
+		query = get_datastore_client().query(kind='exchange');
+
+		exchange_addresses = [entity["address"] for entity in query.fetch()];
+
+	# a v2 table created before the normalized columns needs them added
+	statements = [HISTORY_V2_DDL, normalized_columns_ddl(HISTORY_V2_TABLE_NAME)] + [migration_sql(exchange_address) for exchange_address in exchange_addresses];
+
+	if (args.dry_run):
+		print(";\n".join(statements) + ";");
+		return;
+
+	bq_client = get_bigquery_client();
+
+	# create the v2 table if needed
+	bq_client.query(HISTORY_V2_DDL).result();
+	bq_client.query(normalized_columns_ddl(HISTORY_V2_TABLE_NAME)).result();
+
+	for exchange_address in exchange_addresses:
+		query_job = bq_client.query(migration_sql(exchange_address));
+		query_job.result();
+
+		print("migrated " + exchange_address + ": " + str(query_job.num_dml_affected_rows) + " rows");
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import argparse
+
+# make the uniswap package importable when run as python tools/normalize_history.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.config import HISTORY_WRITE_VERSIONS
+
+from uniswap.decode import ETH_DECIMALS
+from uniswap.decode import normalize_rows
+
+from uniswap.history_table import HISTORY_V2_TABLE_NAME
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import time_literal
+from uniswap.history_table import normalized_columns_ddl
+
+from uniswap.clients import get_bigquery_client
+from uniswap.clients import get_datastore_client
+
+# Adds the normalized amount / price columns (see decode.normalize_rows) to every history table the crawler
+# writes, and fills them in for rows crawled before they existed, along with cur_eth_norm / cur_tokens_norm on
+# the exchange entities.
+#
+# Run it right after deploying the crawler that writes the columns, then once more STREAMING_BUFFER_SECONDS later.
+# Rows from the last STREAMING_BUFFER_SECONDS are skipped since bigquery can't update rows still in the streaming
+# buffer, and the ones crawled before the deploy were written without the columns, so the first run leaves them
+# null. Only null rows are updated so re-running is safe, and each run reports how many are still left.
+
+STREAMING_BUFFER_SECONDS = 60 * 60 * 2
+
+def bignumeric(column):
+	return "CAST(" + column + " as BIGNUMERIC)";
+
+def whole_units(amount_sql, decimals):
+	return "CAST(" + amount_sql + " as FLOAT64) / POW(10, " + str(decimals) + ")";
+
+def price_sql(eth_sql, tokens_sql, token_decimals):
+	return "IFNULL(SAFE_DIVIDE(" + whole_units(tokens_sql, token_decimals) + ", " + whole_units(eth_sql, ETH_DECIMALS) + "), 0)";
+
+def normalize_sql(exchange_address, token_decimals, version, before_time):
+	return """
+		UPDATE """ + history_table_name(exchange_address, version) + """
+		SET
+			eth_norm = """ + whole_units(bignumeric("eth"), ETH_DECIMALS) + """,
+			tokens_norm = """ + whole_units(bignumeric("tokens"), token_decimals) + """,
+			cur_eth_norm = """ + whole_units(bignumeric("cur_eth_total"), ETH_DECIMALS) + """,
+			cur_tokens_norm = """ + whole_units(bignumeric("cur_tokens_total"), token_decimals) + """,
+			price_before = """ + price_sql(bignumeric("cur_eth_total") + " - " + bignumeric("eth"), bignumeric("cur_tokens_total") + " - " + bignumeric("tokens"), token_decimals) + """,
+			price_after = """ + price_sql(bignumeric("cur_eth_total"), bignumeric("cur_tokens_total"), token_decimals) + """
+		WHERE """ + history_filter(exchange_address, version=version) + """ and eth_norm is null
+			and timestamp < """ + time_literal(before_time, version);
+
+def remaining_sql(exchange_address, version):
+	return """
+		SELECT COUNT(*) as remaining
+		FROM """ + history_table_name(exchange_address, version) + """
+		WHERE """ + history_filter(exchange_address, version=version) + """ and eth_norm is null""";
+
+def main():
+	parser = argparse.ArgumentParser(description="add and backfill the normalized amount columns of exchange history")
+	parser.add_argument("--exchange", help="only backfill this exchange address (default all exchanges in datastore)")
+	parser.add_argument("--dry-run", action="store_true", help="print the sql without running it")
+	args = parser.parse_args()
+
+	ds_client = get_datastore_client();
+
+	exchanges = [entity for entity in ds_client.query(kind='exchange').fetch() if (args.exchange is None) or (entity["address"] == args.exchange)];
+
+	before_time = int(time.time()) - STREAMING_BUFFER_SECONDS;
+
+	statements = [];
+
+	for version in HISTORY_WRITE_VERSIONS:
+		if (version == 2):
+			statements.append(normalized_columns_ddl(HISTORY_V2_TABLE_NAME));
+		else:
+			statements += [normalized_columns_ddl(history_table_name(exchange_info["address"], version)) for exchange_info in exchanges];
+
+		statements += [normalize_sql(exchange_info["address"], exchange_info["token_decimals"], version, before_time) for exchange_info in exchanges];
+
+	if (args.dry_run):
+		print(";\n".join(statements) + ";");
+		return;
+
+	bq_client = get_bigquery_client();
+
+	for statement in statements:
+		query_job = bq_client.query(statement);
+		query_job.result();
+
+		if (query_job.num_dml_affected_rows is not None):
+			print(statement.split("\n")[1].strip() + ": " + str(query_job.num_dml_affected_rows) + " rows");
+
+	remaining = 0;
+
+	for version in HISTORY_WRITE_VERSIONS:
+		for exchange_info in exchanges:
+			remaining += list(bq_client.query(remaining_sql(exchange_info["address"], version)).result())[0]["remaining"];
+
+	if (remaining > 0):
+		print(str(remaining) + " rows were still in the streaming buffer, run this again after " + time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(time.time() + STREAMING_BUFFER_SECONDS)));
+
+	# the current liquidity in whole eth / tokens on each exchange entity. re-read in a transaction so we never
+	# write back a checkpoint older than the one the crawler has stored since
+	for exchange_info in exchanges:
+		with ds_client.transaction():
+			exchange_info = ds_client.get(exchange_info.key);
+
+			current = normalize_rows([{
+				"eth" : "0",
+				"tokens" : "0",
+				"cur_eth_total" : exchange_info["cur_eth_total"],
+				"cur_tokens_total" : exchange_info["cur_tokens_total"]
+			}], exchange_info["token_decimals"])[0];
+
+			exchange_info.update({
+				"cur_eth_norm" : current["cur_eth_norm"],
+				"cur_tokens_norm" : current["cur_tokens_norm"]
+			})
+
+			ds_client.put(exchange_info);
+
+	print("normalized " + str(len(exchanges)) + " exchanges");
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+# make the uniswap package importable when run as python tools/rebuild_history.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uniswap.config import GENSIS_BLOCK_NUMBER
+from uniswap.config import LOG_ARCHIVE_DIR
+
+from uniswap.decode import decode_exchange_log
+from uniswap.decode import apply_running_totals
+from uniswap.decode import normalize_rows
+
+from uniswap.history_table import history_row
+
+from uniswap.log_archive import archive_gaps
+from uniswap.log_archive import iter_archived_logs
+from uniswap.log_archive import list_archived_exchanges
+
+from uniswap.clients import get_datastore_client
+
+# Rebuilds exchange history from the raw log archive (see uniswap/log_archive.py) without touching the RPC
+# provider: every archived log is decoded again, cur_eth_total / cur_tokens_total are recomputed from zero and the
+# normalized columns are filled in with the token decimals stored on each exchange entity.
+#
+# Exchanges are rebuilt in parallel, one process each. Each one writes <output>/<exchange address>.json with one
+# history row per line (ready for bq load --source_format=NEWLINE_DELIMITED_JSON) and the summary of all of them
+# goes to <output>/summary.json.
+
+def rebuild_exchange(job):
+	exchange_address, token_decimals, archive_dir, output_dir, version = job;
+
+	start = time.time();
+
+	cur_eth_total = 0;
+	cur_tokens_total = 0;
+
+	row_count = 0;
+	last_block = None;
+
+	with open(os.path.join(output_dir, exchange_address + ".json"), "w") as output_file:
+		for log in iter_archived_logs(exchange_address, archive_dir):
+			last_block = log["blockNumber"];
+
+			row = decode_exchange_log(log, log["blockTimestamp"]);
+
+			if (row is None):
+				continue;
+
+			cur_eth_total, cur_tokens_total = apply_running_totals([row], cur_eth_total, cur_tokens_total);
+
+			normalize_rows([row], token_decimals);
+
+			output_file.write(json.dumps(history_row(exchange_address, row, version)) + "\n");
+
+			row_count += 1;
+
+	return {
+		"exchange" : exchange_address,
+		"rows" : row_count,
+		"last_block" : last_block,
+		"cur_eth_total" : str(cur_eth_total),
+		"cur_tokens_total" : str(cur_tokens_total),
+		"gaps" : archive_gaps(exchange_address, GENSIS_BLOCK_NUMBER, archive_dir),
+		"seconds" : round(time.time() - start, 3)
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="rebuild exchange history rows and totals from the raw log archive")
+	parser.add_argument("--exchange", action="append", help="only rebuild this exchange address (can be repeated, default every archived exchange)")
+	parser.add_argument("--archive-dir", default=LOG_ARCHIVE_DIR)
+	parser.add_argument("--output", default="rebuilt_history")
+	parser.add_argument("--version", type=int, default=2, choices=[1, 2], help="history table version to write rows for")
+	parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+	args = parser.parse_args()
+
+	if (args.archive_dir is None):
+		parser.error("no archive directory, set LOG_ARCHIVE_DIR or pass --archive-dir");
+
+	exchange_addresses = args.exchange or list_archived_exchanges(args.archive_dir);
+
+	os.makedirs(args.output, exist_ok=True);
+
+	token_decimals = dict([(entity["address"], entity["token_decimals"]) for entity in get_datastore_client().query(kind='exchange').fetch()]);
+
+	unknown = [exchange_address for exchange_address in exchange_addresses if (exchange_address in token_decimals) == False];
+
+	if (len(unknown) > 0):
+		parser.error("no exchange entity (for the token decimals) for " + ", ".join(unknown));
+
+	jobs = [(exchange_address, token_decimals[exchange_address], args.archive_dir, args.output, args.version) for exchange_address in exchange_addresses];
+
+	start = time.time();
+
+	with multiprocessing.Pool(max(1, args.processes)) as pool:
+		results = pool.map(rebuild_exchange, jobs);
+
+	for result in results:
+		print(result["exchange"] + ": " + str(result["rows"]) + " rows in " + str(result["seconds"]) + "s, cur_eth_total = "
+			+ result["cur_eth_total"] + ", cur_tokens_total = " + result["cur_tokens_total"]);
+
+		# totals after a gap are wrong, the missing range has to be re-crawled before rebuilding
+		if (len(result["gaps"]) > 0):
+			print("  WARNING: archive is missing blocks " + ", ".join([str(first) + "-" + str(last) for first, last in result["gaps"]]));
+
+	with open(os.path.join(args.output, "summary.json"), "w") as summary_file:
+		summary_file.write(json.dumps(results, indent=2));
+
+	print("rebuilt " + str(len(results)) + " exchanges (" + str(sum([result["rows"] for result in results])) + " rows) in " + str(round(time.time() - start, 3)) + "s");
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,250 @@
+import json
+import itertools
+
+from flask import request, jsonify
+
+from uniswap.config import PROJECT_ID
+from uniswap.config import BLOCKS_DATASET_ID
+from uniswap.config import BLOCKS_TABLE_ID
+from uniswap.config import GENSIS_BLOCK_NUMBER
+from uniswap.config import RPC_RECORD_DIR
+from uniswap.config import RPC_REPLAY_DIR
+
+from uniswap.clients import get_datastore_client
+from uniswap.clients import get_bigquery_client
+from uniswap.clients import get_rpc_pool
+from uniswap.clients import get_web3
+
+from uniswap.query_cache import run_query
+
+from uniswap.utils import get_block_info_table
+from uniswap.utils import schedule_task
+
+# Block number -> timestamp data (blocks_v1.block_data): the routine fetch, gap detection and backfill.
+#
+# Block headers are pulled with batched JSON-RPC (one http round trip per RPC_BATCH_SIZE blocks) rather
+# than one getBlock call per block.
+
+BLOCKS_PER_FETCH = 50
+
+RPC_BATCH_SIZE = 100
+
+# most blocks a single backfill task will fetch, the task reschedules itself until the gaps are filled
+MAX_BACKFILL_BLOCKS = 2000
+
+BLOCK_TABLE_NAME = "`" + PROJECT_ID + "." + BLOCKS_DATASET_ID + "." + BLOCKS_TABLE_ID + "`"
+
+# sends a batch of json-rpc calls in one round trip, through the record / replay provider when one is configured
+def post_rpc_batch(payload):
+    if (RPC_REPLAY_DIR is not None):
+        return get_web3().providers[0].make_batch_request(payload);
+
+    responses = get_rpc_pool().make_batch_request(payload);
+
+    if (RPC_RECORD_DIR is not None):
+        get_web3().providers[0].record_batch(payload, responses);
+
+    return responses;
+
+# fetches timestamps for the given block numbers with batched eth_getBlockByNumber calls. blocks the provider
+# doesn't have (yet) are left out of the returned block -> timestamp dict
+def fetch_block_timestamps(block_numbers):
+    block_timestamps = {};
+
+    block_numbers = list(block_numbers);
+
+    for start in range(0, len(block_numbers), RPC_BATCH_SIZE):
+        batch = block_numbers[start:start + RPC_BATCH_SIZE];
+
+        payload = [{
+            "jsonrpc" : "2.0",
+            "id" : block_number,
+            "method" : "eth_getBlockByNumber",
+            "params" : [hex(block_number), False]
+        } for block_number in batch];
+
+        for result in post_rpc_batch(payload):
+            if (("error" in result) or (result.get("result") is None)):
+                continue;
+
+            block_timestamps[int(result["id"])] = int(result["result"]["timestamp"], 16);
+
+    return block_timestamps;
+
+# block numbers in the given inclusive (first, last) ranges, in order, up to limit of them
+def expand_ranges(ranges, limit=None):
+    block_numbers = itertools.chain.from_iterable(range(first, last + 1) for first, last in ranges);
+
+    if (limit is not None):
+        block_numbers = itertools.islice(block_numbers, limit);
+
+    return list(block_numbers);
+
+# finds the missing block ranges in [start_block, end_block] without pulling every block number out of
+# bigquery: a window over the sorted block numbers only returns the edges of each gap
+def find_block_gaps(start_block, end_block):
+    rows = run_query("""
+        SELECT FALSE as is_edges, block + 1 as gap_start, next_block - 1 as gap_end
+        FROM (
+            SELECT block, LEAD(block) OVER (ORDER BY block) as next_block
+            FROM (
+                SELECT DISTINCT CAST(block as INT64) as block
+                FROM """ + BLOCK_TABLE_NAME + """
+                WHERE block >= """ + str(start_block) + """ and block <= """ + str(end_block) + """
+            )
+        )
+        WHERE next_block > block + 1
+        UNION ALL
+        SELECT
+            TRUE as is_edges, MIN(CAST(block as INT64)) as gap_start, MAX(CAST(block as INT64)) as gap_end
+        FROM """ + BLOCK_TABLE_NAME + """
+        WHERE block >= """ + str(start_block) + """ and block <= """ + str(end_block), use_cache=False);
+
+    # the edges row holds the lowest and highest block we have, gaps before / after those are at the range edges
+    edges = [row for row in rows if row["is_edges"]][0];
+    gaps = [(row["gap_start"], row["gap_end"]) for row in rows if (row["is_edges"] == False)];
+
+    if (edges["gap_start"] is None):
+        return [(start_block, end_block)];
+
+    if (edges["gap_start"] > start_block):
+        gaps.append((start_block, edges["gap_start"] - 1));
+
+    if (edges["gap_end"] < end_block):
+        gaps.append((edges["gap_end"] + 1, end_block));
+
+    return sorted(gaps);
+
+# fetches and stores the timestamps for block_numbers, returns the block -> timestamp dict we stored
+def backfill_blocks(block_numbers):
+    block_timestamps = fetch_block_timestamps(block_numbers);
+
+    if (len(block_timestamps) > 0):
+        bq_client = get_bigquery_client();
+
+        rows_to_insert = [{"block" : block_number, "timestamp" : timestamp} for block_number, timestamp in sorted(block_timestamps.items())];
+
+        insert_errors = bq_client.insert_rows(get_block_info_table(bq_client), rows_to_insert);
+
+        if (insert_errors != []):
+            raise Exception("failed to insert backfilled blocks: " + str(insert_errors));
+
+        print("Backfilled " + str(len(rows_to_insert)) + " block info rows");
+
+    return block_timestamps;
+
+def load_block_datastore_info(ds_client):
+    query = ds_client.query(kind='blockdata');
+
+    for entity in query.fetch():
+        return entity;
+
+    return None;
+
+# routinely fetch blocks and their timestamps
+def v1_fetch_blocks():
+    # pull the latest block number that we should start with
+    ds_client = get_datastore_client();
+
+    # determine the last block that we fetched
+    block_datastore_info = load_block_datastore_info(ds_client);
+
+    last_fetched_block = block_datastore_info["last_fetched_block"]
+
+    # we haven't fetched any, so start at the genesis uniswap block
+    if (last_fetched_block == 0):
+        last_fetched_block = GENSIS_BLOCK_NUMBER;
+
+    max_block_to_fetch = last_fetched_block + BLOCKS_PER_FETCH;
+
+    print("Fetching info for blocks " + str(last_fetched_block) + " to " + str(max_block_to_fetch));
+
+    error = None;
+
+    try:
+        block_timestamps = fetch_block_timestamps(range(last_fetched_block, max_block_to_fetch));
+
+        # this will hold the rows that we'll insert into bigquery
+        rows_to_insert = []
+
+        for block_number in range(last_fetched_block, max_block_to_fetch):
+            # this block doesn't exist! we surpassed the latest block
+            if ((block_number in block_timestamps) == False):
+                # set the max block to fetch as the current block number and we'll start from here in the next fetchBlocks call
+                max_block_to_fetch = block_number
+                break;
+
+            rows_to_insert.append({
+                "block" : block_number,
+                "timestamp" : block_timestamps[block_number]
+            });
+
+        insert_errors = [];
+
+        # only insert into bq if we have any rows
+        if (len(rows_to_insert) > 0):
+            # get the bigquery client
+            bq_client = get_bigquery_client()
+            # get the block info table
+            block_table = get_block_info_table(bq_client);
+            # now push the new rows to the table
+            insert_errors = bq_client.insert_rows(block_table, rows_to_insert);
+
+        if (insert_errors == []):
+            print("Successfully inserted " + str(len(rows_to_insert)) + " block info rows. Updated last fetched block to " + str(max_block_to_fetch));
+
+            block_datastore_info.update({
+                "last_fetched_block" : max_block_to_fetch
+            })
+
+            ds_client.put(block_datastore_info)
+    except Exception as e:
+        error = e;
+        print(str(error));
+
+    # keep fetching even if this call failed, the backfill task will pick up anything we missed
+    delay_in_seconds = 60 * 2; # update blocks every 2 minutes
+
+    schedule_task(delay_in_seconds, "/tasks/fetchblocks");
+
+    # always 200 since we've already scheduled the next fetch, a 500 would have cloud tasks retry this one as
+    # well and fork a second fetch chain
+    return jsonify(error=str(error)), 200
+
+# find gaps in the block data between fromBlock (default the uniswap genesis block) and toBlock (default the
+# last fetched block) and fetch up to MAX_BACKFILL_BLOCKS of them, rescheduling until there are none left
+def v1_backfill_blocks():
+    ds_client = get_datastore_client();
+
+    try:
+        from_block = int(request.args.get("fromBlock", GENSIS_BLOCK_NUMBER));
+
+        to_block = request.args.get("toBlock");
+
+        if (to_block is None):
+            to_block = load_block_datastore_info(ds_client)["last_fetched_block"] - 1;
+        else:
+            to_block = int(to_block);
+    except ValueError:
+        return jsonify(error='fromBlock and toBlock must be block numbers'), 400
+
+    gaps = find_block_gaps(from_block, to_block);
+
+    missing_count = sum([(last - first + 1) for first, last in gaps]);
+
+    print("Found " + str(len(gaps)) + " gaps (" + str(missing_count) + " blocks) between blocks " + str(from_block) + " and " + str(to_block));
+
+    if (missing_count == 0):
+        return jsonify(gaps=[], backfilled=0), 200
+
+    try:
+        block_timestamps = backfill_blocks(expand_ranges(gaps, MAX_BACKFILL_BLOCKS));
+    except Exception as e:
+        print(str(e));
+        return jsonify(error=str(e)), 500
+
+    # more left to do (and we're still making progress), so pick up from the first remaining gap
+    if ((missing_count > MAX_BACKFILL_BLOCKS) and (len(block_timestamps) > 0)):
+        schedule_task(0, "/tasks/backfillblocks?fromBlock=" + str(gaps[0][0]) + "&toBlock=" + str(to_block));
+
+    return jsonify(gaps=gaps[:100], backfilled=len(block_timestamps)), 200
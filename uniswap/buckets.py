@@ -0,0 +1,93 @@
+import functools
+
+import numpy as np
+
+# Hour / day / week / month / year bucket boundaries, generated with vectorized datetime64 math.
+#
+# A BucketIndex holds the sorted unix start time of every bucket from BUCKETS_START_YEAR to BUCKETS_END_YEAR
+# (optionally shifted to a timezone offset) and maps any timestamp to its bucket with a binary search. Indexes
+# are built once per (unit, offset) and kept for the life of the instance.
+
+BUCKET_UNITS = ["hour", "day", "week", "month", "year"]
+
+BUCKETS_START_YEAR = 2017
+BUCKETS_END_YEAR = 2037
+
+# datetime64 unit each bucket is floored to, and the label precision for np.datetime_as_string
+DATETIME64_UNITS = {
+    "hour" : "h",
+    "day" : "D",
+    "week" : "D",
+    "month" : "M",
+    "year" : "Y"
+}
+
+# real timezones are whole minutes within 14 hours of utc, each other offset would only cost another index
+MAX_TZ_OFFSET_SECONDS = 14 * 60 * 60
+
+# 1970-01-01 (day 0) was a thursday, so this shifts day numbers to weeks starting monday
+EPOCH_WEEKDAY_OFFSET = 3
+
+# start (unix seconds) of every unit bucket in [start_time, end_time), in the timezone tz_offset_seconds east of utc
+def bucket_boundaries(unit, start_time, end_time, tz_offset_seconds=0):
+    if ((unit in BUCKET_UNITS) == False):
+        raise ValueError("unknown bucket unit " + str(unit));
+
+    datetime64_unit = DATETIME64_UNITS[unit];
+
+    # work in local time, then shift the boundaries back to utc at the end
+    first = np.datetime64(int(start_time) + tz_offset_seconds, "s").astype("datetime64[" + datetime64_unit + "]");
+    last = np.datetime64(int(end_time) + tz_offset_seconds, "s").astype("datetime64[" + datetime64_unit + "]");
+
+    if (unit == "week"):
+        # back up to the monday on or before first, then step a week at a time
+        first = first - ((first.astype(np.int64) + EPOCH_WEEKDAY_OFFSET) % 7);
+        starts = np.arange(first, last + 1, 7);
+    else:
+        starts = np.arange(first, last + 1);
+
+    return starts.astype("datetime64[s]").astype(np.int64) - tz_offset_seconds;
+
+class BucketIndex:
+    def __init__(self, unit, tz_offset_seconds=0):
+        self.unit = unit;
+        self.tz_offset_seconds = tz_offset_seconds;
+
+        start_time = int(np.datetime64(str(BUCKETS_START_YEAR) + "-01-01", "s").astype(np.int64));
+        end_time = int(np.datetime64(str(BUCKETS_END_YEAR) + "-01-01", "s").astype(np.int64));
+
+        # sorted start times, bucket i covers [starts[i], starts[i + 1])
+        self.starts = bucket_boundaries(unit, start_time, end_time, tz_offset_seconds);
+
+    def __len__(self):
+        return len(self.starts);
+
+    # bucket position for each timestamp (a scalar or array), -1 for anything before the first bucket
+    def bucket_of(self, timestamps):
+        return np.searchsorted(self.starts, timestamps, side="right") - 1;
+
+    # positions of the first and last bucket overlapping [start_time, end_time]
+    def bucket_range(self, start_time, end_time):
+        return max(int(self.bucket_of(start_time)), 0), int(self.bucket_of(end_time));
+
+    def bucket_start(self, position):
+        return int(self.starts[position]);
+
+    def bucket_end(self, position):
+        if (position + 1 < len(self.starts)):
+            return int(self.starts[position + 1]) - 1;
+
+        return None;
+
+    # labels in local time (2019-03-01 for days and weeks, 2019-03 for months, 2019 for years, 2019-03-01T13 for hours)
+    def labels(self, first, last):
+        local_starts = (self.starts[first:last + 1] + self.tz_offset_seconds).astype("datetime64[s]");
+
+        return [str(label) for label in np.datetime_as_string(local_starts, unit=DATETIME64_UNITS[self.unit])];
+
+def valid_tz_offset(tz_offset_seconds):
+    return (tz_offset_seconds % 60 == 0) and (abs(tz_offset_seconds) <= MAX_TZ_OFFSET_SECONDS);
+
+@functools.lru_cache(maxsize=64)
+def get_bucket_index(unit, tz_offset_seconds=0):
+    return BucketIndex(unit, tz_offset_seconds);
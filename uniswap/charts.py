@@ -5,8 +5,20 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import bigquery
-from google.cloud import datastore
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import amount_column
+from uniswap.history_table import timestamp_column
+from uniswap.history_table import normalized_column
+
+from uniswap.buckets import BUCKET_UNITS
+from uniswap.buckets import get_bucket_index
+from uniswap.buckets import valid_tz_offset
+
+from uniswap.query_cache import run_query
+from uniswap.query_cache import snap_end_time
+
+from uniswap.clients import get_datastore_client
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -23,11 +35,7 @@ from eth_utils import (
     to_wei,
 )
 
-# TODO refactor this into a single location
-PROJECT_ID = "uniswap-analytics"
-
-EXCHANGES_DATASET_ID = "exchanges_v1"
-BLOCKS_DATASET_ID = "blocks_v1"
+MAX_CHART_BUCKETS = 10000
 
 # return curret exchange price
 def v1_chart():
@@ -39,41 +47,73 @@ def v1_chart():
     if ((exchange_address is None) or (start_time is None) or (end_time is None) or (unit_type is None)):
         return jsonify(error='exchangeAddress, startTime, endTime and unit required'), 400
 
-    # load the datastore exchange info
-    exchange_info = load_exchange_info(datastore.Client(), exchange_address);
-
     exchange_address = to_checksum_address(exchange_address)
     unit_type = unit_type.lower();
 
-    # query ETH and token balances, taking Purchase and Liquidity events
-    bq_client = bigquery.Client()
+    if ((unit_type in BUCKET_UNITS) == False):
+        return jsonify(error='unit must be one of ' + ", ".join(BUCKET_UNITS)), 400
+
+    try:
+        start_time = int(start_time);
+        # snap an open ended end time to the end of the cache bucket so charts requested in the same window share results
+        end_time = snap_end_time(end_time);
+        # optional timezone offset (seconds east of utc) for where bucket boundaries fall
+        tz_offset = int(request.args.get("tzOffset", 0));
+    except ValueError:
+        return jsonify(error='startTime, endTime and tzOffset must be integers'), 400
+
+    if (valid_tz_offset(tz_offset) == False):
+        return jsonify(error='tzOffset must be a whole number of minutes within 14 hours of utc'), 400
+
+    exchange_info = load_exchange_info(get_datastore_client(), exchange_address);
+
+    if (exchange_info is None):
+        return jsonify(error='no exchange found for this address'), 404
+
+    # rows tools/normalize_history.py hasn't backfilled yet are normalized from their wei amounts
+    token_decimals = exchange_info.get("token_decimals");
+
+    bucket_index = get_bucket_index(unit_type, tz_offset);
+
+    first_bucket, last_bucket = bucket_index.bucket_range(start_time, end_time);
+
+    if ((last_bucket < first_bucket) or (last_bucket - first_bucket >= MAX_CHART_BUCKETS)):
+        return jsonify(error='time range must cover between 1 and ' + str(MAX_CHART_BUCKETS) + ' ' + unit_type + ' buckets'), 400
 
-    exchange_table_id = "exchange_history_" + exchange_address;
-    exchange_table_name = "`" + PROJECT_ID + "." + EXCHANGES_DATASET_ID + "." + exchange_table_id + "`"
+    bucket_labels = bucket_index.labels(first_bucket, last_bucket);
+
+    # assign each row to its bucket in sql: RANGE_BUCKET returns how many of the bucket start times are <= the timestamp
+    bucket_starts = ", ".join([str(bucket_index.bucket_start(position)) for position in range(first_bucket, last_bucket + 1)]);
+    bucket_column = "RANGE_BUCKET(" + timestamp_column() + ", [" + bucket_starts + "]) - 1";
+
+    # query ETH and token balances, taking Purchase and Liquidity events
+    exchange_table_name = history_table_name(exchange_address);
+    exchange_filter = history_filter(exchange_address, start_time, end_time);
 
     bq_query_sql = """
-    	SELECT cast(sum(cast(eth as numeric)) as string) as eth_amount, cast(sum(cast(tokens as numeric)) as string) as token_amount, """ + unit_type + """ as date
+    	SELECT cast(sum(""" + amount_column("eth") + """) as string) as eth_amount, cast(sum(""" + amount_column("tokens") + """) as string) as token_amount,
+    		sum(""" + normalized_column("eth_norm", exchange_address, token_decimals=token_decimals) + """) as eth_norm, sum(""" + normalized_column("tokens_norm", exchange_address, token_decimals=token_decimals) + """) as tokens_norm, """ + bucket_column + """ as bucket
     	FROM """ + exchange_table_name + """
     	where (event = 'TokenPurchase' or event = 'EthPurchase' or event = 'RemoveLiquidity' or event = 'AddLiquidity')
-    		and ((timestamp >= """ + start_time + """) and (timestamp <= """ + end_time + """))
-    	group by """ + unit_type + """
-    	order by """ + unit_type + """ asc """
-
-    print(bq_query_sql);
+    		and """ + exchange_filter + """
+    	group by bucket
+    	order by bucket asc """
 
-    # query the balances for each bucket TODO refer to bucket type parameter to determine how to group transactions
-    balances_query = bq_client.query(bq_query_sql);
-
-    balances_results = balances_query.result();
+    # query the balances for each bucket
+    balances_results = run_query(bq_query_sql, exchange_address=exchange_address, range_end=end_time);
 
     balances_by_bucket = [];
 
+    # bucket -> its entry in balances_by_bucket
+    bucket_entries = {};
+
     # maintain a running total of eth/tokens so we can determine the rate for each bucket
     running_eth_total = 0;
     running_tokens_total = 0;
 
-    token_decimals = exchange_info["token_decimals"];
-
+    # and the same in whole eth / tokens, from the amounts the crawler normalized
+    running_eth_norm = 0;
+    running_tokens_norm = 0;
 
     for row in balances_results:
         eth_amount = int(row.get("eth_amount"));
@@ -82,35 +122,36 @@ def v1_chart():
         running_eth_total += eth_amount;
         running_tokens_total += token_amount;
 
+        running_eth_norm += row.get("eth_norm") or 0;
+        running_tokens_norm += row.get("tokens_norm") or 0;
+
         bucket_rate = running_tokens_total / running_eth_total;
 
-        balances_by_bucket.append({
-            "ethLiquidity" : running_eth_total / 1e18,
-            "tokenLiquidity" : running_tokens_total / (10**token_decimals),
+        bucket_entry = {
+            "ethLiquidity" : running_eth_norm,
+            "tokenLiquidity" : running_tokens_norm,
             "marginalEthRate" : bucket_rate,
-            "date" : row.get("date"),
-        });
+            "date" : bucket_labels[row.get("bucket")],
+            "ethVolume" : 0,
+        };
+
+        bucket_entries[row.get("bucket")] = bucket_entry;
+
+        balances_by_bucket.append(bucket_entry);
 
     # now query for trade volume
     bq_query_sql = """
-    	SELECT cast(sum(abs(cast(eth as numeric))) as string) as trade_volume, """ + unit_type + """
+    	SELECT sum(abs(""" + normalized_column("eth_norm", exchange_address, token_decimals=token_decimals) + """)) as trade_volume, """ + bucket_column + """ as bucket
     	FROM """ + exchange_table_name + """
     	where (event = 'TokenPurchase' or event = 'EthPurchase')
-    		and ((timestamp >= """ + start_time + """) and (timestamp <= """ + end_time + """))
-    	group by """ + unit_type + """
-    	order by """ + unit_type + """ asc """
-
-    print(bq_query_sql);
-
-    volume_query = bq_client.query(bq_query_sql);
-
-    volume_results = volume_query.result();
+    		and """ + exchange_filter + """
+    	group by bucket
+    	order by bucket asc """
 
-    volume_by_bucket = [];
+    volume_results = run_query(bq_query_sql, exchange_address=exchange_address, range_end=end_time);
 
-    index = 0;
     for row in volume_results:
-        balances_by_bucket[index]["ethVolume"] = int(row.get("trade_volume")) / 1e18
-        index += 1;
+        # every trade also moved the balances, so its bucket is always there
+        bucket_entries[row.get("bucket")]["ethVolume"] = row.get("trade_volume") or 0
 
     return jsonify(balances_by_bucket)
@@ -0,0 +1,88 @@
+import threading
+
+from uniswap.config import PROVIDER_URLS
+from uniswap.config import RPC_TIMEOUT_SECONDS
+from uniswap.config import RPC_HEDGE_MIN_MS
+from uniswap.config import RPC_RECORD_DIR
+from uniswap.config import RPC_REPLAY_DIR
+from uniswap.config import RPC_REPLAY_LATENCY_MS
+from uniswap.config import RPC_REPLAY_ERROR_RATE
+
+# process wide registry of api clients. each client does its own auth and channel setup when it's
+# constructed, so we build each one the first time a request asks for it and then reuse it for
+# every later request served by this instance. the google.cloud / web3 imports are deferred until
+# then as well so a request that only needs datastore never loads bigquery, cloud tasks or web3
+_clients = {};
+
+_clients_lock = threading.Lock();
+
+# returns the client registered under name, creating it with factory if this is the first use
+def get_client(name, factory):
+    client = _clients.get(name);
+
+    if (client is None):
+        with _clients_lock:
+            # check again now that we hold the lock, another thread may have beaten us to it
+            client = _clients.get(name);
+
+            if (client is None):
+                client = factory();
+
+                _clients[name] = client;
+
+    return client;
+
+def get_datastore_client():
+    return get_client("datastore", _create_datastore_client);
+
+def get_bigquery_client():
+    return get_client("bigquery", _create_bigquery_client);
+
+def get_tasks_client():
+    return get_client("tasks", _create_tasks_client);
+
+def get_rpc_pool():
+    return get_client("rpc_pool", _create_rpc_pool);
+
+def get_web3():
+    # fetched out here, a factory can't call get_client itself
+    rpc_pool = get_rpc_pool();
+
+    return get_client("web3", lambda: _create_web3(rpc_pool));
+
+def _create_datastore_client():
+    from google.cloud import datastore
+
+    return datastore.Client();
+
+def _create_bigquery_client():
+    from google.cloud import bigquery
+
+    return bigquery.Client();
+
+def _create_tasks_client():
+    from google.cloud import tasks_v2beta3
+
+    return tasks_v2beta3.CloudTasksClient();
+
+def _create_rpc_pool():
+    from uniswap.rpc_pool import RpcPool
+
+    return RpcPool(PROVIDER_URLS, RPC_TIMEOUT_SECONDS, RPC_HEDGE_MIN_MS / 1000.0);
+
+def _create_web3(rpc_pool):
+    import web3
+
+    provider = rpc_pool;
+
+    # offline crawls from recorded fixtures, or recording live traffic into them (see uniswap/rpc_fixtures.py)
+    if (RPC_REPLAY_DIR is not None):
+        from uniswap.rpc_fixtures import FixtureStore, ReplayProvider
+
+        provider = ReplayProvider(FixtureStore(RPC_REPLAY_DIR), RPC_REPLAY_LATENCY_MS, RPC_REPLAY_ERROR_RATE);
+    elif (RPC_RECORD_DIR is not None):
+        from uniswap.rpc_fixtures import FixtureStore, RecordingProvider
+
+        provider = RecordingProvider(provider, FixtureStore(RPC_RECORD_DIR));
+
+    return web3.Web3(provider);
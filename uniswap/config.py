@@ -0,0 +1,71 @@
+# shared settings for the api handlers, crawler and tools. anything that differs per deployment can be
+# overridden with an env variable (see env_variables in app.yaml)
+
+import os
+
+PROJECT_ID = "uniswap-analytics"
+
+PROVIDER_URL = "https://chainkit-1.dev.kyokan.io/eth";
+
+# json-rpc providers (see uniswap/rpc_pool.py), a comma separated list. calls go to the healthiest one and fail
+# over to the others, reads that run past a provider's p95 latency are hedged to a second one
+PROVIDER_URLS = os.environ.get("PROVIDER_URLS", PROVIDER_URL).split(",")
+RPC_TIMEOUT_SECONDS = float(os.environ.get("RPC_TIMEOUT_SECONDS", 30))
+RPC_HEDGE_MIN_MS = float(os.environ.get("RPC_HEDGE_MIN_MS", 50)) # never hedge sooner than this
+
+TASK_QUEUE_ID = "my-appengine-queue"
+TASK_QUEUE_LOCATION = "us-east1"
+
+EXCHANGES_DATASET_ID = "exchanges_v1"
+
+BLOCKS_DATASET_ID = "blocks_v1"
+BLOCKS_TABLE_ID = "block_data"
+
+GENSIS_BLOCK_NUMBER = 6627917 # Uniswap creation https://etherscan.io/tx/0xc1b2646d0ad4a3a151ebdaaa7ef72e3ab1aa13aa49d0b7a3ca020f5ee7b1b010
+
+# query result cache (see uniswap/query_cache.py)
+QUERY_CACHE_BUCKET_SECONDS = int(os.environ.get("QUERY_CACHE_BUCKET_SECONDS", 60 * 15)) # open ended time ranges run to the next 15 minute mark
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 256))
+QUERY_CACHE_MAX_ROWS = int(os.environ.get("QUERY_CACHE_MAX_ROWS", 50000)) # larger results are never cached
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", 60 * 60))
+QUERY_CACHE_REDIS_URL = os.environ.get("QUERY_CACHE_REDIS_URL") # optional shared tier across instances
+QUERY_CACHE_OPEN_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_OPEN_TTL_SECONDS", 60 * 5)) # without redis, how stale results reaching the present can get
+
+# redis the crawler publishes new trades to and /api/v1/stream instances listen on (see uniswap/trade_broker.py),
+# the query cache's redis unless set. unset, trades only reach streams on the instance that crawled them
+STREAM_REDIS_URL = os.environ.get("STREAM_REDIS_URL", QUERY_CACHE_REDIS_URL)
+
+# exchange history tables. v1 is one exchange_history_<address> table per exchange with string amounts, v2 is a
+# single table for every exchange, partitioned by day and clustered by exchange and event (see uniswap/history_table.py)
+HISTORY_V2_DATASET_ID = "exchanges_v2"
+HISTORY_V2_TABLE_ID = "exchange_history"
+
+HISTORY_READ_VERSION = int(os.environ.get("HISTORY_READ_VERSION", 1))
+HISTORY_WRITE_VERSIONS = [int(version) for version in os.environ.get("HISTORY_WRITE_VERSIONS", "1").split(",")]
+
+# directory the crawler archives raw exchange logs to (see uniswap/log_archive.py), archiving is off when unset
+LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR")
+
+# json-rpc record / replay (see uniswap/rpc_fixtures.py). when RPC_RECORD_DIR is set every provider response is
+# saved there, when RPC_REPLAY_DIR is set responses are served from there instead of the provider
+RPC_RECORD_DIR = os.environ.get("RPC_RECORD_DIR")
+RPC_REPLAY_DIR = os.environ.get("RPC_REPLAY_DIR")
+RPC_REPLAY_LATENCY_MS = float(os.environ.get("RPC_REPLAY_LATENCY_MS", 0)) # added to every replayed call
+RPC_REPLAY_ERROR_RATE = float(os.environ.get("RPC_REPLAY_ERROR_RATE", 0)) # fraction of replayed calls that fail
+
+# per request profiling (see uniswap/profiling.py), off unless PROFILE_DIR is set. then requests with an X-Profile
+# header set to PROFILE_TOKEN, plus PROFILE_SAMPLE_RATE of all other requests, are profiled into PROFILE_DIR
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN") # unset, the X-Profile header is ignored
+
+# how often buffered datastore writes are flushed (see uniswap/write_buffer.py)
+WRITE_BUFFER_FLUSH_SECONDS = float(os.environ.get("WRITE_BUFFER_FLUSH_SECONDS", 5))
+
+# how the ticker computes its stats on a cache miss: "sql" for one aggregate query, "python" to pull every row in
+# the window and aggregate here (also used whenever the aggregate query fails)
+TICKER_AGGREGATION = os.environ.get("TICKER_AGGREGATION", "sql")
+
+# blocks the crawler fetches, writes and checkpoints at a time within each crawl (see uniswap/crawl.py), which
+# bounds its memory by the busiest sub-range rather than the whole crawl window
+CRAWL_PAGE_BLOCKS = int(os.environ.get("CRAWL_PAGE_BLOCKS", 1000))
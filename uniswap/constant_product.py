@@ -0,0 +1,68 @@
+import numpy as np
+
+# x * y = k pricing for v1 exchanges, shared by /quote, /depth (uniswap/quote.py) and /cross (uniswap/cross.py).
+#
+# Reserves are dicts with "eth" and "tokens" in base units (see quote.exchange_reserves). Nothing here imports
+# flask or talks to the datastore.
+#
+#   side=buy   pay eth, receive tokens
+#   side=sell  pay tokens, receive eth
+
+# every v1 exchange charges a fixed 0.3% liquidity provider fee on the input
+PROVIDER_FEE = 0.003
+
+# the same fee as the contract applies it, keeping 997 / 1000 of the input
+FEE_NUMERATOR = 997
+FEE_DENOMINATOR = 1000
+
+# what the contract pays out for input_amount (its getInputPrice), in python ints so amounts past 2 ** 53 stay exact
+def get_input_price(input_amount, input_reserve, output_reserve):
+    input_with_fee = input_amount * FEE_NUMERATOR;
+
+    denominator = (input_reserve * FEE_DENOMINATOR) + input_with_fee;
+
+    # an empty pool pays nothing
+    if (denominator == 0):
+        return 0;
+
+    return (input_with_fee * output_reserve) // denominator;
+
+# (input reserve, output reserve) for a side
+def side_liquidity(reserves, side):
+    if (side == "buy"):
+        return reserves["eth"], reserves["tokens"];
+
+    return reserves["tokens"], reserves["eth"];
+
+# input and output amounts (lists of ints) and effective price and price impact (fee included, numpy arrays) of
+# every input amount
+def quote_amounts(reserves, side, input_amounts):
+    input_reserve, output_reserve = side_liquidity(reserves, side);
+
+    input_amounts = [int(amount) for amount in input_amounts];
+    output_amounts = [get_input_price(amount, input_reserve, output_reserve) for amount in input_amounts];
+
+    # prices only need float precision
+    input_values = np.array(input_amounts, dtype=np.float64);
+    output_values = np.array(output_amounts, dtype=np.float64);
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # tokens per eth, like the marginal price
+        if (side == "buy"):
+            prices = output_values / input_values;
+        else:
+            prices = input_values / output_values;
+
+        marginal_price = np.float64(reserves["tokens"]) / np.float64(reserves["eth"]);
+
+        # how much worse than the marginal price each trade fills, buyers get fewer tokens per eth and sellers give up more
+        if (side == "buy"):
+            price_impacts = 1 - (prices / marginal_price);
+        else:
+            price_impacts = (prices / marginal_price) - 1;
+
+        # zero sized trades (0 / 0) and sells too small to pay out any eth (x / 0)
+        price_impacts = np.where(np.isnan(price_impacts), 0.0, np.where(np.isinf(price_impacts), 1.0, price_impacts));
+        prices = np.where(np.isfinite(prices), prices, 0.0);
+
+    return input_amounts, output_amounts, prices, price_impacts;
@@ -0,0 +1,174 @@
+from uniswap.config import PROJECT_ID
+from uniswap.config import BLOCKS_DATASET_ID
+from uniswap.config import BLOCKS_TABLE_ID
+
+from uniswap.decode import serialize_log
+from uniswap.decode import decode_exchange_log
+from uniswap.decode import apply_running_totals
+from uniswap.decode import normalize_rows
+from uniswap.decode import decode_transfer_log
+
+from uniswap.log_archive import archive_logs
+
+from uniswap.query_cache import run_query
+
+# The crawler's pipeline stages, shared by /tasks/crawl (uniswap/crawl.py) and tools/benchmark_crawl.py.
+#
+# A crawl covers up to MAX_BLOCKS_TO_CRAWL blocks as a pipeline of generators over CRAWL_PAGE_BLOCKS sized
+# sub-ranges: fetch_log_pages -> timestamp_pages -> decode_pages -> commit_batch. Each sub-range is written and
+# checkpointed before the next one is fetched, so only one sub-range's logs and rows are ever held at a time and
+# a failure part way through keeps the sub-ranges already committed. commit_batch and the request handler stay in
+# crawl.py, nothing here imports flask.
+
+# the exchange's logs in [from_block, to_block], yields (first block, last block, logs) for each sub-range
+def fetch_log_pages(web3, exchange_address, from_block, to_block, page_blocks):
+    for page_from in range(from_block, to_block + 1, page_blocks):
+        page_to = min(page_from + page_blocks - 1, to_block);
+
+        logs = web3.eth.getLogs(
+            {
+                "fromBlock": page_from,
+                "toBlock": page_to,
+                "address": [
+                    exchange_address
+                ]
+            }
+        )
+
+        logs = [serialize_log(log) for log in logs];
+
+        print("received " + str(len(logs)) + " exchange logs for blocks " + str(page_from) + " to " + str(page_to));
+
+        yield page_from, page_to, logs;
+
+# block -> timestamp for the given (sorted) block numbers, from bigquery and then the provider for any the block
+# fetcher missed (or hasn't reached yet). blocks neither has are left out
+def load_block_timestamps(block_numbers):
+    block_table_name = "`" + PROJECT_ID + "." + BLOCKS_DATASET_ID + "." + BLOCKS_TABLE_ID + "`"
+
+    # query all the blocks and their associated timestamps
+    block_results = run_query("""
+        SELECT
+          CAST(block as INT64) as block, CAST(timestamp as INT64) as timestamp
+        FROM """ + block_table_name + """
+        WHERE block >= """ + str(block_numbers[0]) + """ and block <= """ + str(block_numbers[-1]) + """ order by block asc""", use_cache=False)
+
+    block_to_timestamps = dict([(row.get("block"), row.get("timestamp")) for row in block_results]);
+
+    missing_blocks = [block_number for block_number in block_numbers if ((block_number in block_to_timestamps) == False)];
+
+    if (len(missing_blocks) > 0):
+        print("Backfilling " + str(len(missing_blocks)) + " blocks missing timestamps");
+
+        from uniswap.blocks import backfill_blocks
+
+        try:
+            block_to_timestamps.update(backfill_blocks(missing_blocks));
+        except Exception as e:
+            print("Failed to backfill block timestamps: " + str(e));
+
+    return block_to_timestamps;
+
+# sets blockTimestamp on each page's logs and archives them. never drops logs: a page is cut short before the
+# first block we still can't time and the pipeline ends with it, so the checkpoint stops short of that block and
+# the next crawl retries it. load_timestamps is load_block_timestamps unless benchmarking without bigquery
+def timestamp_pages(exchange_address, pages, load_timestamps=load_block_timestamps):
+    for page_from, page_to, logs in pages:
+        truncated = False;
+
+        if (len(logs) > 0):
+            block_numbers = sorted(set([log["blockNumber"] for log in logs]));
+
+            block_to_timestamps = load_timestamps(block_numbers);
+
+            still_missing = [block_number for block_number in block_numbers if ((block_number in block_to_timestamps) == False)];
+
+            if (len(still_missing) > 0):
+                print("No timestamp found for block " + str(still_missing[0]) + ", crawling up to it");
+
+                logs = [log for log in logs if log["blockNumber"] < still_missing[0]];
+
+                page_to = still_missing[0] - 1;
+                truncated = True;
+
+            for log in logs:
+                log["blockTimestamp"] = block_to_timestamps[log["blockNumber"]];
+
+        # nothing in this page could be timed
+        if (page_to < page_from):
+            return;
+
+        # keep the raw logs (with their timestamps) for local rebuilds. an empty segment still records that the
+        # range had no logs
+        try:
+            archive_logs(exchange_address, page_from, page_to, logs);
+        except Exception as e:
+            # the archive is only used for rebuilds, don't hold up the crawl for it
+            print("Failed to archive logs: " + str(e));
+
+        yield page_from, page_to, logs;
+
+        if (truncated):
+            return;
+
+# decodes each page's logs into history rows (with running totals and normalized amounts) and pool token
+# transfers. only the rows and transfers are passed on, the raw logs are dropped here
+def decode_pages(pages, cur_eth_total, cur_tokens_total, token_decimals):
+    for page_from, page_to, logs in pages:
+        # holds the rows that we'll insert into bigquery for this exchange
+        rows = [];
+
+        # pool token transfers, for the liquidity provider balances
+        transfers = [];
+
+        for log in logs:
+            transfer = decode_transfer_log(log, log["blockTimestamp"]);
+
+            if (transfer is not None):
+                transfers.append(transfer);
+                continue;
+
+            event_clean = decode_exchange_log(log, log["blockTimestamp"]);
+
+            # skip approval events
+            if (event_clean is None):
+                continue;
+
+            rows.append(event_clean);
+
+        # track the current eth and token totals as of each transaction
+        cur_eth_total, cur_tokens_total = apply_running_totals(rows, cur_eth_total, cur_tokens_total);
+
+        # whole eth / token amounts and prices, so nothing downstream converts wei
+        normalize_rows(rows, token_decimals);
+
+        yield {
+            "from_block" : page_from,
+            "to_block" : page_to,
+            "log_count" : len(logs),
+
+            "rows" : rows,
+            "transfers" : transfers,
+
+            "cur_eth_total" : cur_eth_total,
+            "cur_tokens_total" : cur_tokens_total
+        }
+
+# runs decoded batches through commit(batch, checkpoint) -> new checkpoint and returns the last checkpoint. a page
+# without logs has nothing to write, it's checkpointed with the next page that does (or at the end)
+def commit_batches(batches, commit, checkpoint_block_number):
+    pending_batch = None;
+
+    for batch in batches:
+        if (batch["log_count"] == 0):
+            pending_batch = batch;
+            continue;
+
+        checkpoint_block_number = commit(batch, checkpoint_block_number);
+
+        pending_batch = None;
+
+    if (pending_batch is not None):
+        checkpoint_block_number = commit(pending_batch, checkpoint_block_number);
+
+    return checkpoint_block_number;
@@ -0,0 +1,179 @@
+import numpy as np
+
+from flask import request, jsonify
+
+from uniswap.constant_product import PROVIDER_FEE
+from uniswap.constant_product import get_input_price
+
+from uniswap.quote import MAX_QUOTE_AMOUNTS
+from uniswap.quote import get_all_reserves
+
+# Token to token prices through eth, the way v1 routes them: sell the from token on its exchange for eth, then buy
+# the to token with that eth on its exchange, paying the liquidity provider fee on both.
+#
+# Reserves come from uniswap/quote.py's in-memory cache of every exchange, and each hop's output is the
+# contract's exact integer payout (constant_product.get_input_price). Marginal rates only need float precision, so
+# the full N x N matrix of them is one vectorized numpy pass. Amounts are in base units (as strings) and rates are
+# to token base units per from token base unit, like /price.
+
+class ReservesSnapshot:
+    def __init__(self, exchanges):
+        self.exchanges = exchanges;
+
+        self.eth = np.array([float(exchange["eth"]) for exchange in exchanges], dtype=np.float64);
+        self.tokens = np.array([float(exchange["tokens"]) for exchange in exchanges], dtype=np.float64);
+
+        # token or exchange address (lowercase) -> position
+        self.positions = {};
+
+        for position, exchange in enumerate(exchanges):
+            self.positions[exchange["token_address"].lower()] = position;
+            self.positions[exchange["address"].lower()] = position;
+
+    def position(self, address):
+        return self.positions.get(address.lower());
+
+    # marginal rates (no fees) between every from / to pair, from down the rows and to across the columns
+    def rate_matrix(self, from_positions, to_positions):
+        eth_per_token = self.eth[from_positions] / self.tokens[from_positions];
+        tokens_per_eth = self.tokens[to_positions] / self.eth[to_positions];
+
+        return np.outer(eth_per_token, tokens_per_eth);
+
+    # eth the from exchange pays for input_amount of its token (the first hop)
+    def sell_amount(self, from_position, input_amount):
+        exchange = self.exchanges[from_position];
+
+        return get_input_price(input_amount, exchange["tokens"], exchange["eth"]);
+
+    # to tokens the to exchange pays for eth_amount (the second hop)
+    def buy_amount(self, to_position, eth_amount):
+        exchange = self.exchanges[to_position];
+
+        return get_input_price(eth_amount, exchange["eth"], exchange["tokens"]);
+
+# every exchange with liquidity on both sides, by symbol
+def get_reserves_snapshot():
+    exchanges = [exchange for exchange in get_all_reserves() if ((exchange["eth"] > 0) and (exchange["tokens"] > 0))];
+
+    return ReservesSnapshot(sorted(exchanges, key=lambda exchange: exchange["symbol"]));
+
+def token_json(exchange):
+    return {
+        "symbol" : exchange["symbol"],
+        "tokenAddress" : exchange["token_address"],
+        "exchangeAddress" : exchange["address"],
+        "tokenDecimals" : exchange["token_decimals"]
+    }
+
+# the cross rate between two tokens (token or exchange addresses), plus the two hop output of each of amounts
+def v1_cross():
+    from_address = request.args.get("from");
+    to_address = request.args.get("to");
+    amounts = request.args.get("amounts");
+
+    if ((from_address is None) or (to_address is None)):
+        return jsonify(error='from and to required'), 400
+
+    try:
+        amounts = [] if (amounts is None) else [int(amount) for amount in amounts.split(",")];
+    except ValueError:
+        return jsonify(error='amounts must be integers'), 400
+
+    if ((len(amounts) > MAX_QUOTE_AMOUNTS) or (min(amounts + [0]) < 0)):
+        return jsonify(error='amounts must be at most ' + str(MAX_QUOTE_AMOUNTS) + ' non negative integers'), 400
+
+    snapshot = get_reserves_snapshot();
+
+    from_position = snapshot.position(from_address);
+    to_position = snapshot.position(to_address);
+
+    if ((from_position is None) or (to_position is None)):
+        return jsonify(error='no exchange with liquidity found for from / to'), 404
+
+    if (from_position == to_position):
+        return jsonify(error='from and to are the same token'), 400
+
+    rate = float(snapshot.rate_matrix([from_position], [to_position])[0][0]);
+
+    quotes = [];
+
+    for amount in amounts:
+        eth_amount = snapshot.sell_amount(from_position, amount);
+        output_amount = snapshot.buy_amount(to_position, eth_amount);
+
+        price = (output_amount / amount) if (amount > 0) else 0;
+
+        quotes.append({
+            "inputAmount" : str(amount),
+            "ethAmount" : str(eth_amount),
+            "outputAmount" : str(output_amount),
+
+            "price" : price,
+            "priceImpact" : (1 - price / rate) if (amount > 0) else 0
+        })
+
+    result = {
+        "from" : token_json(snapshot.exchanges[from_position]),
+        "to" : token_json(snapshot.exchanges[to_position]),
+        "fee" : PROVIDER_FEE,
+
+        "rate" : rate,
+        "quotes" : quotes
+    }
+
+    return jsonify(result)
+
+# cross rates between every pair of tokens (or only the comma separated tokens given). with amountEth, also the
+# two hop output of trading each row's token worth amountEth (at its marginal price) into each column's token
+def v1_cross_matrix():
+    tokens = request.args.get("tokens");
+    amount_eth = request.args.get("amountEth");
+
+    try:
+        amount_eth = None if (amount_eth is None) else int(amount_eth);
+    except ValueError:
+        return jsonify(error='amountEth must be an integer'), 400
+
+    if ((amount_eth is not None) and (amount_eth < 0)):
+        return jsonify(error='amountEth must not be negative'), 400
+
+    snapshot = get_reserves_snapshot();
+
+    if (tokens is None):
+        positions = np.arange(len(snapshot.exchanges));
+    else:
+        positions = [snapshot.position(address) for address in tokens.split(",")];
+
+        if (None in positions):
+            return jsonify(error='no exchange with liquidity found for ' + tokens.split(",")[positions.index(None)]), 404
+
+        positions = np.array(positions, dtype=np.int64);
+
+    rates = snapshot.rate_matrix(positions, positions);
+
+    # a token doesn't trade against itself
+    np.fill_diagonal(rates, np.nan);
+
+    result = {
+        "tokens" : [token_json(snapshot.exchanges[position]) for position in positions],
+        "fee" : PROVIDER_FEE,
+
+        # rates[i][j] is token j per token i, null on the diagonal
+        "rates" : [[None if np.isnan(rate) else rate for rate in row] for row in rates.tolist()]
+    }
+
+    if (amount_eth is not None):
+        # each row's token worth amount_eth at its marginal price, rounded down
+        input_amounts = [(amount_eth * snapshot.exchanges[position]["tokens"]) // snapshot.exchanges[position]["eth"] for position in positions];
+
+        eth_amounts = [snapshot.sell_amount(position, input_amount) for position, input_amount in zip(positions, input_amounts)];
+
+        result["amountEth"] = str(amount_eth);
+        result["inputAmounts"] = [str(amount) for amount in input_amounts];
+
+        # outputAmounts[i][j] is token j for row i's input amount, null on the diagonal
+        result["outputAmounts"] = [[None if (i == j) else str(snapshot.buy_amount(to_position, eth_amount)) for j, to_position in enumerate(positions)]
+            for i, eth_amount in enumerate(eth_amounts)];
+
+    return jsonify(result)
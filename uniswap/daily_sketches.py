@@ -0,0 +1,369 @@
+import json
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+
+from flask import request, jsonify
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.sketches import SpaceSaving
+from uniswap.sketches import HyperLogLog
+from uniswap.sketches import TDigest
+from uniswap.sketches import encode_sketch
+from uniswap.sketches import decode_sketch
+
+from uniswap.decode import ETH_DECIMALS
+
+from eth_utils import is_address, to_checksum_address
+
+# Per exchange, per day trade summaries (see uniswap/sketches.py), so leaderboards and the like over any range
+# of days are a merge of a few small sketches instead of a query over history.
+#
+#   daily_sketch  key <exchange>:<day> (day is the utc YYYY-MM-DD), and all.<shard>:<day> for every exchange
+#                 combined. one compressed blob property per entry in SKETCHES, plus first_blocks: json of sketch
+#                 name -> the lowest block fed to it, so tools/build_daily_sketches.py only backfills what's below that
+#
+# The crawler feeds each batch's rows in the same transaction as its checkpoint (see
+# market_stats.put_exchange_with_market_stats), so every row is counted exactly once. Each exchange feeds one of
+# ALL_EXCHANGES_SHARDS combined entities, so checkpoints of different exchanges rarely contend for the same one,
+# and reads for every exchange merge the shards. Entities from before the shards (all:<day>) hold rows no shard
+# has, so they're merged in as well.
+
+DAILY_SKETCH_KIND = "daily_sketch"
+
+# key prefix of the entities summarizing every exchange
+ALL_EXCHANGES = "all"
+
+ALL_EXCHANGES_SHARDS = 16
+
+MAX_SKETCH_DAYS = 366
+
+DEFAULT_SKETCH_DAYS = 7
+
+def trade_rows(rows):
+    return [row for row in rows if ((row["event"] == "EthPurchase") or (row["event"] == "TokenPurchase"))];
+
+# top traders by eth volume, buys and sells alike
+def feed_leaders(sketch, rows):
+    for row in trade_rows(rows):
+        if (row.get("user") is not None):
+            sketch.update(row["user"].lower(), abs(int(row["eth"])));
+
+# distinct traders
+def feed_traders(sketch, rows):
+    for row in trade_rows(rows):
+        if (row.get("user") is not None):
+            sketch.add(row["user"].lower());
+
+# trade sizes in wei, buys and sells alike
+def feed_trade_sizes(sketch, rows):
+    for row in trade_rows(rows):
+        sketch.add(abs(int(row["eth"])));
+
+# sketch name -> (sketch class, function that feeds it a day's history rows)
+SKETCHES = OrderedDict([
+    ("leaders", (SpaceSaving, feed_leaders)),
+    ("traders", (HyperLogLog, feed_traders)),
+    ("trade_sizes", (TDigest, feed_trade_sizes))
+])
+
+DEFAULT_TRADE_SIZE_QUANTILES = [0.5, 0.9, 0.99]
+
+def row_day(row):
+    return datetime.utcfromtimestamp(int(row["timestamp"])).strftime("%Y-%m-%d");
+
+# utc days from start_time's through end_time's, oldest first
+def days_between(start_time, end_time):
+    first = datetime.utcfromtimestamp(int(start_time)).date();
+    last = datetime.utcfromtimestamp(int(end_time)).date();
+
+    return [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - first).days + 1)];
+
+# the combined entity prefix an exchange feeds
+def all_exchanges_shard(exchange_address):
+    return ALL_EXCHANGES + "." + str(int(exchange_address[2:], 16) % ALL_EXCHANGES_SHARDS);
+
+# the stored prefixes to read for a prefix, every shard (and the unsharded entities) for ALL_EXCHANGES
+def stored_prefixes(prefix):
+    if (prefix == ALL_EXCHANGES):
+        return [ALL_EXCHANGES] + [ALL_EXCHANGES + "." + str(shard) for shard in range(ALL_EXCHANGES_SHARDS)];
+
+    return [prefix];
+
+# the prefix a stored entity's sketch counts towards
+def read_prefix(entity):
+    if (entity["exchange"].startswith(ALL_EXCHANGES + ".")):
+        return ALL_EXCHANGES;
+
+    return entity["exchange"];
+
+# stored day entities of the given prefixes over days, datastore limits a lookup to 1000 keys
+def get_day_entities(ds_client, prefixes, days):
+    keys = [daily_sketch_key(ds_client, stored_prefix, day) for prefix in prefixes for stored_prefix in stored_prefixes(prefix) for day in days];
+
+    entities = [];
+
+    for start in range(0, len(keys), 1000):
+        entities += ds_client.get_multi(keys[start:start + 1000]);
+
+    return entities;
+
+def daily_sketch_key(ds_client, prefix, day):
+    return ds_client.key(DAILY_SKETCH_KIND, prefix + ":" + day);
+
+def new_daily_sketch(ds_client, prefix, day):
+    from google.cloud import datastore
+
+    entity = datastore.Entity(key=daily_sketch_key(ds_client, prefix, day), exclude_from_indexes=["first_blocks"] + list(SKETCHES.keys()));
+
+    entity.update({
+        "exchange" : prefix,
+        "day" : day,
+        "first_blocks" : "{}"
+    })
+
+    return entity;
+
+# the named sketch stored on entity, or an empty one
+def load_sketch(entity, name):
+    sketch_class = SKETCHES[name][0];
+
+    if ((entity is None) or (entity.get(name) is None)):
+        return sketch_class();
+
+    return decode_sketch(sketch_class, entity[name]);
+
+def rows_by_day(rows):
+    days = OrderedDict();
+
+    for row in rows:
+        days.setdefault(row_day(row), []).append(row);
+
+    return days;
+
+# (exchange day entity, its all exchanges shard's day entity) for each day, as currently stored (or new)
+def load_day_entities(ds_client, exchange_address, days):
+    shard = all_exchanges_shard(exchange_address);
+
+    keys = [];
+
+    for day in days:
+        keys += [daily_sketch_key(ds_client, exchange_address, day), daily_sketch_key(ds_client, shard, day)];
+
+    stored = dict([(entity.key.name, entity) for entity in ds_client.get_multi(keys)]);
+
+    pairs = [];
+
+    for day in days:
+        pairs.append((
+            stored.get(exchange_address + ":" + day) or new_daily_sketch(ds_client, exchange_address, day),
+            stored.get(shard + ":" + day) or new_daily_sketch(ds_client, shard, day)
+        ));
+
+    return pairs;
+
+# feeds a day's rows to the named sketch on each entity
+def feed_entities(entities, name, rows):
+    for entity in entities:
+        sketch = load_sketch(entity, name);
+
+        SKETCHES[name][1](sketch, rows);
+
+        entity[name] = encode_sketch(sketch);
+
+# called by the crawler inside its checkpoint transaction with the rows it's committing for an exchange, returns
+# the updated day entities to put along with the checkpoint
+def update_daily_sketches(ds_client, exchange_address, rows):
+    if (len(rows) == 0):
+        return [];
+
+    days = rows_by_day(rows);
+
+    entities = [];
+
+    for (exchange_day, all_day), day_rows in zip(load_day_entities(ds_client, exchange_address, list(days.keys())), days.values()):
+        first_blocks = json.loads(exchange_day["first_blocks"]);
+
+        for name in SKETCHES.keys():
+            feed_entities([exchange_day, all_day], name, day_rows);
+
+            # the backfill tool covers everything below the first block we fed
+            if ((name in first_blocks) == False):
+                first_blocks[name] = min([row["block"] for row in day_rows]);
+
+        exchange_day["first_blocks"] = json.dumps(first_blocks);
+
+        entities += [exchange_day, all_day];
+
+    return entities;
+
+# the named sketch for an exchange (or ALL_EXCHANGES) merged over days, and how many of those days had one
+def load_merged_sketch(ds_client, name, prefix, days):
+    merged = SKETCHES[name][0]();
+
+    days_found = set();
+
+    for entity in get_day_entities(ds_client, [prefix], days):
+        if (entity.get(name) is None):
+            continue;
+
+        merged.merge(load_sketch(entity, name));
+        days_found.add(entity["day"]);
+
+    return merged, len(days_found);
+
+# estimated distinct traders on each of the given exchanges (or ALL_EXCHANGES) over days, address -> count
+def unique_traders(ds_client, prefixes, days):
+    merged = dict([(prefix, HyperLogLog()) for prefix in prefixes]);
+
+    for entity in get_day_entities(ds_client, prefixes, days):
+        if (entity.get("traders") is not None):
+            merged[read_prefix(entity)].merge(load_sketch(entity, "traders"));
+
+    return dict([(prefix, sketch.count()) for prefix, sketch in merged.items()]);
+
+# parses the exchangeAddress / startTime / endTime parameters of a sketch endpoint into (prefix, days), or an
+# error response. days default to the DEFAULT_SKETCH_DAYS up to now, and every exchange when no address is given
+def sketch_params():
+    exchange_address = request.args.get("exchangeAddress");
+
+    if (exchange_address is None):
+        prefix = ALL_EXCHANGES;
+    elif (is_address(exchange_address)):
+        prefix = to_checksum_address(exchange_address);
+    else:
+        return None, None, (jsonify(error='invalid exchange address'), 400)
+
+    try:
+        end_time = int(request.args.get("endTime", time.time()));
+        start_time = int(request.args.get("startTime", end_time - ((DEFAULT_SKETCH_DAYS - 1) * 24 * 60 * 60)));
+    except ValueError:
+        return None, None, (jsonify(error='startTime and endTime must be integers'), 400)
+
+    if (start_time > end_time):
+        return None, None, (jsonify(error='startTime must be before endTime'), 400)
+
+    days = days_between(start_time, end_time);
+
+    if (len(days) > MAX_SKETCH_DAYS):
+        return None, None, (jsonify(error='at most ' + str(MAX_SKETCH_DAYS) + ' days'), 400)
+
+    return prefix, days, None;
+
+# the top traders by eth volume on an exchange (or every exchange) over the days from startTime to endTime
+def v1_leaderboard():
+    prefix, days, error = sketch_params();
+
+    if (error is not None):
+        return error;
+
+    try:
+        count = min(int(request.args.get("count", 20)), SpaceSaving.DEFAULT_CAPACITY);
+    except ValueError:
+        return jsonify(error='invalid parameter: count'), 400
+
+    if (count < 1):
+        return jsonify(error='invalid parameter: count'), 400
+
+    leaders, days_found = load_merged_sketch(get_datastore_client(), "leaders", prefix, days);
+
+    traders = [];
+
+    for user, volume, error in leaders.top(count):
+        traders.append({
+            "user" : user,
+
+            # the true volume is between ethVolumeMin and ethVolume
+            "ethVolume" : str(volume),
+            "ethVolumeMin" : str(volume - error),
+            "error" : str(error)
+        })
+
+    # untracked traders are bounded by the smallest counter, tracked ones past count by their own
+    max_unlisted = leaders.min_count();
+
+    if (len(leaders.counters) > count):
+        max_unlisted = max(max_unlisted, leaders.top(count + 1)[-1][1]);
+
+    result = {
+        "exchangeAddress" : None if (prefix == ALL_EXCHANGES) else prefix,
+        "startDay" : days[0],
+        "endDay" : days[-1],
+        "daysWithData" : days_found,
+
+        "traders" : traders,
+
+        # any trader not listed traded at most this much
+        "maxUnlistedVolume" : str(max_unlisted)
+    }
+
+    return jsonify(result)
+
+# estimated distinct traders on an exchange (or every exchange) over the days from startTime to endTime
+def v1_unique_traders():
+    prefix, days, error = sketch_params();
+
+    if (error is not None):
+        return error;
+
+    traders, days_found = load_merged_sketch(get_datastore_client(), "traders", prefix, days);
+
+    result = {
+        "exchangeAddress" : None if (prefix == ALL_EXCHANGES) else prefix,
+        "startDay" : days[0],
+        "endDay" : days[-1],
+        "daysWithData" : days_found,
+
+        "uniqueTraders" : traders.count(),
+        "relativeError" : float(traders.relative_error())
+    }
+
+    return jsonify(result)
+
+# estimated trade size (eth) quantiles on an exchange (or every exchange) over the days from startTime to endTime,
+# quantiles is a comma separated list between 0 and 1 (default p50, p90, p99)
+def v1_trade_sizes():
+    prefix, days, error = sketch_params();
+
+    if (error is not None):
+        return error;
+
+    quantiles = request.args.get("quantiles");
+
+    try:
+        quantiles = DEFAULT_TRADE_SIZE_QUANTILES if (quantiles is None) else [float(q) for q in quantiles.split(",")];
+    except ValueError:
+        return jsonify(error='quantiles must be numbers'), 400
+
+    if ((len(quantiles) > 100) or (min(quantiles) < 0) or (max(quantiles) > 1)):
+        return jsonify(error='quantiles must be at most 100 numbers between 0 and 1'), 400
+
+    trade_sizes, days_found = load_merged_sketch(get_datastore_client(), "trade_sizes", prefix, days);
+
+    eth_unit = 10 ** ETH_DECIMALS;
+
+    values = trade_sizes.quantiles(quantiles);
+
+    result = {
+        "exchangeAddress" : None if (prefix == ALL_EXCHANGES) else prefix,
+        "startDay" : days[0],
+        "endDay" : days[-1],
+        "daysWithData" : days_found,
+
+        "tradeCount" : int(trade_sizes.total_weight()),
+
+        # exact, the quantiles in between are estimates
+        "minEthAmount" : None if (trade_sizes.min is None) else str(int(trade_sizes.min)),
+        "maxEthAmount" : None if (trade_sizes.max is None) else str(int(trade_sizes.max)),
+
+        "quantiles" : [{
+            "quantile" : q,
+            "ethAmount" : None if (value is None) else str(int(value)),
+            "ethAmountNorm" : None if (value is None) else value / eth_unit
+        } for q, value in zip(quantiles, values)]
+    }
+
+    return jsonify(result)
@@ -0,0 +1,230 @@
+import os
+import json
+import functools
+
+from datetime import datetime
+
+from eth_utils import (
+    keccak as eth_utils_keccak,
+    remove_0x_prefix,
+)
+
+# Decoding of exchange contract logs into history rows. Shared by the crawler and the tools that rebuild
+# history from archived logs, so both produce exactly the same rows.
+#
+# Logs are handled as plain dicts (see serialize_log) so they can be archived as json and decoded again later
+# without web3.
+
+EXCHANGE_ABI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "exchangeABI.json")
+
+# every row in history sits at block * 10000 + tx index (tx_order is a single number for determining distinct transactions and order)
+TX_ORDER_PER_BLOCK = 10000
+
+# events that don't move the pool's eth / token balances
+SKIPPED_EVENTS = ["Transfer", "Approval"]
+
+ETH_DECIMALS = 18
+
+# orders logs across blocks, block * 100000 + log index
+LOG_ORDER_PER_BLOCK = 100000
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+def to_hex(value):
+    if (isinstance(value, str)):
+        return value;
+
+    value = value.hex();
+
+    if (value.startswith("0x") == False):
+        value = "0x" + value;
+
+    return value;
+
+# converts a web3 log into a json friendly dict
+def serialize_log(log):
+    return {
+        "blockNumber" : log["blockNumber"],
+        "transactionIndex" : log["transactionIndex"],
+        "transactionHash" : to_hex(log["transactionHash"]),
+        "logIndex" : log["logIndex"],
+        "topics" : [to_hex(topic) for topic in log["topics"]],
+        "data" : to_hex(log["data"])
+    }
+
+# topic hash -> event name, input types and input names for every event in the exchange abi
+@functools.lru_cache(maxsize=1)
+def load_topic_hashes():
+    exchange_abi = json.loads(open(EXCHANGE_ABI_PATH, "r").read());
+
+    topic_hashes = {}
+
+    # collect up event topics
+    for event in exchange_abi:
+        if (event.get("type") != "event"):
+            continue;
+
+        # store the data needed to decode log data
+        event_data = {
+            "event" : event["name"],
+            "input_types" : [input_data["type"] for input_data in event["inputs"]],
+            "input_names" : [input_data["name"] for input_data in event["inputs"]]
+        }
+
+        # the string that we Keccak-256 hash to find the topic hash for this event (ie "RemoveLiquidity(address,uint256,uint256)")
+        event_input_txt = event["name"] + "(" + ",".join(event_data["input_types"]) + ")";
+
+        # associate the event data with its topic hash
+        topic_hashes[remove_0x_prefix(eth_utils_keccak(text=event_input_txt).hex())] = event_data;
+
+    return topic_hashes;
+
+# the abi event for a log
+def log_event(log):
+    return load_topic_hashes()[remove_0x_prefix(log["topics"][0])];
+
+# decodes a trade / liquidity log into a history row (without the running totals, see apply_running_totals).
+# returns None for events we don't keep in history
+def decode_exchange_log(log, block_timestamp):
+    event = log_event(log);
+
+    event_type = event["event"];
+
+    if (event_type in SKIPPED_EVENTS):
+        return None;
+
+    block_number = log["blockNumber"];
+
+    transaction_index = log["transactionIndex"];
+
+    block_date = datetime.utcfromtimestamp(block_timestamp);
+
+    # prepare the object that we'll be putting into bigquery
+    event_clean = {
+        "event" : event_type,
+
+        "tx_hash" : log["transactionHash"],
+        "tx_index" : transaction_index,
+        "tx_order" : (block_number * TX_ORDER_PER_BLOCK) + transaction_index,
+
+        "eth" : None,
+        "tokens" : None,
+
+        "cur_eth_total" : None,
+        "cur_tokens_total" : None,
+
+        "user" : None,
+
+        "timestamp" : block_timestamp,
+        "day" : block_date.strftime("%Y-%m-%d"),
+        "month" : block_date.strftime("%Y-%m"),
+        "year" : block_date.strftime("%Y"),
+
+        "block" : block_number
+    }
+
+    log_topics = log["topics"];
+
+    # for each of the rest of the topics (ie inputs)
+    for i in range(1, len(log_topics)):
+        # remove any padding
+        topic = log_topics[i].replace("0x000000000000000000000000", "0x");
+
+        # get the type for this input
+        input_type = event["input_types"][i - 1];
+
+        # get the name for this input
+        input_name = event["input_names"][i - 1];
+
+        # clean the amount of columns into just eth and token amounts
+        if ("eth_" in input_name):
+            input_name = "eth";
+        elif ("token" in input_name):
+            input_name = "tokens";
+        elif (("buyer" in input_name) or ("provider" in input_name)):
+            input_name = "user";
+
+        # if the type is address, just put into clean
+        if (input_type == 'address'):
+            event_clean[input_name] = topic;
+        elif (input_type == 'uint256'):
+            # else if it's an integer, parse it first
+            value = int(topic, 16);
+
+            # modify value per event type
+            if (input_name == "eth"):
+                if ((event_type == "EthPurchase") or (event_type == "RemoveLiquidity")):
+                    value = -value; # negative eth since the user is withdrawing eth from the pool
+            elif (input_name == "tokens"):
+                if ((event_type == "TokenPurchase") or (event_type == "RemoveLiquidity")):
+                    value = -value; # negative tokens since the user is withdrawing tokens from the pool
+
+            # then put into clean
+            event_clean[input_name] = str(value);
+
+    return event_clean;
+
+def log_order(log):
+    return (log["blockNumber"] * LOG_ORDER_PER_BLOCK) + log["logIndex"];
+
+# decodes a pool token Transfer log (mints come from and burns go to ZERO_ADDRESS), None for any other event
+def decode_transfer_log(log, block_timestamp):
+    if (log_event(log)["event"] != "Transfer"):
+        return None;
+
+    # _from and _to are indexed topics, _value is the log data
+    return {
+        "from" : "0x" + log["topics"][1][-40:].lower(),
+        "to" : "0x" + log["topics"][2][-40:].lower(),
+        "value" : int(log["data"], 16),
+
+        "log_order" : log_order(log),
+        "tx_order" : (log["blockNumber"] * TX_ORDER_PER_BLOCK) + log["transactionIndex"],
+        "tx_hash" : log["transactionHash"],
+        "block" : log["blockNumber"],
+        "timestamp" : block_timestamp
+    }
+
+# fills in cur_eth_total / cur_tokens_total on rows (in order) starting from the pool's totals before them,
+# returns the totals after the last row
+def apply_running_totals(rows, cur_eth_total, cur_tokens_total):
+    for row in rows:
+        cur_eth_total += int(row["eth"]);
+        cur_tokens_total += int(row["tokens"]);
+
+        # track the current eth and token totals as of this transaction
+        row["cur_eth_total"] = str(cur_eth_total);
+        row["cur_tokens_total"] = str(cur_tokens_total);
+
+    return cur_eth_total, cur_tokens_total;
+
+# adds the amounts in whole eth / tokens (using the token's decimals) and the token per eth price before and
+# after the transaction to rows that have their running totals, so readers never convert wei themselves
+def normalize_rows(rows, token_decimals):
+    eth_unit = 10 ** ETH_DECIMALS;
+    tokens_unit = 10 ** int(token_decimals);
+
+    for row in rows:
+        eth = int(row["eth"]);
+        tokens = int(row["tokens"]);
+
+        cur_eth_total = int(row["cur_eth_total"]);
+        cur_tokens_total = int(row["cur_tokens_total"]);
+
+        row["eth_norm"] = eth / eth_unit;
+        row["tokens_norm"] = tokens / tokens_unit;
+
+        row["cur_eth_norm"] = cur_eth_total / eth_unit;
+        row["cur_tokens_norm"] = cur_tokens_total / tokens_unit;
+
+        row["price_before"] = normalized_price(cur_eth_total - eth, cur_tokens_total - tokens, eth_unit, tokens_unit);
+        row["price_after"] = normalized_price(cur_eth_total, cur_tokens_total, eth_unit, tokens_unit);
+
+    return rows;
+
+# tokens per eth for pool balances in wei, 0 for an empty pool
+def normalized_price(eth_total, tokens_total, eth_unit, tokens_unit):
+    if (eth_total == 0):
+        return 0;
+
+    return (tokens_total / tokens_unit) / (eth_total / eth_unit);
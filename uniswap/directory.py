@@ -5,8 +5,7 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import bigquery
-from google.cloud import datastore
+from uniswap.clients import get_datastore_client
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -26,7 +25,7 @@ from eth_utils import (
 # return all exchanges with optional parameters 
 # minLiquidity (optional), orderBy (optional, alphabetical, time, liquidity, volume)
 def v1_directory():
-	query = datastore.Client().query(kind='exchange');
+	query = get_datastore_client().query(kind='exchange');
 
 	exchanges = [];
 
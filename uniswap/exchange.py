@@ -5,7 +5,7 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import datastore
+from uniswap.clients import get_datastore_client
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -29,7 +29,7 @@ def v1_get_exchange():
     if (exchange_address is None):
         return jsonify(error='missing parameter: exchangeAddress'), 400
 
-    exchange_info = load_exchange_info(datastore.Client(), exchange_address);
+    exchange_info = load_exchange_info(get_datastore_client(), exchange_address);
 
     if (exchange_info == None):
         return jsonify(error='no exchange found for this address'), 404
@@ -46,6 +46,8 @@ def v1_get_exchange():
         "tokenAddress" : exchange_info["token_address"],
         "tokenLiquidity" : exchange_info["cur_tokens_total"],
         "tokenDecimals" : exchange_info["token_decimals"],
+        "ethLiquidityNorm" : exchange_info.get("cur_eth_norm"),
+        "tokenLiquidityNorm" : exchange_info.get("cur_tokens_norm"),
     }
 
     return jsonify(result)
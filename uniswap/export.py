@@ -0,0 +1,71 @@
+from flask import request, jsonify, Response
+
+from uniswap.history_export import EXPORT_FORMATS
+from uniswap.history_export import EXPORT_CONTENT_TYPES
+from uniswap.history_export import chunk_rows
+from uniswap.history_export import export_page
+from uniswap.history_export import ndjson_chunks
+from uniswap.history_export import csv_chunks
+from uniswap.history_export import parquet_chunks
+
+from eth_utils import to_checksum_address
+
+# Bulk export of an exchange's full history as ndjson, csv or parquet, a page at a time (see
+# uniswap/history_export.py).
+#
+# Each response is one page of rows in tx_order order. While there's more to export the response carries an
+# X-Next-Cursor header, and the next page is fetched with afterTxOrder set to it, so a client walks the whole
+# history (and resumes an interrupted export) by following the cursor until a response comes back without one.
+
+# one page of an exchange's history, optionally only the rows with afterTxOrder < tx_order <= toTxOrder
+def v1_export():
+    exchange_address = request.args.get("exchangeAddress");
+
+    if (exchange_address is None):
+        return jsonify(error='missing parameter: exchangeAddress'), 400
+
+    try:
+        exchange_address = to_checksum_address(exchange_address);
+    except Exception:
+        return jsonify(error='invalid exchange address'), 400
+
+    export_format = request.args.get("format", "ndjson");
+
+    if ((export_format in EXPORT_FORMATS) == False):
+        return jsonify(error='format must be one of ' + ", ".join(EXPORT_FORMATS)), 400
+
+    try:
+        after_tx_order = request.args.get("afterTxOrder");
+        after_tx_order = None if (after_tx_order is None) else int(after_tx_order);
+
+        to_tx_order = request.args.get("toTxOrder");
+        to_tx_order = None if (to_tx_order is None) else int(to_tx_order);
+    except ValueError:
+        return jsonify(error='afterTxOrder and toTxOrder must be numbers'), 400
+
+    if (export_format == "parquet"):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            return jsonify(error='parquet export is not available on this server'), 400
+
+    # the page is read in full before responding, its cursor has to go out in the headers
+    rows, next_cursor = export_page(exchange_address, after_tx_order, to_tx_order);
+
+    chunks = chunk_rows(rows);
+
+    if (export_format == "ndjson"):
+        body = ndjson_chunks(chunks);
+    elif (export_format == "csv"):
+        body = csv_chunks(chunks);
+    else:
+        body = parquet_chunks(chunks);
+
+    response = Response(body, mimetype=EXPORT_CONTENT_TYPES[export_format]);
+    response.headers["Content-Disposition"] = "attachment; filename=" + exchange_address + "." + export_format;
+
+    if (next_cursor is not None):
+        response.headers["X-Next-Cursor"] = str(next_cursor);
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor";
+
+    return response;
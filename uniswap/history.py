@@ -2,7 +2,14 @@ import json
 
 from flask import request, jsonify
 
-from google.cloud import bigquery
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+from uniswap.history_table import normalized_select
+from uniswap.history_table import normalized_group_by
+
+from uniswap.query_cache import run_query
+from uniswap.query_cache import snap_end_time
 
 from eth_utils import (
     add_0x_prefix,
@@ -16,11 +23,6 @@ from eth_utils import (
     to_wei,
 )
 
-# TODO refactor this into a single location
-PROJECT_ID = "uniswap-analytics"
-
-EXCHANGES_DATASET_ID = "exchanges_v1"
-
 # return all the transactions for an exchange between startTime and endTime (inclusive)
 # or given an endTime (inclusive) and count (for paging)
 def v1_get_history():
@@ -32,14 +34,18 @@ def v1_get_history():
 
 	exchange_address = to_checksum_address(exchange_address)
 
+	try:
+		# snap an open ended end time to the end of the cache bucket so repeated polling reuses the same query results
+		end_time = snap_end_time(end_time);
+	except ValueError:
+		return jsonify(error='invalid parameter: endTime'), 400
+
 	# check if we were provided a count
 	history_count = request.args.get("count");
 
-	bq_client = bigquery.Client()
-
-	exchange_table_id = "exchange_history_" + exchange_address;
+	exchange_table_name = history_table_name(exchange_address);
 
-	exchange_table_name = "`" + PROJECT_ID + "." + EXCHANGES_DATASET_ID + "." + exchange_table_id + "`"
+	group_columns = ", ".join(["event", "timestamp", "eth", "tokens", "cur_eth_total", "cur_tokens_total", "tx_hash", "user", "block", "tx_index", "tx_order"] + normalized_group_by(exchange_address));
 
 	# if no count provided, then check for start time
 	if (history_count is None):
@@ -48,32 +54,40 @@ def v1_get_history():
 		if (start_time is None):
 			return jsonify(error='missing parameter: startTime'), 400
 
+		try:
+			exchange_filter = history_filter(exchange_address, start_time, end_time);
+		except ValueError:
+			return jsonify(error='invalid parameter: startTime'), 400
+
 		bq_query_sql = """
 	        SELECT 
 	       		CAST(event as STRING) as event, CAST(tx_hash as STRING) as tx_hash, CAST(user as STRING) as user, CAST(eth as STRING) as eth,
 	       		CAST(tx_index as INT64) as tx_index, CAST(tx_order as STRING),
-	       		CAST(tokens as STRING) as tokens, CAST(block as INT64) as block, CAST(timestamp as INT64) as timestamp,
-	       		CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total
+	       		CAST(tokens as STRING) as tokens, CAST(block as INT64) as block, """ + timestamp_column() + """ as timestamp,
+	       		CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total,
+	       		""" + ", ".join(normalized_select(exchange_address)) + """
 	        FROM """ + exchange_table_name + """
-	         WHERE timestamp >= """ + str(start_time) + """ and timestamp <= """ + str(end_time) + """
-	         group by event, timestamp, eth, tokens, cur_eth_total, cur_tokens_total, tx_hash, user, block, tx_index, tx_order  """ + """ order by tx_order desc""";
-	else:	         
+	         WHERE """ + exchange_filter + """
+	         group by """ + group_columns + """ order by tx_order desc""";
+	else:
+		try:
+			history_count = int(history_count);
+		except ValueError:
+			return jsonify(error='invalid parameter: count'), 400
+
 		bq_query_sql = """
 	        SELECT 
 	       		CAST(event as STRING) as event, CAST(tx_hash as STRING) as tx_hash, CAST(user as STRING) as user, CAST(eth as STRING) as eth,
 	       		CAST(tx_index as INT64) as tx_index, CAST(tx_order as STRING),
-	       		CAST(tokens as STRING) as tokens, CAST(block as INT64) as block, CAST(timestamp as INT64) as timestamp,
-	       		CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total
+	       		CAST(tokens as STRING) as tokens, CAST(block as INT64) as block, """ + timestamp_column() + """ as timestamp,
+	       		CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total,
+	       		""" + ", ".join(normalized_select(exchange_address)) + """
 	        FROM """ + exchange_table_name + """
-	         WHERE timestamp <= """ + str(end_time) + """ group
-	         by event, timestamp, eth, tokens, cur_eth_total, cur_tokens_total, tx_hash, user, block, tx_index, tx_order """ + """ order by tx_order desc limit """ + history_count;
-
-	print(bq_query_sql);
+	         WHERE """ + history_filter(exchange_address, end_time=end_time) + """ group
+	         by """ + group_columns + """ order by tx_order desc limit """ + str(history_count);
 
 	# query all the blocks and their associated timestamps
-	exchange_query = bq_client.query(bq_query_sql);
-
-	exchange_results = exchange_query.result();
+	exchange_results = run_query(bq_query_sql, exchange_address=exchange_address, range_end=end_time);
 
 	history = [];
 
@@ -91,7 +105,15 @@ def v1_get_history():
 			"curEthLiquidity" : row.get("cur_eth_total"),
 			
 			"tokenAmount" : row.get("tokens"),
-			"curTokenLiquidity" : row.get("cur_tokens_total")
+			"curTokenLiquidity" : row.get("cur_tokens_total"),
+
+			# the same in whole eth / tokens, computed by the crawler
+			"ethAmountNorm" : row.get("eth_norm"),
+			"tokenAmountNorm" : row.get("tokens_norm"),
+			"curEthLiquidityNorm" : row.get("cur_eth_norm"),
+			"curTokenLiquidityNorm" : row.get("cur_tokens_norm"),
+			"priceBefore" : row.get("price_before"),
+			"priceAfter" : row.get("price_after")
 		})
 		
 	return jsonify(history)
@@ -0,0 +1,186 @@
+import io
+import csv
+import json
+import itertools
+
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+from uniswap.history_table import NORMALIZED_COLUMNS
+from uniswap.history_table import normalized_select
+from uniswap.history_table import normalized_group_by
+
+from uniswap.query_cache import iter_query
+
+# An exchange's history a page at a time for /api/v1/export (uniswap/export.py), and the ndjson, csv and parquet
+# encodings it's served in.
+#
+# App Engine standard buffers a whole response and caps it at 32MB, so a full history can't go out as one
+# response. Each page is the next EXPORT_PAGE_ROWS rows after a cursor (a tx_order) in tx_order order, which
+# bigquery answers as a top-n rather than sorting the whole table. A page never ends part way through a tx_order,
+# so the tx_order of its last row is the cursor to pass for the next one.
+
+EXPORT_FORMATS = ["ndjson", "csv", "parquet"]
+
+EXPORT_CHUNK_ROWS = 10000
+
+# about 12MB of ndjson or csv, well under the 32MB response limit
+EXPORT_PAGE_ROWS = 20000
+
+EXPORT_COLUMNS = ["tx_order", "block", "tx_index", "tx_hash", "timestamp", "event", "user", "eth", "tokens", "cur_eth_total", "cur_tokens_total"] + NORMALIZED_COLUMNS
+
+# integer columns, the amounts are wei so they're exported as strings
+EXPORT_INT_COLUMNS = ["tx_order", "block", "tx_index", "timestamp"]
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson" : "application/x-ndjson",
+    "csv" : "text/csv",
+    "parquet" : "application/octet-stream"
+}
+
+def export_sql(exchange_address, after_tx_order=None, to_tx_order=None, limit=None):
+    conditions = [history_filter(exchange_address)];
+
+    if (after_tx_order is not None):
+        conditions.append("CAST(tx_order as INT64) > " + str(int(after_tx_order)));
+
+    if (to_tx_order is not None):
+        conditions.append("CAST(tx_order as INT64) <= " + str(int(to_tx_order)));
+
+    return """
+        SELECT
+            CAST(tx_order as INT64) as tx_order, CAST(block as INT64) as block, CAST(tx_index as INT64) as tx_index,
+            CAST(tx_hash as STRING) as tx_hash, """ + timestamp_column() + """ as timestamp,
+            CAST(event as STRING) as event, CAST(user as STRING) as user,
+            CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens,
+            CAST(cur_eth_total as STRING) as cur_eth_total, CAST(cur_tokens_total as STRING) as cur_tokens_total,
+            """ + ", ".join(normalized_select(exchange_address)) + """
+        FROM """ + history_table_name(exchange_address) + """
+        WHERE """ + " and ".join(conditions) + """
+        GROUP BY """ + ", ".join(["tx_order", "block", "tx_index", "tx_hash", "timestamp", "event", "user", "eth", "tokens", "cur_eth_total", "cur_tokens_total"] + normalized_group_by(exchange_address)) + """
+        ORDER BY tx_order asc""" + ("" if (limit is None) else """
+        LIMIT """ + str(int(limit)));
+
+# cuts a page of up to page_rows rows back to its last complete tx_order, returns (rows, next cursor). a short
+# page is the end of the export and has no next cursor
+def split_page(rows, page_rows):
+    if (len(rows) < page_rows):
+        return rows, None;
+
+    last_tx_order = rows[-1]["tx_order"];
+
+    complete = len(rows);
+
+    while ((complete > 0) and (rows[complete - 1]["tx_order"] == last_tx_order)):
+        complete -= 1;
+
+    # a single tx_order filling the whole page, there's no shorter page to cut it to
+    if (complete == 0):
+        return rows, last_tx_order;
+
+    return rows[:complete], rows[complete - 1]["tx_order"];
+
+# the page of rows with after_tx_order < tx_order <= to_tx_order (either may be None), returns (rows, next cursor)
+def export_page(exchange_address, after_tx_order=None, to_tx_order=None, page_rows=EXPORT_PAGE_ROWS, query=iter_query):
+    rows = list(query(export_sql(exchange_address, after_tx_order, to_tx_order, page_rows)));
+
+    return split_page(rows, page_rows);
+
+# yields lists of up to chunk_rows rows
+def chunk_rows(rows, chunk_size=EXPORT_CHUNK_ROWS):
+    rows = iter(rows);
+
+    while (True):
+        chunk = list(itertools.islice(rows, chunk_size));
+
+        if (len(chunk) == 0):
+            return;
+
+        yield chunk;
+
+def ndjson_chunks(chunks):
+    for chunk in chunks:
+        yield "".join([json.dumps(row) + "\n" for row in chunk]);
+
+def csv_chunks(chunks):
+    output = io.StringIO();
+
+    writer = csv.DictWriter(output, fieldnames=EXPORT_COLUMNS);
+    writer.writeheader();
+
+    for chunk in chunks:
+        writer.writerows(chunk);
+
+        yield output.getvalue();
+
+        output.seek(0);
+        output.truncate(0);
+
+    # header only, for an empty export
+    if (output.tell() > 0):
+        yield output.getvalue();
+
+# write only file object that hands back what's been written since the last drain, so the parquet writer's
+# output can be streamed while it keeps track of the absolute offsets it needs for the footer
+class StreamingSink:
+    def __init__(self):
+        self.buffers = [];
+        self.position = 0;
+        self.closed = False;
+
+    def write(self, data):
+        data = bytes(data);
+
+        self.buffers.append(data);
+        self.position += len(data);
+
+        return len(data);
+
+    def tell(self):
+        return self.position;
+
+    def flush(self):
+        pass;
+
+    def close(self):
+        self.closed = True;
+
+    def drain(self):
+        data = b"".join(self.buffers);
+
+        self.buffers = [];
+
+        return data;
+
+def export_column_type(column):
+    import pyarrow
+
+    if (column in EXPORT_INT_COLUMNS):
+        return pyarrow.int64();
+
+    if (column in NORMALIZED_COLUMNS):
+        return pyarrow.float64();
+
+    return pyarrow.string();
+
+# one parquet row group per chunk
+def parquet_chunks(chunks):
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([(column, export_column_type(column)) for column in EXPORT_COLUMNS]);
+
+    sink = StreamingSink();
+
+    writer = pyarrow.parquet.ParquetWriter(sink, schema);
+
+    for chunk in chunks:
+        table = pyarrow.Table.from_arrays([pyarrow.array([row[column] for row in chunk], type=field.type) for column, field in zip(EXPORT_COLUMNS, schema)], schema=schema);
+
+        writer.write_table(table);
+
+        yield sink.drain();
+
+    writer.close();
+
+    yield sink.drain();
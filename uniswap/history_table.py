@@ -0,0 +1,202 @@
+import time
+
+from uniswap.config import PROJECT_ID
+from uniswap.config import EXCHANGES_DATASET_ID
+from uniswap.config import HISTORY_V2_DATASET_ID
+from uniswap.config import HISTORY_V2_TABLE_ID
+from uniswap.config import HISTORY_READ_VERSION
+
+# Helpers for building exchange history sql against either table layout.
+#
+# v1: exchanges_v1.exchange_history_<address>, one table per exchange. amounts are STRING and timestamp is
+#     NUMERIC unix seconds, so every query casts and scans the whole table.
+# v2: exchanges_v2.exchange_history, one table for all exchanges. PARTITION BY DATE(timestamp) and
+#     CLUSTER BY exchange, event, with BIGNUMERIC amounts, so time range and per exchange filters prune.
+#
+# Readers ask for the table, filter and column expressions here instead of hardcoding the v1 layout, so
+# switching HISTORY_READ_VERSION moves every endpoint over at once.
+
+AMOUNT_COLUMNS = ["eth", "tokens", "cur_eth_total", "cur_tokens_total"];
+
+# FLOAT64 columns the crawler fills in next to the wei amounts, in whole eth / tokens (see decode.normalize_rows)
+NORMALIZED_COLUMNS = ["eth_norm", "tokens_norm", "cur_eth_norm", "cur_tokens_norm", "price_before", "price_after"];
+
+# normalized column -> the wei column it's in whole eth
+ETH_NORMALIZED_COLUMNS = {"eth_norm" : "eth", "cur_eth_norm" : "cur_eth_total"};
+
+# normalized column -> the base unit column it's in whole tokens
+TOKEN_NORMALIZED_COLUMNS = {"tokens_norm" : "tokens", "cur_tokens_norm" : "cur_tokens_total"};
+
+HISTORY_V2_TABLE_NAME = "`" + PROJECT_ID + "." + HISTORY_V2_DATASET_ID + "." + HISTORY_V2_TABLE_ID + "`"
+
+HISTORY_V2_DDL = """
+    CREATE TABLE IF NOT EXISTS """ + HISTORY_V2_TABLE_NAME + """ (
+        exchange STRING NOT NULL,
+        event STRING,
+        tx_hash STRING,
+        user STRING,
+        eth BIGNUMERIC,
+        tokens BIGNUMERIC,
+        cur_eth_total BIGNUMERIC,
+        cur_tokens_total BIGNUMERIC,
+        block INT64,
+        timestamp TIMESTAMP NOT NULL,
+        tx_index INT64,
+        tx_order INT64,
+        day STRING,
+        month STRING,
+        year STRING,
+        eth_norm FLOAT64,
+        tokens_norm FLOAT64,
+        cur_eth_norm FLOAT64,
+        cur_tokens_norm FLOAT64,
+        price_before FLOAT64,
+        price_after FLOAT64
+    )
+    PARTITION BY DATE(timestamp)
+    CLUSTER BY exchange, event
+    OPTIONS (require_partition_filter = false)"""
+
+# adds the normalized columns to a history table created before they existed
+def normalized_columns_ddl(table_name):
+    return "ALTER TABLE " + table_name + " " + ", ".join(["ADD COLUMN IF NOT EXISTS " + column + " FLOAT64" for column in NORMALIZED_COLUMNS]);
+
+# tables we've seen with NORMALIZED_COLUMNS (they're never dropped), and when we last saw each one without them
+_normalized_tables = set();
+_unnormalized_tables = {};
+
+# how long a table found without the columns is assumed to still lack them
+NORMALIZED_RECHECK_SECONDS = 600
+
+# whether the history table has NORMALIZED_COLUMNS yet, tables created before them only get them once
+# tools/normalize_history.py has altered them
+def has_normalized_columns(exchange_address, version=HISTORY_READ_VERSION):
+    from uniswap.clients import get_bigquery_client
+
+    table_name = history_table_name(exchange_address, version);
+
+    if (table_name in _normalized_tables):
+        return True;
+
+    if (_unnormalized_tables.get(table_name, 0) > time.time() - NORMALIZED_RECHECK_SECONDS):
+        return False;
+
+    schema_columns = [field.name for field in get_history_table(get_bigquery_client(), exchange_address, version).schema];
+
+    if (all([column in schema_columns for column in NORMALIZED_COLUMNS])):
+        _normalized_tables.add(table_name);
+        return True;
+
+    _unnormalized_tables[table_name] = time.time();
+
+    return False;
+
+# a normalized amount computed from its wei / base unit column, or None for the prices (and token amounts when
+# token_decimals isn't known)
+def normalized_from_amount(column, token_decimals=None, version=HISTORY_READ_VERSION):
+    if (column in ETH_NORMALIZED_COLUMNS):
+        return "CAST(" + amount_column(ETH_NORMALIZED_COLUMNS[column], version) + " as FLOAT64) / 1e18";
+
+    if ((column in TOKEN_NORMALIZED_COLUMNS) and (token_decimals is not None)):
+        return "CAST(" + amount_column(TOKEN_NORMALIZED_COLUMNS[column], version) + " as FLOAT64) / 1e" + str(int(token_decimals));
+
+    return None;
+
+# expression for a normalized column on a table that may not have it yet, so readers work before and after
+# tools/normalize_history.py. eth amounts always have 18 decimals so those are computed from wei, the rest are null.
+# given the token's decimals, amounts are also computed for rows the backfill hasn't filled in yet
+def normalized_column(column, exchange_address, version=HISTORY_READ_VERSION, token_decimals=None):
+    from_amount = normalized_from_amount(column, token_decimals, version);
+
+    if (has_normalized_columns(exchange_address, version)):
+        if ((token_decimals is None) or (from_amount is None)):
+            return column;
+
+        return "IFNULL(" + column + ", " + from_amount + ")";
+
+    if (from_amount is None):
+        return "CAST(NULL as FLOAT64)";
+
+    return from_amount;
+
+# select list entries for the given normalized columns (default all of them), aliased to their names
+def normalized_select(exchange_address, columns=NORMALIZED_COLUMNS, version=HISTORY_READ_VERSION):
+    return [normalized_column(column, exchange_address, version) + " as " + column for column in columns];
+
+# the given normalized columns to group by along with the rest of the row, none when they're null stand ins
+def normalized_group_by(exchange_address, columns=NORMALIZED_COLUMNS, version=HISTORY_READ_VERSION):
+    if (has_normalized_columns(exchange_address, version)):
+        return list(columns);
+
+    return [];
+
+def v1_table_id(exchange_address):
+    return "exchange_history_" + exchange_address;
+
+def v1_table_name(exchange_address):
+    return "`" + PROJECT_ID + "." + EXCHANGES_DATASET_ID + "." + v1_table_id(exchange_address) + "`";
+
+# fully qualified table name to select history from
+def history_table_name(exchange_address, version=HISTORY_READ_VERSION):
+    if (version == 2):
+        return HISTORY_V2_TABLE_NAME;
+
+    return v1_table_name(exchange_address);
+
+# where clause restricting history to one exchange and an optional (inclusive) unix time range
+def history_filter(exchange_address, start_time=None, end_time=None, version=HISTORY_READ_VERSION):
+    conditions = [];
+
+    if (version == 2):
+        conditions.append("exchange = '" + exchange_address + "'");
+
+    if (start_time is not None):
+        conditions.append("timestamp >= " + time_literal(start_time, version));
+
+    if (end_time is not None):
+        conditions.append("timestamp <= " + time_literal(end_time, version));
+
+    if (len(conditions) == 0):
+        return "TRUE";
+
+    return "(" + " and ".join(conditions) + ")";
+
+# a unix timestamp as a literal comparable to the timestamp column (so v2 filters hit partition pruning)
+def time_literal(timestamp, version=HISTORY_READ_VERSION):
+    if (version == 2):
+        return "TIMESTAMP_SECONDS(" + str(int(timestamp)) + ")";
+
+    return str(int(timestamp));
+
+# expression for the timestamp column as INT64 unix seconds
+def timestamp_column(version=HISTORY_READ_VERSION):
+    if (version == 2):
+        return "UNIX_SECONDS(timestamp)";
+
+    return "CAST(timestamp as INT64)";
+
+# expression for an amount column as a number we can sum (v1 stores them as strings). BIGNUMERIC like v2, NUMERIC's
+# 29 integer digits overflow on the largest wei balances
+def amount_column(column, version=HISTORY_READ_VERSION):
+    if (version == 2):
+        return column;
+
+    return "CAST(" + column + " as BIGNUMERIC)";
+
+# converts a crawled history row into the row we stream into the given table version
+def history_row(exchange_address, row, version):
+    if (version == 2):
+        v2_row = dict(row);
+        v2_row["exchange"] = exchange_address;
+
+        return v2_row;
+
+    return row;
+
+def get_history_table(bq_client, exchange_address, version):
+    if (version == 2):
+        table_ref = bq_client.dataset(HISTORY_V2_DATASET_ID).table(HISTORY_V2_TABLE_ID);
+    else:
+        table_ref = bq_client.dataset(EXCHANGES_DATASET_ID).table(v1_table_id(exchange_address));
+
+    return bq_client.get_table(table_ref);
@@ -0,0 +1,101 @@
+import os
+import gzip
+import json
+
+from uniswap.config import LOG_ARCHIVE_DIR
+
+# Append-only archive of the raw exchange logs the crawler pulls, so history can be rebuilt (or re-decoded after
+# a decoding fix) from local disk instead of re-crawling the RPC provider.
+#
+# Each crawl writes one gzip compressed json lines segment per exchange covering the block range it crawled,
+# even when there were no logs, so the archive also records which ranges are complete:
+#   <LOG_ARCHIVE_DIR>/<exchange address>/<first block>-<last block>.jsonl.gz
+#
+# Segments are never modified once written. Every log carries the timestamp of its block ("blockTimestamp").
+# Re-crawled ranges produce overlapping segments, readers skip logs they've already seen.
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+def exchange_archive_dir(exchange_address, archive_dir=LOG_ARCHIVE_DIR):
+    return os.path.join(archive_dir, exchange_address);
+
+def segment_name(first_block, last_block):
+    return str(first_block).zfill(10) + "-" + str(last_block).zfill(10) + SEGMENT_SUFFIX;
+
+# writes a segment for [first_block, last_block], logs are serialized logs (see decode.serialize_log)
+def archive_logs(exchange_address, first_block, last_block, logs, archive_dir=LOG_ARCHIVE_DIR):
+    if (archive_dir is None):
+        return;
+
+    directory = exchange_archive_dir(exchange_address, archive_dir);
+
+    os.makedirs(directory, exist_ok=True);
+
+    path = os.path.join(directory, segment_name(first_block, last_block));
+
+    # write to a temp file and rename so a segment is either complete or not there at all
+    temp_path = path + ".tmp";
+
+    with gzip.open(temp_path, "wt") as segment_file:
+        for log in logs:
+            segment_file.write(json.dumps(log) + "\n");
+
+    os.replace(temp_path, path);
+
+# (first block, last block, path) of every segment for an exchange, sorted by first block
+def list_segments(exchange_address, archive_dir=LOG_ARCHIVE_DIR):
+    directory = exchange_archive_dir(exchange_address, archive_dir);
+
+    if (os.path.isdir(directory) == False):
+        return [];
+
+    segments = [];
+
+    for name in os.listdir(directory):
+        if (name.endswith(SEGMENT_SUFFIX) == False):
+            continue;
+
+        first_block, last_block = name[:-len(SEGMENT_SUFFIX)].split("-");
+
+        segments.append((int(first_block), int(last_block), os.path.join(directory, name)));
+
+    return sorted(segments);
+
+def list_archived_exchanges(archive_dir=LOG_ARCHIVE_DIR):
+    if ((archive_dir is None) or (os.path.isdir(archive_dir) == False)):
+        return [];
+
+    return sorted([name for name in os.listdir(archive_dir) if os.path.isdir(os.path.join(archive_dir, name))]);
+
+# block ranges between first_block and the last archived block that no segment covers
+def archive_gaps(exchange_address, first_block, archive_dir=LOG_ARCHIVE_DIR):
+    gaps = [];
+
+    next_block = first_block;
+
+    for segment_first, segment_last, path in list_segments(exchange_address, archive_dir):
+        if (segment_first > next_block):
+            gaps.append((next_block, segment_first - 1));
+
+        next_block = max(next_block, segment_last + 1);
+
+    return gaps;
+
+# yields every archived log for an exchange once, in (block, log index) order
+def iter_archived_logs(exchange_address, archive_dir=LOG_ARCHIVE_DIR):
+    last_position = (-1, -1);
+
+    for first_block, last_block, path in list_segments(exchange_address, archive_dir):
+        with gzip.open(path, "rt") as segment_file:
+            for line in segment_file:
+                log = json.loads(line);
+
+                position = (log["blockNumber"], log["logIndex"]);
+
+                # already yielded from an overlapping segment
+                if (position <= last_position):
+                    continue;
+
+                last_position = position;
+
+                yield log;
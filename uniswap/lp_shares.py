@@ -0,0 +1,173 @@
+from flask import request, jsonify
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.decode import ZERO_ADDRESS
+
+from eth_utils import is_address, to_checksum_address
+
+# Liquidity provider pool token balances, indexed from the exchange's Transfer events by the crawler so share
+# lookups never call the chain.
+#
+#   lp_balance         key <exchange>:<holder>, a holder's current balance and the log_order of the last transfer
+#                      applied to it (so a retried crawl batch doesn't apply a transfer twice)
+#   lp_balance_change  key <exchange>:<holder>:<log_order>, the holder's balance and the pool token supply after
+#                      each transfer they were part of, for the share time series
+#
+# The pool token supply is kept on the exchange entity (pool_token_supply) and checkpointed with it. Exchanges
+# crawled before this existed are indexed by tools/build_lp_shares.py, until then they have no pool_token_supply
+# and the crawler leaves their transfers alone.
+
+LP_BALANCE_KIND = "lp_balance"
+LP_CHANGE_KIND = "lp_balance_change"
+
+LP_CHANGE_UNINDEXED = ["tx_order", "tx_hash", "block", "balance", "supply"]
+
+LP_SHARES_MAX_POINTS = 5000
+
+# datastore's limit on entities per commit
+MAX_ENTITIES_PER_PUT = 500
+
+def lp_balance_key(ds_client, exchange_address, holder):
+    return ds_client.key(LP_BALANCE_KIND, exchange_address + ":" + holder);
+
+def share_of(balance, supply):
+    if (supply <= 0):
+        return 0;
+
+    return balance / supply;
+
+def lp_change_entity(ds_client, exchange_address, holder, transfer, balance, supply):
+    from google.cloud import datastore
+
+    entity = datastore.Entity(key=ds_client.key(LP_CHANGE_KIND, exchange_address + ":" + holder + ":" + str(transfer["log_order"])), exclude_from_indexes=LP_CHANGE_UNINDEXED);
+
+    entity.update({
+        "exchange" : exchange_address,
+        "holder" : holder,
+        "log_order" : transfer["log_order"],
+        "timestamp" : transfer["timestamp"],
+
+        "tx_order" : transfer["tx_order"],
+        "tx_hash" : transfer["tx_hash"],
+        "block" : transfer["block"],
+
+        "balance" : str(balance),
+        "supply" : str(supply)
+    })
+
+    return entity;
+
+# applies a batch of decoded transfers (see decode.decode_transfer_log) to the holders' balances, starting from the
+# pool token supply as of the exchange's checkpoint. returns the supply after the batch, for the checkpoint
+def apply_transfers(ds_client, exchange_address, transfers, supply):
+    from google.cloud import datastore
+
+    transfers = sorted(transfers, key=lambda transfer: transfer["log_order"]);
+
+    holders = sorted(set([transfer["from"] for transfer in transfers] + [transfer["to"] for transfer in transfers]) - set([ZERO_ADDRESS]));
+
+    balances = {};
+
+    for entity in ds_client.get_multi([lp_balance_key(ds_client, exchange_address, holder) for holder in holders]):
+        balances[entity["holder"]] = entity;
+
+    changes = [];
+
+    for transfer in transfers:
+        value = transfer["value"];
+
+        # mints and burns
+        if (transfer["from"] == ZERO_ADDRESS):
+            supply += value;
+
+        if (transfer["to"] == ZERO_ADDRESS):
+            supply -= value;
+
+        for holder, delta in [(transfer["from"], -value), (transfer["to"], value)]:
+            if (holder == ZERO_ADDRESS):
+                continue;
+
+            balance_entity = balances.get(holder);
+
+            if (balance_entity is None):
+                balance_entity = datastore.Entity(key=lp_balance_key(ds_client, exchange_address, holder));
+                balance_entity.update({"exchange" : exchange_address, "holder" : holder, "balance" : "0", "log_order" : -1});
+
+                balances[holder] = balance_entity;
+
+            # already applied by an earlier attempt at this batch
+            if (transfer["log_order"] <= balance_entity["log_order"]):
+                continue;
+
+            balance = int(balance_entity["balance"]) + delta;
+
+            balance_entity.update({"balance" : str(balance), "log_order" : transfer["log_order"]});
+
+            changes.append(lp_change_entity(ds_client, exchange_address, holder, transfer, balance, supply));
+
+    entities = changes + list(balances.values());
+
+    for start in range(0, len(entities), MAX_ENTITIES_PER_PUT):
+        ds_client.put_multi(entities[start:start + MAX_ENTITIES_PER_PUT]);
+
+    return supply;
+
+# the holder's current pool token balance from the index
+def load_lp_balance(ds_client, exchange_address, holder):
+    entity = ds_client.get(lp_balance_key(ds_client, exchange_address, holder.lower()));
+
+    if (entity is None):
+        return 0;
+
+    return int(entity["balance"]);
+
+# a user's pool token balance and share of the pool after every change, between startTime and endTime
+def v1_lp_shares():
+    exchange_address = request.args.get("exchangeAddress");
+    user_address = request.args.get("userAddress");
+
+    if ((exchange_address is None) or (user_address is None)):
+        return jsonify(error='exchangeAddress and userAddress required'), 400
+
+    if ((is_address(exchange_address) == False) or (is_address(user_address) == False)):
+        return jsonify(error='invalid address'), 400
+
+    exchange_address = to_checksum_address(exchange_address);
+
+    try:
+        start_time = int(request.args.get("startTime", 0));
+        end_time = request.args.get("endTime");
+        end_time = None if (end_time is None) else int(end_time);
+    except ValueError:
+        return jsonify(error='startTime and endTime must be integers'), 400
+
+    ds_client = get_datastore_client();
+
+    query = ds_client.query(kind=LP_CHANGE_KIND);
+    query.add_filter("exchange", "=", exchange_address);
+    query.add_filter("holder", "=", user_address.lower());
+    query.add_filter("timestamp", ">=", start_time);
+
+    if (end_time is not None):
+        query.add_filter("timestamp", "<=", end_time);
+
+    query.order = ["timestamp", "log_order"];
+
+    points = [];
+
+    for entity in query.fetch(limit=LP_SHARES_MAX_POINTS):
+        balance = int(entity["balance"]);
+        supply = int(entity["supply"]);
+
+        points.append({
+            "timestamp" : entity["timestamp"],
+            "tx" : entity["tx_hash"],
+            "block" : entity["block"],
+
+            "userNumPoolTokens" : str(balance),
+            "poolTokenSupply" : str(supply),
+            "userPoolPercent" : share_of(balance, supply)
+        })
+
+    return jsonify(points)
@@ -0,0 +1,199 @@
+import json
+import time
+
+from flask import jsonify
+
+from uniswap.clients import get_datastore_client
+
+# Market wide stats (total eth liquidity, 24h eth trade volume and trade count across every exchange), kept up
+# to date by the crawler so reading them is a single datastore get.
+#
+# Each exchange entity carries its own contribution:
+#   stats_volume_buckets  json of hour start -> [eth volume, trade count] for the last STATS_WINDOW_HOURS hours
+#   stats_eth_liquidity, stats_volume_24h, stats_trade_count_24h  what this exchange last added to the totals
+#
+# and the global_stats entities hold the totals. Whenever the crawler checkpoints an exchange it recomputes the
+# exchange's contribution and applies the difference to the totals in the same transaction as the checkpoint,
+# so the totals always equal the sum of the contributions.
+#
+# The totals are split over GLOBAL_STATS_SHARDS entities (key global.<shard>), each exchange applying its
+# differences to the one its address picks, so checkpoints of different exchanges rarely contend for the same
+# entity. Readers add the shards up, along with the single global entity from before the shards: only
+# differences are applied, so the sum is the total however it's split.
+
+STATS_WINDOW_HOURS = 24
+
+# raised when a checkpoint would not move an exchange forward from where its crawl started, ie another crawl of
+# the same exchange has checkpointed in the meantime
+class StaleCheckpointError(Exception):
+    pass
+
+GLOBAL_STATS_KIND = "global_stats"
+GLOBAL_STATS_KEY = "global"
+
+GLOBAL_STATS_SHARDS = 16
+
+# key of the global stats shard an exchange applies its differences to
+def global_stats_shard_key(ds_client, exchange_address):
+    return ds_client.key(GLOBAL_STATS_KIND, GLOBAL_STATS_KEY + "." + str(int(exchange_address[2:], 16) % GLOBAL_STATS_SHARDS));
+
+# the totals summed over every shard (and the unsharded entity), or None if nothing's been written yet
+def load_global_stats(ds_client):
+    keys = [ds_client.key(GLOBAL_STATS_KIND, GLOBAL_STATS_KEY)] + [ds_client.key(GLOBAL_STATS_KIND, GLOBAL_STATS_KEY + "." + str(shard)) for shard in range(GLOBAL_STATS_SHARDS)];
+
+    shards = ds_client.get_multi(keys);
+
+    if (len(shards) == 0):
+        return None;
+
+    return {
+        "eth_liquidity" : sum([int(shard["eth_liquidity"]) for shard in shards]),
+        "volume_24h" : sum([int(shard["volume_24h"]) for shard in shards]),
+        "trade_count_24h" : sum([shard["trade_count_24h"] for shard in shards]),
+        "exchanges" : sum([shard["exchanges"] for shard in shards]),
+        "updated" : max([shard.get("updated", 0) for shard in shards])
+    }
+
+def hour_start(timestamp):
+    return (int(timestamp) // 3600) * 3600;
+
+def load_volume_buckets(exchange_info):
+    if ("stats_volume_buckets" in exchange_info):
+        return json.loads(exchange_info["stats_volume_buckets"]);
+
+    return {};
+
+# adds the trades in rows to an exchange's hourly buckets and drops buckets that are out of the window
+def update_volume_buckets(buckets, rows, now):
+    window_start = hour_start(now) - ((STATS_WINDOW_HOURS - 1) * 3600);
+
+    for row in rows:
+        if ((row["event"] != "EthPurchase") and (row["event"] != "TokenPurchase")):
+            continue;
+
+        bucket_start = hour_start(row["timestamp"]);
+
+        if (bucket_start < window_start):
+            continue;
+
+        bucket = buckets.get(str(bucket_start), ["0", 0]);
+
+        buckets[str(bucket_start)] = [str(int(bucket[0]) + abs(int(row["eth"]))), bucket[1] + 1];
+
+    for bucket_start in list(buckets.keys()):
+        if (int(bucket_start) < window_start):
+            del buckets[bucket_start];
+
+    return buckets;
+
+# what an exchange adds to the global totals, as last recorded on its entity
+def exchange_contribution(exchange_info):
+    return {
+        "eth_liquidity" : int(exchange_info.get("stats_eth_liquidity", "0")),
+        "volume_24h" : int(exchange_info.get("stats_volume_24h", "0")),
+        "trade_count_24h" : exchange_info.get("stats_trade_count_24h", 0),
+        "exchanges" : 1 if ("stats_eth_liquidity" in exchange_info) else 0
+    }
+
+# recomputes the exchange's contribution from its current liquidity and the newly committed rows, then writes
+# the exchange entity (ie the crawl checkpoint) and the adjusted global totals in one transaction.
+#
+# from_block is the last_updated_block the crawl started from: the checkpoint is only written if the stored
+# exchange is still there and the new checkpoint is ahead of it, otherwise StaleCheckpointError is raised and
+# nothing is written. transaction_entities, if given, is called inside the transaction and returns more entities
+# to write along with the checkpoint
+def put_exchange_with_market_stats(ds_client, exchange_info, rows=None, now=None, from_block=None, transaction_entities=None):
+    from google.cloud import datastore
+
+    if (now is None):
+        now = int(time.time());
+
+    old_contribution = exchange_contribution(exchange_info);
+
+    buckets = update_volume_buckets(load_volume_buckets(exchange_info), rows or [], now);
+
+    exchange_info.update({
+        "stats_volume_buckets" : json.dumps(buckets),
+        "stats_eth_liquidity" : str(int(exchange_info["cur_eth_total"])),
+        "stats_volume_24h" : str(sum([int(bucket[0]) for bucket in buckets.values()])),
+        "stats_trade_count_24h" : sum([bucket[1] for bucket in buckets.values()]),
+        "stats_updated" : now
+    })
+
+    exchange_info.exclude_from_indexes.add("stats_volume_buckets");
+
+    new_contribution = exchange_contribution(exchange_info);
+
+    with ds_client.transaction():
+        stored_exchange = ds_client.get(exchange_info.key);
+
+        if (stored_exchange is not None):
+            stored_block = stored_exchange["last_updated_block"];
+
+            if ((stored_block > exchange_info["last_updated_block"]) or ((from_block is not None) and (stored_block != from_block))):
+                raise StaleCheckpointError("exchange " + str(exchange_info["address"]) + " is already checkpointed at block " + str(stored_block));
+
+            # tools/build_lp_shares.py finished indexing this exchange's pool token transfers while we were crawling,
+            # so this batch's transfers weren't applied. fail so the crawl is retried with them
+            if (("pool_token_supply" in stored_exchange) and (("pool_token_supply" in exchange_info) == False)):
+                raise Exception("pool token balances were indexed during this crawl, retrying");
+
+        global_key = global_stats_shard_key(ds_client, exchange_info["address"]);
+
+        global_stats = ds_client.get(global_key);
+
+        if (global_stats is None):
+            global_stats = datastore.Entity(key=global_key);
+            global_stats.update({
+                "eth_liquidity" : "0",
+                "volume_24h" : "0",
+                "trade_count_24h" : 0,
+                "exchanges" : 0
+            })
+
+        global_stats.update({
+            "eth_liquidity" : str(int(global_stats["eth_liquidity"]) + new_contribution["eth_liquidity"] - old_contribution["eth_liquidity"]),
+            "volume_24h" : str(int(global_stats["volume_24h"]) + new_contribution["volume_24h"] - old_contribution["volume_24h"]),
+            "trade_count_24h" : global_stats["trade_count_24h"] + new_contribution["trade_count_24h"] - old_contribution["trade_count_24h"],
+            "exchanges" : global_stats["exchanges"] + new_contribution["exchanges"] - old_contribution["exchanges"],
+            "updated" : now
+        })
+
+        entities = [exchange_info, global_stats];
+
+        if (transaction_entities is not None):
+            entities += transaction_entities();
+
+        ds_client.put_multi(entities);
+
+# market wide totals across all exchanges
+def v1_global_stats():
+    ds_client = get_datastore_client();
+
+    global_stats = load_global_stats(ds_client);
+
+    if (global_stats is None):
+        return jsonify(error='global stats not computed yet'), 404
+
+    result = {
+        "ethLiquidity" : str(global_stats["eth_liquidity"]),
+        "tradeVolume" : str(global_stats["volume_24h"]),
+        "tradeCount" : global_stats["trade_count_24h"],
+        "exchangeCount" : global_stats["exchanges"],
+        "windowHours" : STATS_WINDOW_HOURS,
+        "lastUpdated" : global_stats["updated"]
+    }
+
+    from uniswap.daily_sketches import ALL_EXCHANGES, unique_traders, days_between
+
+    # distinct traders over the utc days the window touches, from the daily sketches
+    now = int(time.time());
+
+    trader_days = days_between(now - (STATS_WINDOW_HOURS * 3600), now);
+
+    # over whole days, so up to a day more than windowHours
+    result["uniqueTraders"] = unique_traders(ds_client, [ALL_EXCHANGES], trader_days)[ALL_EXCHANGES];
+    result["uniqueTradersStartDay"] = trader_days[0];
+    result["uniqueTradersEndDay"] = trader_days[-1];
+
+    return jsonify(result)
@@ -5,7 +5,10 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import datastore
+from uniswap.clients import get_datastore_client
+
+from uniswap.price_index import get_price_index
+from uniswap.price_index import TX_ORDER_PER_BLOCK
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -22,10 +25,8 @@ from eth_utils import (
     to_wei,
 )
 
-# TODO refactor this into a single location
-PROJECT_ID = "uniswap-analytics"
-
-EXCHANGES_DATASET_ID = "exchanges_v1"
+# most 'at' values one /prices call can ask for
+MAX_PRICES_AT = 1000
 
 # return curret exchange price
 def v1_price():
@@ -34,11 +35,34 @@ def v1_price():
     if (exchange_address is None):
         return jsonify(error='missing parameter: exchangeAddress'), 400
 
-    exchange_info = load_exchange_info(datastore.Client(), exchange_address);
+    exchange_info = load_exchange_info(get_datastore_client(), exchange_address);
 
     if (exchange_info == None):
         return jsonify(error='no exchange found for this address'), 404
-    
+
+    at = request.args.get("at");
+
+    # price as of a past block number or unix timestamp
+    if (at is not None):
+        try:
+            at = int(at);
+        except ValueError:
+            return jsonify(error='invalid parameter: at'), 400
+
+        index = get_price_index(get_datastore_client(), exchange_info["address"]);
+
+        if (index is None):
+            return jsonify(error='no price index for this exchange'), 404
+
+        result = price_at(index, at);
+
+        if (result is None):
+            return jsonify(error='no history at or before ' + str(at)), 404
+
+        result["symbol"] = exchange_info["symbol"];
+
+        return jsonify(result)
+
     result = {
         "symbol" : exchange_info["symbol"],
         
@@ -46,3 +70,72 @@ def v1_price():
     }
         
     return jsonify(result)
+
+# return exchange prices at many unix timestamps (or block numbers) in one call, for backtesting
+# GET ?exchangeAddress=...&at=t1,t2,... or POST {"exchangeAddress" : ..., "at" : [t1, t2, ...]}
+def v1_prices():
+    params = request.get_json(silent=True);
+
+    if (isinstance(params, dict) == False):
+        params = {};
+
+    exchange_address = params.get("exchangeAddress", request.args.get("exchangeAddress"));
+    at_list = params.get("at", request.args.get("at"));
+
+    if (exchange_address is None):
+        return jsonify(error='missing parameter: exchangeAddress'), 400
+    if (at_list is None):
+        return jsonify(error='missing parameter: at'), 400
+
+    if (isinstance(at_list, str)):
+        at_list = at_list.split(",");
+
+    if (isinstance(at_list, list) == False):
+        return jsonify(error='invalid parameter: at'), 400
+
+    if (len(at_list) > MAX_PRICES_AT):
+        return jsonify(error='at most ' + str(MAX_PRICES_AT) + ' values of at'), 400
+
+    try:
+        at_list = [int(at) for at in at_list];
+    except (ValueError, TypeError):
+        return jsonify(error='invalid parameter: at'), 400
+
+    ds_client = get_datastore_client();
+
+    exchange_info = load_exchange_info(ds_client, exchange_address);
+
+    if (exchange_info == None):
+        return jsonify(error='no exchange found for this address'), 404
+
+    index = get_price_index(ds_client, exchange_info["address"]);
+
+    if (index is None):
+        return jsonify(error='no price index for this exchange'), 404
+
+    result = {
+        "symbol" : exchange_info["symbol"],
+
+        # None for any time before the exchange's first transaction
+        "prices" : [price_at(index, at) for at in at_list]
+    }
+
+    return jsonify(result)
+
+# price and liquidity of the last snapshot at or before at (a block number or unix timestamp)
+def price_at(index, at):
+    position = index.position_at(at);
+
+    if (position < 0):
+        return None;
+
+    snapshot = index.snapshot(position);
+
+    return {
+        "at" : at,
+        "price" : calculate_marginal_rate(snapshot["cur_eth_total"], snapshot["cur_tokens_total"]),
+        "ethLiquidity" : str(snapshot["cur_eth_total"]),
+        "erc20Liquidity" : str(snapshot["cur_tokens_total"]),
+        "timestamp" : snapshot["timestamp"],
+        "block" : snapshot["tx_order"] // TX_ORDER_PER_BLOCK
+    }
@@ -0,0 +1,375 @@
+import json
+import time
+import zlib
+import bisect
+import threading
+
+from uniswap.utils import calculate_marginal_rate
+
+# Per exchange sorted index of pool snapshots (tx_order, timestamp, cur_eth_total, cur_tokens_total), one per
+# history row, used to answer "what was the price / liquidity at time T or block B" by binary search.
+#
+# Alongside each snapshot we keep running totals up to and including it, so averages over any window come from
+# two lookups instead of a pass over the rows:
+#   cum_price_time   integral of the marginal price over time since the first snapshot (for TWAP)
+#   cum_volume       sum of abs(eth) over trades (for VWAP)
+#   cum_volume_rate  sum of abs(eth) * rate before the trade over trades (for VWAP, same weighting as the ticker)
+#
+# The index is stored in datastore as fixed size chunks so the crawler only rewrites the last chunk when it
+# appends a batch:
+#   price_index        key <exchange address>            count of snapshots, index version
+#   price_index_chunk  key <exchange address>:<chunk #>  zlib compressed json of the chunk's columns
+#
+# API instances keep each exchange's index in memory and only pull chunks that were appended since they last
+# looked (checked at most every PRICE_INDEX_REFRESH_SECONDS). The crawler only loads the last chunk (see
+# load_price_index_tail), which is all it needs to append a batch and rewrite that chunk.
+
+PRICE_INDEX_CHUNK_SIZE = 2048
+PRICE_INDEX_REFRESH_SECONDS = 30
+
+# bump when the chunk layout changes, older indexes are treated as missing until tools/build_price_index.py rebuilds them
+PRICE_INDEX_VERSION = 2
+
+# every row in history sits at block * 10000 + tx index, so this is the last position in a block
+TX_ORDER_PER_BLOCK = 10000
+
+# values of 'at' below this are block numbers, above are unix timestamps
+MAX_BLOCK_NUMBER = 1000000000
+
+class PriceIndex:
+    def __init__(self, exchange_address):
+        self.exchange_address = exchange_address;
+
+        # position of the first snapshot held in the columns, always the start of a chunk. a tail index (see
+        # load_price_index_tail) skips the chunks before its last one, it can append and save but not look up
+        self.first_position = 0;
+
+        # parallel columns, sorted by tx_order
+        self.tx_orders = [];
+        self.timestamps = [];
+        self.eth_totals = [];
+        self.tokens_totals = [];
+
+        self.cum_price_time = [];
+        self.cum_volume = [];
+        self.cum_volume_rate = [];
+
+        # when we last compared against datastore
+        self.checked = 0;
+
+        self.refresh_lock = threading.Lock();
+
+    # snapshots in the whole index, including any a tail index skipped
+    def __len__(self):
+        return self.first_position + len(self.tx_orders);
+
+    def last_tx_order(self):
+        if (len(self.tx_orders) == 0):
+            return -1;
+
+        return self.tx_orders[-1];
+
+    # appends crawled history rows (in tx_order), skipping any we already have so retried batches are harmless
+    def append_rows(self, rows):
+        appended = 0;
+
+        for row in rows:
+            tx_order = int(row["tx_order"]);
+
+            if (tx_order <= self.last_tx_order()):
+                continue;
+
+            timestamp = int(row["timestamp"]);
+            eth_total = int(row["cur_eth_total"]);
+            tokens_total = int(row["cur_tokens_total"]);
+
+            if ("cum_price_time" in row):
+                # loading a stored chunk, the running totals were computed when it was crawled
+                cum_price_time = row["cum_price_time"];
+                cum_volume = row["cum_volume"];
+                cum_volume_rate = row["cum_volume_rate"];
+            else:
+                cum_price_time, cum_volume, cum_volume_rate = self.next_cumulative(row, timestamp, eth_total, tokens_total);
+
+            # tx_orders goes last, readers only look at positions below len(tx_orders) so they never see a half appended snapshot
+            self.timestamps.append(timestamp);
+            self.eth_totals.append(eth_total);
+            self.tokens_totals.append(tokens_total);
+            self.cum_price_time.append(cum_price_time);
+            self.cum_volume.append(cum_volume);
+            self.cum_volume_rate.append(cum_volume_rate);
+            self.tx_orders.append(tx_order);
+
+            appended += 1;
+
+        return appended;
+
+    # running totals for a new history row given the snapshot before it
+    def next_cumulative(self, row, timestamp, eth_total, tokens_total):
+        if (len(self.tx_orders) == 0):
+            cum_price_time = 0;
+            cum_volume = 0;
+            cum_volume_rate = 0;
+        else:
+            # the previous price held from the previous snapshot until this one
+            cum_price_time = self.cum_price_time[-1] + (self.price(len(self.tx_orders) - 1) * (timestamp - self.timestamps[-1]));
+            cum_volume = self.cum_volume[-1];
+            cum_volume_rate = self.cum_volume_rate[-1];
+
+        if ((row["event"] == "EthPurchase") or (row["event"] == "TokenPurchase")):
+            eth = int(row["eth"]);
+            tokens = int(row["tokens"]);
+
+            rate_before_transaction = calculate_marginal_rate(eth_total - eth, tokens_total - tokens);
+
+            cum_volume += abs(eth);
+            cum_volume_rate += abs(eth) * rate_before_transaction;
+
+        return cum_price_time, cum_volume, cum_volume_rate;
+
+    def price(self, position):
+        return calculate_marginal_rate(self.eth_totals[position], self.tokens_totals[position]);
+
+    # integral of price over time from the first snapshot up to timestamp
+    def price_time_at(self, timestamp):
+        position = self.position_at_timestamp(timestamp);
+
+        if (position < 0):
+            return 0;
+
+        return self.cum_price_time[position] + (self.price(position) * (timestamp - self.timestamps[position]));
+
+    # time weighted average price over [start_time, end_time], or None if the exchange had no price in that window.
+    # time before the exchange's first transaction isn't counted
+    def twap(self, start_time, end_time):
+        if (len(self.tx_orders) == 0):
+            return None;
+
+        start_time = max(start_time, self.timestamps[0]);
+
+        if (end_time <= start_time):
+            if (end_time == start_time):
+                return self.price(self.position_at_timestamp(end_time));
+
+            return None;
+
+        return (self.price_time_at(end_time) - self.price_time_at(start_time)) / (end_time - start_time);
+
+    # eth volume weighted average trade price and eth volume for trades in [start_time, end_time]
+    def vwap(self, start_time, end_time):
+        end_position = self.position_at_timestamp(end_time);
+        # last snapshot strictly before start_time
+        start_position = bisect.bisect_left(self.timestamps, start_time, 0, len(self.tx_orders)) - 1;
+
+        volume = 0;
+        volume_rate = 0;
+
+        if (end_position >= 0):
+            volume += self.cum_volume[end_position];
+            volume_rate += self.cum_volume_rate[end_position];
+
+        if (start_position >= 0):
+            volume -= self.cum_volume[start_position];
+            volume_rate -= self.cum_volume_rate[start_position];
+
+        if (volume <= 0):
+            return None, 0;
+
+        return volume_rate / volume, volume;
+
+    # position of the last snapshot at or before tx_order (-1 if there isn't one)
+    def position_at_tx_order(self, tx_order):
+        return bisect.bisect_right(self.tx_orders, tx_order) - 1;
+
+    # position of the last snapshot at or before timestamp (-1 if there isn't one)
+    def position_at_timestamp(self, timestamp):
+        return bisect.bisect_right(self.timestamps, timestamp, 0, len(self.tx_orders)) - 1;
+
+    # position for an 'at' value, which is a block number or a unix timestamp
+    def position_at(self, at):
+        if (at < MAX_BLOCK_NUMBER):
+            return self.position_at_tx_order((at * TX_ORDER_PER_BLOCK) + (TX_ORDER_PER_BLOCK - 1));
+
+        return self.position_at_timestamp(at);
+
+    def snapshot(self, position):
+        return {
+            "tx_order" : self.tx_orders[position],
+            "timestamp" : self.timestamps[position],
+            "cur_eth_total" : self.eth_totals[position],
+            "cur_tokens_total" : self.tokens_totals[position]
+        }
+
+    def chunk_data(self, chunk_number):
+        start = (chunk_number * PRICE_INDEX_CHUNK_SIZE) - self.first_position;
+        end = start + PRICE_INDEX_CHUNK_SIZE;
+
+        data = {
+            "tx_order" : self.tx_orders[start:end],
+            "timestamp" : self.timestamps[start:end],
+            "cur_eth_total" : [str(value) for value in self.eth_totals[start:end]],
+            "cur_tokens_total" : [str(value) for value in self.tokens_totals[start:end]],
+            "cum_price_time" : self.cum_price_time[start:end],
+            "cum_volume" : [str(value) for value in self.cum_volume[start:end]],
+            "cum_volume_rate" : self.cum_volume_rate[start:end]
+        }
+
+        return zlib.compress(json.dumps(data).encode("utf-8"));
+
+    def load_chunk(self, blob):
+        data = json.loads(zlib.decompress(blob).decode("utf-8"));
+
+        rows = [];
+
+        for i in range(len(data["tx_order"])):
+            rows.append({
+                "tx_order" : data["tx_order"][i],
+                "timestamp" : data["timestamp"][i],
+                "cur_eth_total" : data["cur_eth_total"][i],
+                "cur_tokens_total" : data["cur_tokens_total"][i],
+                "cum_price_time" : data["cum_price_time"][i],
+                "cum_volume" : int(data["cum_volume"][i]),
+                "cum_volume_rate" : data["cum_volume_rate"][i]
+            });
+
+        self.append_rows(rows);
+
+def chunk_key_name(exchange_address, chunk_number):
+    return exchange_address + ":" + str(chunk_number);
+
+# the exchange's index head, or None if it hasn't been built (for this PRICE_INDEX_VERSION)
+def load_price_index_head(ds_client, exchange_address):
+    head = ds_client.get(ds_client.key("price_index", exchange_address));
+
+    if ((head is None) or (head.get("version") != PRICE_INDEX_VERSION)):
+        return None;
+
+    return head;
+
+# pulls any chunks the datastore copy has beyond what index already holds
+def refresh_price_index(ds_client, index):
+    head = load_price_index_head(ds_client, index.exchange_address);
+
+    index.checked = time.time();
+
+    if (head is None):
+        return False;
+
+    load_chunks(ds_client, index, head["count"]);
+
+    return True;
+
+# loads the chunks holding snapshots from len(index) up to count
+def load_chunks(ds_client, index, count):
+    if (count <= len(index)):
+        return;
+
+    # the chunk our last snapshot is in may have grown, so start from there
+    first_chunk = len(index) // PRICE_INDEX_CHUNK_SIZE;
+    last_chunk = (count - 1) // PRICE_INDEX_CHUNK_SIZE;
+
+    keys = [ds_client.key("price_index_chunk", chunk_key_name(index.exchange_address, chunk_number)) for chunk_number in range(first_chunk, last_chunk + 1)];
+
+    chunks = {};
+
+    for entity in ds_client.get_multi(keys):
+        chunks[entity.key.name] = entity;
+
+    for chunk_number in range(first_chunk, last_chunk + 1):
+        entity = chunks.get(chunk_key_name(index.exchange_address, chunk_number));
+
+        if (entity is None):
+            raise Exception("price index chunk " + str(chunk_number) + " missing for " + index.exchange_address);
+
+        index.load_chunk(entity["data"]);
+
+# a tail index (see PriceIndex.first_position) holding just the last chunk of the exchange's stored index, or None
+# if it hasn't been built
+def load_price_index_tail(ds_client, exchange_address):
+    head = load_price_index_head(ds_client, exchange_address);
+
+    if (head is None):
+        return None;
+
+    index = PriceIndex(exchange_address);
+
+    # the last chunk may be full, we still need its last snapshot to continue the running totals
+    index.first_position = (max(head["count"] - 1, 0) // PRICE_INDEX_CHUNK_SIZE) * PRICE_INDEX_CHUNK_SIZE;
+
+    load_chunks(ds_client, index, head["count"]);
+
+    return index;
+
+# writes every chunk from first_position onwards plus the head
+def save_price_index(ds_client, index, first_position=0):
+    from google.cloud import datastore
+
+    entities = [];
+
+    if (len(index) > 0):
+        first_chunk = min(first_position, len(index) - 1) // PRICE_INDEX_CHUNK_SIZE;
+        last_chunk = (len(index) - 1) // PRICE_INDEX_CHUNK_SIZE;
+
+        for chunk_number in range(first_chunk, last_chunk + 1):
+            chunk = datastore.Entity(key=ds_client.key("price_index_chunk", chunk_key_name(index.exchange_address, chunk_number)), exclude_from_indexes=["data"]);
+            chunk["data"] = index.chunk_data(chunk_number);
+
+            entities.append(chunk);
+
+    # the head goes last so readers never see a count that's ahead of the chunks
+    head = datastore.Entity(key=ds_client.key("price_index", index.exchange_address));
+    head["count"] = len(index);
+    head["version"] = PRICE_INDEX_VERSION;
+    head["last_tx_order"] = index.last_tx_order();
+
+    ds_client.put_multi(entities);
+    ds_client.put(head);
+
+_indexes = {};
+_indexes_lock = threading.Lock();
+
+# returns the in-memory index for an exchange, topped up from datastore if it's been a while since we checked.
+# returns None if the index hasn't been built for this exchange
+def get_price_index(ds_client, exchange_address):
+    with _indexes_lock:
+        index = _indexes.get(exchange_address);
+
+        if (index is None):
+            index = PriceIndex(exchange_address);
+            _indexes[exchange_address] = index;
+
+    # one refresh per exchange at a time
+    if (time.time() - index.checked > PRICE_INDEX_REFRESH_SECONDS):
+        with index.refresh_lock:
+            if (time.time() - index.checked > PRICE_INDEX_REFRESH_SECONDS):
+                refresh_price_index(ds_client, index);
+
+    if (len(index) == 0):
+        return None;
+
+    return index;
+
+# creates an empty index for an exchange the crawler is starting from scratch. exchanges that already have
+# history get theirs from tools/build_price_index.py instead, otherwise we'd index a partial history
+def create_price_index(ds_client, exchange_address):
+    index = PriceIndex(exchange_address);
+
+    if (refresh_price_index(ds_client, index) == False):
+        save_price_index(ds_client, index);
+
+# called by the crawler with each committed batch of history rows
+def update_price_index(ds_client, exchange_address, rows):
+    index = load_price_index_tail(ds_client, exchange_address);
+
+    if (index is None):
+        print("price index not built for " + exchange_address + ", skipping (run tools/build_price_index.py)");
+        return;
+
+    first_position = len(index);
+
+    appended = index.append_rows(sorted(rows, key=lambda row: int(row["tx_order"])));
+
+    if (appended > 0):
+        save_price_index(ds_client, index, first_position);
+
+    print("appended " + str(appended) + " snapshots to the price index for " + exchange_address);
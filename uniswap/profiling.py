@@ -0,0 +1,177 @@
+import os
+import io
+import json
+import time
+import hmac
+import random
+import pstats
+import cProfile
+
+from flask import request, jsonify, g
+
+from uniswap.config import PROFILE_DIR
+from uniswap.config import PROFILE_SAMPLE_RATE
+from uniswap.config import PROFILE_TOKEN
+
+# Opt-in cProfile of individual api requests.
+#
+# With PROFILE_DIR set, a request is profiled when its X-Profile header carries PROFILE_TOKEN or it's picked by
+# PROFILE_SAMPLE_RATE, so anonymous clients can't make us profile whatever they like. The profiler runs from
+# before_request to teardown_request (on the request's own thread), which flask calls even when the view raises,
+# and each profiled request leaves two files in PROFILE_DIR:
+#   <time>-<route>.pstats    the full profile, for python -m pstats or snakeviz
+#   <time>-<route>.json      duration, request and the top frames by own time, read by /admin/profiles
+#
+# /admin/profiles shows request query strings, so it's only served to app admins (login: admin in app.yaml).
+
+PROFILE_HEADER = "X-Profile"
+
+# set by app engine on requests from a signed in app admin, and stripped from anything a client sends
+ADMIN_HEADER = "X-Appengine-User-Is-Admin"
+
+PROFILE_TOP_FRAMES = 15
+
+# most recent profiles kept in PROFILE_DIR, older ones are deleted
+PROFILE_MAX_FILES = 500
+
+def should_profile():
+    profile_token = request.headers.get(PROFILE_HEADER);
+
+    if ((PROFILE_TOKEN is not None) and (profile_token is not None) and hmac.compare_digest(profile_token, PROFILE_TOKEN)):
+        return True;
+
+    return (PROFILE_SAMPLE_RATE > 0) and (random.random() < PROFILE_SAMPLE_RATE);
+
+def format_frame(frame):
+    filename, line_number, function_name = frame;
+
+    return filename + ":" + str(line_number) + "(" + function_name + ")";
+
+# the frames with the most own time, as json friendly dicts
+def top_frames(profiler, count=PROFILE_TOP_FRAMES):
+    stats = pstats.Stats(profiler, stream=io.StringIO());
+
+    frames = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:count];
+
+    return [{
+        "frame" : format_frame(frame),
+        "calls" : primitive_calls,
+        "ownSeconds" : round(own_time, 6),
+        "cumulativeSeconds" : round(cumulative_time, 6)
+    } for frame, (primitive_calls, total_calls, own_time, cumulative_time, callers) in frames];
+
+def start_profile():
+    if (should_profile() == False):
+        return;
+
+    g.profiler = cProfile.Profile();
+    g.profile_start = time.time();
+
+    g.profiler.enable();
+
+# notes the status of a profiled request, the profile itself is written by finish_profile
+def record_profile_status(response):
+    if ("profiler" in g):
+        g.profile_status = response.status_code;
+
+    return response;
+
+# runs at teardown so the profiler is disabled even when the view raised (and after_request was skipped)
+def finish_profile(exception):
+    profiler = g.pop("profiler", None);
+
+    if (profiler is None):
+        return;
+
+    profiler.disable();
+
+    duration = time.time() - g.profile_start;
+
+    try:
+        write_profile(profiler, duration, g.pop("profile_status", 500));
+    except Exception as e:
+        print("Failed to write request profile: " + str(e));
+
+def write_profile(profiler, duration, status_code):
+    name = str(int(g.profile_start * 1000)) + "-" + (request.endpoint or "unknown");
+
+    path = os.path.join(PROFILE_DIR, name);
+
+    profiler.dump_stats(path + ".pstats");
+
+    summary = {
+        "profile" : name,
+        "path" : request.path,
+        "query" : request.query_string.decode("utf-8"),
+        "status" : status_code,
+        "timestamp" : int(g.profile_start),
+        "durationSeconds" : round(duration, 6),
+        "topFrames" : top_frames(profiler)
+    }
+
+    with open(path + ".json", "w") as summary_file:
+        summary_file.write(json.dumps(summary));
+
+    prune_profiles();
+
+def list_profile_summaries():
+    if (os.path.isdir(PROFILE_DIR) == False):
+        return [];
+
+    return sorted([name for name in os.listdir(PROFILE_DIR) if name.endswith(".json")]);
+
+def prune_profiles():
+    names = list_profile_summaries();
+
+    for name in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+        for suffix in [".json", ".pstats"]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-len(".json")] + suffix));
+            except OSError:
+                pass;
+
+# hooks the profiler into every request of app, does nothing unless PROFILE_DIR is set
+def install_request_profiler(app):
+    if (PROFILE_DIR is None):
+        return;
+
+    os.makedirs(PROFILE_DIR, exist_ok=True);
+
+    app.before_request(start_profile);
+    app.after_request(record_profile_status);
+    app.teardown_request(finish_profile);
+
+# the slowest profiled requests on this instance, optionally for one path
+def v1_profiles():
+    if (PROFILE_DIR is None):
+        return jsonify(error='request profiling is not enabled'), 404
+
+    # app.yaml already requires an admin login for /admin, this keeps it closed if that handler is ever changed
+    if (request.headers.get(ADMIN_HEADER) != "1"):
+        return jsonify(error='admin only'), 403
+
+    try:
+        count = int(request.args.get("count", 20));
+    except ValueError:
+        return jsonify(error='count must be a number'), 400
+
+    path_filter = request.args.get("path");
+
+    summaries = [];
+
+    for name in list_profile_summaries():
+        try:
+            with open(os.path.join(PROFILE_DIR, name), "r") as summary_file:
+                summary = json.loads(summary_file.read());
+        except (OSError, ValueError):
+            # deleted by another worker or still being written
+            continue;
+
+        if ((path_filter is not None) and (summary["path"] != path_filter)):
+            continue;
+
+        summaries.append(summary);
+
+    summaries = sorted(summaries, key=lambda summary: summary["durationSeconds"], reverse=True)[:count];
+
+    return jsonify(profiles=summaries);
@@ -0,0 +1,310 @@
+import re
+import json
+import time
+import base64
+import decimal
+import hashlib
+import datetime
+import threading
+
+from collections import OrderedDict
+
+from uniswap.config import QUERY_CACHE_BUCKET_SECONDS
+from uniswap.config import QUERY_CACHE_MAX_ENTRIES
+from uniswap.config import QUERY_CACHE_MAX_ROWS
+from uniswap.config import QUERY_CACHE_TTL_SECONDS
+from uniswap.config import QUERY_CACHE_REDIS_URL
+from uniswap.config import QUERY_CACHE_OPEN_TTL_SECONDS
+
+from uniswap.clients import get_client
+from uniswap.clients import get_bigquery_client
+
+# Result cache that sits under every BigQuery read.
+#
+# Results are keyed on the normalized sql (whitespace collapsed) plus any query parameters, and kept in a
+# bounded in-process LRU. If QUERY_CACHE_REDIS_URL is set, results are also written to redis so other
+# instances can reuse them. Entries are tagged with the exchange they read and the latest timestamp they
+# cover, so when the crawler commits new rows it can drop exactly the entries that those rows land in.
+#
+# For keys to repeat, callers snap open ended time bounds (an end time of "now") up to the end of the current
+# bucket with snap_end_time before building their sql.
+#
+# Without redis, invalidation only reaches the instance whose crawler committed the rows. Other instances keep
+# serving results that reach the present (a range_end within a bucket of when they were cached, or none) for up
+# to QUERY_CACHE_OPEN_TTL_SECONDS, which bounds how stale they get. Closed historical ranges keep the full ttl,
+# new rows never land in them.
+
+# an end time this close behind our clock still means "now" (client clocks and request latency)
+OPEN_END_SLACK_SECONDS = 60
+
+# latest bucket boundary at or before timestamp
+def snap_time(timestamp, bucket_seconds=QUERY_CACHE_BUCKET_SECONDS):
+    if (bucket_seconds <= 0):
+        return timestamp;
+
+    return (int(timestamp) // bucket_seconds) * bucket_seconds;
+
+# snaps an end time that is still open (now, give or take OPEN_END_SLACK_SECONDS, or later) up to
+# the next bucket boundary, so every request in the same window builds the same sql and it still covers every row
+# crawled so far. rows crawled later land inside that range, so invalidate_exchange drops the results they'd
+# change. closed historical ranges are left alone
+def snap_end_time(end_time, bucket_seconds=QUERY_CACHE_BUCKET_SECONDS, now=None):
+    if (now is None):
+        now = int(time.time());
+
+    end_time = int(end_time);
+
+    if (end_time >= now - OPEN_END_SLACK_SECONDS):
+        end_time = snap_time(now + bucket_seconds - 1, bucket_seconds);
+
+    return end_time;
+
+def normalize_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip();
+
+# params is an optional dict of name -> (bigquery type, value)
+def cache_key(sql, params=None):
+    key_data = normalize_sql(sql);
+
+    if (params):
+        key_data += "|" + json.dumps(sorted([[name, param[0], param[1]] for name, param in params.items()]), default=str);
+
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest();
+
+class QueryResultCache:
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS, shared=None, open_ttl_seconds=QUERY_CACHE_OPEN_TTL_SECONDS):
+        self.max_entries = max_entries;
+        self.ttl_seconds = ttl_seconds;
+        self.shared = shared;
+        self.open_ttl_seconds = open_ttl_seconds;
+
+        # key -> entry dict (rows, exchange, range_end, created, generation)
+        self.entries = OrderedDict();
+
+        self.lock = threading.Lock();
+
+        self.hits = 0;
+        self.misses = 0;
+
+    def get(self, key, exchange_address=None):
+        now = time.time();
+
+        with self.lock:
+            entry = self.entries.get(key);
+
+            if ((entry is not None) and (now - entry["created"] > self.entry_ttl(entry))):
+                del self.entries[key];
+                entry = None;
+
+            if (entry is not None):
+                self.entries.move_to_end(key);
+
+        # another instance's crawler may have invalidated this exchange since we cached the entry
+        if ((entry is not None) and (self.shared is not None) and (exchange_address is not None)):
+            if (entry["generation"] != self.shared.generation(exchange_address)):
+                self.discard(key);
+                entry = None;
+
+        if ((entry is None) and (self.shared is not None)):
+            entry = self.shared.get(self._shared_key(key, exchange_address));
+
+            if (entry is not None):
+                self._store_local(key, entry);
+
+        with self.lock:
+            if (entry is None):
+                self.misses += 1;
+                return None;
+
+            self.hits += 1;
+
+        return entry["rows"];
+
+    # how long an entry may be served from the local tier
+    def entry_ttl(self, entry):
+        # with the shared tier, invalidations from every instance reach us through the generation check
+        if ((self.shared is not None) or (entry["exchange"] is None)):
+            return self.ttl_seconds;
+
+        # results reaching the present may have been invalidated on another instance we'll never hear from
+        if ((entry["range_end"] is None) or (entry["range_end"] >= entry["created"] - QUERY_CACHE_BUCKET_SECONDS)):
+            return min(self.ttl_seconds, self.open_ttl_seconds);
+
+        return self.ttl_seconds;
+
+    def put(self, key, rows, exchange_address=None, range_end=None):
+        entry = {
+            "rows" : rows,
+            "exchange" : exchange_address,
+            "range_end" : range_end,
+            "created" : time.time(),
+            "generation" : None
+        }
+
+        if ((self.shared is not None) and (exchange_address is not None)):
+            entry["generation"] = self.shared.generation(exchange_address);
+
+        self._store_local(key, entry);
+
+        if (self.shared is not None):
+            self.shared.set(self._shared_key(key, exchange_address), entry, self.ttl_seconds);
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None);
+
+    # drop every entry for this exchange whose range reaches from_timestamp or later (ie any result that
+    # newly crawled rows at or after from_timestamp would have changed)
+    def invalidate_exchange(self, exchange_address, from_timestamp=None):
+        with self.lock:
+            for key in list(self.entries.keys()):
+                entry = self.entries[key];
+
+                if (entry["exchange"] != exchange_address):
+                    continue;
+
+                if ((from_timestamp is None) or (entry["range_end"] is None) or (entry["range_end"] >= from_timestamp)):
+                    del self.entries[key];
+
+        # the shared tier can't be scanned cheaply, so move the whole exchange on to a new generation
+        if (self.shared is not None):
+            self.shared.bump_generation(exchange_address);
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear();
+
+    def _store_local(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry;
+            self.entries.move_to_end(key);
+
+            while (len(self.entries) > self.max_entries):
+                self.entries.popitem(last=False);
+
+    def _shared_key(self, key, exchange_address):
+        if (exchange_address is None):
+            return "query:" + key;
+
+        return "query:" + exchange_address + ":" + str(self.shared.generation(exchange_address)) + ":" + key;
+
+# json has no types for some of what bigquery returns (NUMERIC / BIGNUMERIC as Decimal, TIMESTAMP / DATE / TIME,
+# BYTES), so those values are stored as a single key object naming their type and read back as the same type
+VALUE_TAGS = [
+    ("__decimal__", decimal.Decimal, str, decimal.Decimal),
+    ("__datetime__", datetime.datetime, lambda value: value.isoformat(), datetime.datetime.fromisoformat),
+    ("__date__", datetime.date, lambda value: value.isoformat(), datetime.date.fromisoformat),
+    ("__time__", datetime.time, lambda value: value.isoformat(), datetime.time.fromisoformat),
+    ("__bytes__", bytes, lambda value: base64.b64encode(value).decode("ascii"), base64.b64decode)
+]
+
+def tag_value(value):
+    # datetime is a date, so the first matching type wins
+    for tag, value_type, encode, decode in VALUE_TAGS:
+        if (isinstance(value, value_type)):
+            return {tag : encode(value)};
+
+    raise TypeError("can't store a " + type(value).__name__ + " in the query cache");
+
+def untag_value(data):
+    if (len(data) == 1):
+        for tag, value_type, encode, decode in VALUE_TAGS:
+            if (tag in data):
+                return decode(data[tag]);
+
+    return data;
+
+def encode_entry(entry):
+    return json.dumps(entry, default=tag_value).encode("utf-8");
+
+def decode_entry(data):
+    return json.loads(data.decode("utf-8"), object_hook=untag_value);
+
+# optional shared tier backed by redis
+class RedisResultStore:
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url);
+
+    def get(self, key):
+        value = self.redis.get(key);
+
+        if (value is None):
+            return None;
+
+        return decode_entry(value);
+
+    def set(self, key, entry, ttl_seconds):
+        self.redis.set(key, encode_entry(entry), ex=ttl_seconds);
+
+    def generation(self, exchange_address):
+        value = self.redis.get("generation:" + exchange_address);
+
+        if (value is None):
+            return 0;
+
+        return int(value);
+
+    def bump_generation(self, exchange_address):
+        self.redis.incr("generation:" + exchange_address);
+
+def get_query_cache():
+    return get_client("query_cache", _create_query_cache);
+
+def _create_query_cache():
+    shared = None;
+
+    if (QUERY_CACHE_REDIS_URL):
+        shared = RedisResultStore(QUERY_CACHE_REDIS_URL);
+
+    return QueryResultCache(shared=shared);
+
+# runs sql on bigquery and returns the result rows as dicts, serving repeated queries from the cache.
+# exchange_address and range_end tag the result so the crawler can invalidate it (see invalidate_exchange)
+def run_query(sql, params=None, exchange_address=None, range_end=None, use_cache=True):
+    query_cache = get_query_cache();
+
+    key = cache_key(sql, params);
+
+    if (use_cache):
+        rows = query_cache.get(key, exchange_address);
+
+        if (rows is not None):
+            print("query cache hit " + key);
+            return rows;
+
+    print(sql);
+
+    bq_client = get_bigquery_client();
+
+    job_config = None;
+
+    if (params):
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig();
+        job_config.query_parameters = [bigquery.ScalarQueryParameter(name, param[0], param[1]) for name, param in params.items()];
+
+    query_job = bq_client.query(sql, job_config=job_config);
+
+    rows = [dict(row.items()) for row in query_job.result()];
+
+    if (use_cache and (len(rows) <= QUERY_CACHE_MAX_ROWS)):
+        query_cache.put(key, rows, exchange_address, range_end);
+
+    return rows;
+
+# runs sql on bigquery and yields the result rows as dicts without caching or holding them all in memory,
+# bigquery hands the results over a page at a time as we iterate
+def iter_query(sql):
+    print(sql);
+
+    query_job = get_bigquery_client().query(sql);
+
+    for row in query_job.result():
+        yield dict(row.items());
+
+# called by the crawler once rows from from_timestamp onwards have been committed for an exchange
+def invalidate_exchange(exchange_address, from_timestamp=None):
+    get_query_cache().invalidate_exchange(exchange_address, from_timestamp);
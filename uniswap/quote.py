@@ -0,0 +1,227 @@
+import time
+import threading
+
+import numpy as np
+
+from flask import request, jsonify
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.decode import ETH_DECIMALS
+
+from uniswap.constant_product import PROVIDER_FEE
+from uniswap.constant_product import side_liquidity
+from uniswap.constant_product import quote_amounts
+
+from uniswap.utils import load_exchange_info
+
+from eth_utils import is_address, to_checksum_address
+
+# Trade quotes and depth ladders from an exchange's current reserves.
+#
+# Output amounts are exactly what the contract pays (get_input_price, x * y = k in integer wei), prices and
+# price impacts for every trade size are then computed at once with numpy (see uniswap/constant_product.py).
+# Reserves are kept in memory for RESERVES_CACHE_SECONDS, so a quote or a full depth chart is one datastore read at
+# most. Amounts are in base units (wei / the token's smallest unit) like the rest of the api, prices are tokens per
+# eth in base units like /price.
+#
+#   side=buy   pay eth, receive tokens
+#   side=sell  pay tokens, receive eth
+
+SIDES = ["buy", "sell"]
+
+# reserves only change when the crawler checkpoints (every few minutes)
+RESERVES_CACHE_SECONDS = 30
+
+MAX_QUOTE_AMOUNTS = 1000
+
+DEPTH_DEFAULT_POINTS = 50
+DEPTH_MAX_POINTS = 1000
+
+# depth ladders run from this fraction of the input reserve up to all of it
+DEPTH_MIN_FRACTION = 0.0001
+
+# exchange address -> (expiry, reserves)
+_reserves = {};
+
+_reserves_lock = threading.Lock();
+
+# (expiry, reserves of every exchange), for uniswap/cross.py
+_all_reserves = None;
+
+_all_reserves_lock = threading.Lock();
+
+def exchange_reserves(exchange_info):
+    return {
+        "address" : exchange_info["address"],
+        "token_address" : exchange_info["token_address"],
+        "symbol" : exchange_info["symbol"],
+        "token_decimals" : exchange_info["token_decimals"],
+
+        "eth" : int(exchange_info["cur_eth_total"]),
+        "tokens" : int(exchange_info["cur_tokens_total"])
+    }
+
+# the exchange's symbol, decimals and current eth / token reserves, or None if there's no such exchange
+def get_reserves(exchange_address, ds_client=None):
+    exchange_address = to_checksum_address(exchange_address);
+
+    now = time.time();
+
+    cached = _reserves.get(exchange_address);
+
+    if ((cached is not None) and (cached[0] > now)):
+        return cached[1];
+
+    exchange_info = load_exchange_info(ds_client or get_datastore_client(), exchange_address);
+
+    if (exchange_info is None):
+        return None;
+
+    reserves = exchange_reserves(exchange_info);
+
+    with _reserves_lock:
+        _reserves[exchange_address] = (now + RESERVES_CACHE_SECONDS, reserves);
+
+    return reserves;
+
+# the reserves of every exchange in one query, cached like get_reserves (and shared with it)
+def get_all_reserves(ds_client=None):
+    global _all_reserves
+
+    cached = _all_reserves;
+
+    if ((cached is not None) and (cached[0] > time.time())):
+        return cached[1];
+
+    # one reload at a time, the rest wait for it rather than all running the same query
+    with _all_reserves_lock:
+        if ((_all_reserves is not None) and (_all_reserves[0] > time.time())):
+            return _all_reserves[1];
+
+        all_reserves = [exchange_reserves(entity) for entity in (ds_client or get_datastore_client()).query(kind='exchange').fetch()];
+
+        expiry = time.time() + RESERVES_CACHE_SECONDS;
+
+        with _reserves_lock:
+            for reserves in all_reserves:
+                _reserves[reserves["address"]] = (expiry, reserves);
+
+        _all_reserves = (expiry, all_reserves);
+
+        return all_reserves;
+
+# (input reserve, output reserve, input decimals, output decimals) for a side
+def side_reserves(reserves, side):
+    input_reserve, output_reserve = side_liquidity(reserves, side);
+
+    if (side == "buy"):
+        return input_reserve, output_reserve, ETH_DECIMALS, reserves["token_decimals"];
+
+    return input_reserve, output_reserve, reserves["token_decimals"], ETH_DECIMALS;
+
+def quotes_json(reserves, side, input_amounts):
+    input_amounts, output_amounts, prices, price_impacts = quote_amounts(reserves, side, input_amounts);
+
+    input_reserve, output_reserve, input_decimals, output_decimals = side_reserves(reserves, side);
+
+    input_norm = np.array(input_amounts, dtype=np.float64) / (10 ** input_decimals);
+    output_norm = np.array(output_amounts, dtype=np.float64) / (10 ** output_decimals);
+
+    quotes = [];
+
+    for i in range(len(input_amounts)):
+        quotes.append({
+            "inputAmount" : str(input_amounts[i]),
+            "outputAmount" : str(output_amounts[i]),
+            "inputAmountNorm" : float(input_norm[i]),
+            "outputAmountNorm" : float(output_norm[i]),
+
+            "price" : float(prices[i]),
+            "priceImpact" : float(price_impacts[i])
+        })
+
+    return quotes;
+
+def reserves_json(reserves):
+    return {
+        "symbol" : reserves["symbol"],
+        "exchangeAddress" : reserves["address"],
+        "fee" : PROVIDER_FEE,
+
+        "price" : (reserves["tokens"] / reserves["eth"]) if (reserves["eth"] != 0) else 0,
+        "ethLiquidity" : str(reserves["eth"]),
+        "tokenLiquidity" : str(reserves["tokens"])
+    }
+
+# parses an exchangeAddress parameter into its reserves, returns (reserves, error response)
+def load_reserves_param(exchange_address):
+    if (exchange_address is None):
+        return None, (jsonify(error='missing parameter: exchangeAddress'), 400)
+
+    if (is_address(exchange_address) == False):
+        return None, (jsonify(error='invalid exchange address'), 400)
+
+    reserves = get_reserves(exchange_address);
+
+    if (reserves is None):
+        return None, (jsonify(error='no exchange found for this address'), 404)
+
+    return reserves, None;
+
+# output amount, price and price impact for each of a comma separated list of input amounts
+def v1_quote():
+    side = request.args.get("side");
+    amounts = request.args.get("amounts");
+
+    if ((side in SIDES) == False):
+        return jsonify(error='side must be one of ' + ", ".join(SIDES)), 400
+
+    if (amounts is None):
+        return jsonify(error='missing parameter: amounts'), 400
+
+    try:
+        amounts = [int(amount) for amount in amounts.split(",")];
+    except ValueError:
+        return jsonify(error='amounts must be integers'), 400
+
+    if ((len(amounts) > MAX_QUOTE_AMOUNTS) or (min(amounts) < 0)):
+        return jsonify(error='amounts must be at most ' + str(MAX_QUOTE_AMOUNTS) + ' non negative integers'), 400
+
+    reserves, error = load_reserves_param(request.args.get("exchangeAddress"));
+
+    if (error is not None):
+        return error;
+
+    result = reserves_json(reserves);
+
+    result["side"] = side;
+    result["quotes"] = quotes_json(reserves, side, amounts);
+
+    return jsonify(result)
+
+# quotes for a ladder of trade sizes on both sides, from DEPTH_MIN_FRACTION of the input reserve up to all of it
+def v1_depth():
+    try:
+        points = min(int(request.args.get("points", DEPTH_DEFAULT_POINTS)), DEPTH_MAX_POINTS);
+    except ValueError:
+        return jsonify(error='invalid parameter: points'), 400
+
+    if (points < 1):
+        return jsonify(error='invalid parameter: points'), 400
+
+    reserves, error = load_reserves_param(request.args.get("exchangeAddress"));
+
+    if (error is not None):
+        return error;
+
+    fractions = np.logspace(np.log10(DEPTH_MIN_FRACTION), 0, points);
+
+    result = reserves_json(reserves);
+
+    for side in SIDES:
+        input_reserve = side_reserves(reserves, side)[0];
+
+        result[side] = quotes_json(reserves, side, np.floor(fractions * float(input_reserve)));
+
+    return jsonify(result)
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import random
+import threading
+
+from web3.providers.base import BaseProvider
+
+# Record / replay of json-rpc provider traffic, so crawls can be reproduced offline (see tools/benchmark_crawl.py).
+#
+# A fixture directory holds one json lines file per rpc method (eth_getLogs.jsonl, eth_getBlockByNumber.jsonl,
+# eth_call.jsonl, ...) with a {"params", "response"} line per recorded call. Calls are matched on method and
+# params only, so request ids don't matter and the same call recorded twice replays the latest response.
+
+def canonical_params(params):
+    return json.dumps(params, sort_keys=True, default=lambda value: value.hex() if hasattr(value, "hex") else str(value));
+
+class FixtureStore:
+    def __init__(self, directory):
+        self.directory = directory;
+
+        # (method, canonical params) -> recorded response
+        self.responses = {};
+
+        self.lock = threading.Lock();
+
+        os.makedirs(directory, exist_ok=True);
+
+        for name in sorted(os.listdir(directory)):
+            if (name.endswith(".jsonl") == False):
+                continue;
+
+            method = name[:-len(".jsonl")];
+
+            with open(os.path.join(directory, name), "r") as fixture_file:
+                for line in fixture_file:
+                    fixture = json.loads(line);
+
+                    self.responses[(method, canonical_params(fixture["params"]))] = fixture["response"];
+
+    def __len__(self):
+        return len(self.responses);
+
+    def record(self, method, params, response):
+        line = json.dumps({"params" : json.loads(canonical_params(params)), "response" : response});
+
+        with self.lock:
+            self.responses[(method, canonical_params(params))] = response;
+
+            with open(os.path.join(self.directory, method + ".jsonl"), "a") as fixture_file:
+                fixture_file.write(line + "\n");
+
+    # the recorded response for a call, or None
+    def lookup(self, method, params):
+        return self.responses.get((method, canonical_params(params)));
+
+# passes every call through to provider and records the successful responses
+class RecordingProvider(BaseProvider):
+    def __init__(self, provider, store):
+        self.provider = provider;
+        self.store = store;
+
+    def make_request(self, method, params):
+        response = self.provider.make_request(method, params);
+
+        if (("error" in response) == False):
+            self.store.record(method, params, response);
+
+        return response;
+
+    # records the responses to a batched call that was made outside of web3
+    def record_batch(self, payload, responses):
+        calls = dict([(call.get("id"), call) for call in payload]);
+
+        for response in responses:
+            call = calls.get(response.get("id"));
+
+            if ((call is not None) and (("error" in response) == False)):
+                self.store.record(call["method"], call["params"], response);
+
+    def isConnected(self):
+        return self.provider.isConnected();
+
+# serves recorded responses, optionally adding latency_ms to every call and failing error_rate of them
+class ReplayProvider(BaseProvider):
+    def __init__(self, store, latency_ms=0, error_rate=0, seed=None):
+        self.store = store;
+        self.latency_ms = latency_ms;
+        self.error_rate = error_rate;
+
+        self.random = random.Random(seed);
+
+        self.request_counter = 0;
+
+    def simulate_network(self):
+        if (self.latency_ms > 0):
+            time.sleep(self.latency_ms / 1000.0);
+
+        if ((self.error_rate > 0) and (self.random.random() < self.error_rate)):
+            raise ConnectionError("injected replay error");
+
+    def replay(self, method, params, request_id):
+        response = self.store.lookup(method, params);
+
+        if (response is None):
+            return {
+                "jsonrpc" : "2.0",
+                "id" : request_id,
+                "error" : {"code" : -32000, "message" : "no recorded response for " + method + " " + canonical_params(params)}
+            }
+
+        response = dict(response);
+        response["id"] = request_id;
+
+        return response;
+
+    def make_request(self, method, params):
+        self.simulate_network();
+
+        self.request_counter += 1;
+
+        return self.replay(method, params, self.request_counter);
+
+    # a batched call (list of json-rpc requests) costs one round trip, like over http
+    def make_batch_request(self, payload):
+        self.simulate_network();
+
+        return [self.replay(call["method"], call["params"], call.get("id")) for call in payload];
+
+    def isConnected(self):
+        return True;
@@ -0,0 +1,255 @@
+import json
+import time
+import threading
+import collections
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+from flask import jsonify
+
+from web3.providers.base import JSONBaseProvider
+
+# One json-rpc client for every provider in PROVIDER_URLS, shared by web3 (the crawler, /user, the tools) and the
+# batched block fetches in uniswap/blocks.py.
+#
+# Each provider keeps a pooled keep-alive http session and its recent latencies and outcomes. Calls go to the
+# healthiest provider first and fail over to the next on connection errors, timeouts and http errors. Json-rpc
+# error responses (a reverted eth_call, say) are the answer to the call and are returned as they are. Read calls
+# in HEDGED_METHODS get a second request to the next provider once the first has run past its p95 latency, and
+# whichever answers first wins. Hedges run on their own executor, so they can't hold up first requests or queue
+# behind them. A losing request keeps running on its executor, so hedges get a shorter timeout
+# (HEDGE_TIMEOUT_SECONDS) and at most MAX_INFLIGHT_HEDGES run at once. Past that, calls wait on their first
+# provider instead.
+
+HEDGED_METHODS = set(["eth_call", "eth_getBlockByNumber", "eth_getBlockByHash", "eth_blockNumber", "eth_getBalance", "eth_getCode"])
+
+# recent calls per provider the stats are computed over
+STATS_WINDOW = 200
+
+# latency we assume for a provider until it has enough samples for a p95
+DEFAULT_LATENCY_SECONDS = 1.0
+MIN_LATENCY_SAMPLES = 20
+
+# a provider that fails this many calls in a row is only tried after the others for COOLDOWN_SECONDS
+MAX_CONSECUTIVE_FAILURES = 3
+COOLDOWN_SECONDS = 30
+
+# workers for first requests (and connections kept alive per provider, with the hedges'), one per gunicorn thread
+POOL_SIZE = 32
+
+# hedges still running (won, lost or pending) across the pool, which is also the size of their executor
+MAX_INFLIGHT_HEDGES = 8
+
+# a hedge only helps if it's fast, so it gives up well before a primary request would
+HEDGE_TIMEOUT_SECONDS = 5
+
+def percentile(values, fraction):
+    values = sorted(values);
+
+    return values[min(int(len(values) * fraction), len(values) - 1)];
+
+class RpcEndpoint:
+    def __init__(self, url, timeout):
+        import requests
+
+        self.url = url;
+        self.timeout = timeout;
+
+        self.session = requests.Session();
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE + MAX_INFLIGHT_HEDGES);
+        self.session.mount("http://", adapter);
+        self.session.mount("https://", adapter);
+
+        self.lock = threading.Lock();
+
+        self.latencies = collections.deque(maxlen=STATS_WINDOW);
+        self.outcomes = collections.deque(maxlen=STATS_WINDOW); # True for a successful call
+
+        self.requests = 0;
+        self.errors = 0;
+        self.hedges = 0;
+
+        self.consecutive_failures = 0;
+        self.cooldown_until = 0;
+
+    # posts a raw json-rpc request (single or batch) and returns the decoded response
+    def post(self, data, timeout=None):
+        start = time.perf_counter();
+
+        try:
+            response = self.session.post(self.url, data=data, headers={"Content-Type" : "application/json"}, timeout=timeout or self.timeout);
+            response.raise_for_status();
+
+            result = json.loads(response.content.decode("utf-8"));
+        except Exception:
+            self.record(False, None);
+            raise
+
+        self.record(True, time.perf_counter() - start);
+
+        return result;
+
+    def record(self, success, latency):
+        with self.lock:
+            self.requests += 1;
+            self.outcomes.append(success);
+
+            if (success):
+                self.latencies.append(latency);
+                self.consecutive_failures = 0;
+            else:
+                self.errors += 1;
+                self.consecutive_failures += 1;
+
+                if (self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES):
+                    self.cooldown_until = time.time() + COOLDOWN_SECONDS;
+
+    def error_rate(self):
+        outcomes = list(self.outcomes);
+
+        if (len(outcomes) == 0):
+            return 0;
+
+        return outcomes.count(False) / len(outcomes);
+
+    def latency(self, fraction):
+        latencies = list(self.latencies);
+
+        if (len(latencies) < MIN_LATENCY_SAMPLES):
+            return DEFAULT_LATENCY_SECONDS;
+
+        return percentile(latencies, fraction);
+
+    def cooling_down(self):
+        return time.time() < self.cooldown_until;
+
+    # lower is healthier: median latency, inflated by the recent error rate
+    def score(self):
+        return self.latency(0.5) * (1 + 10 * self.error_rate());
+
+    def stats(self):
+        return {
+            # provider urls often carry an api key in the path
+            "host" : urlparse(self.url).netloc,
+
+            "requests" : self.requests,
+            "errors" : self.errors,
+            "hedges" : self.hedges,
+
+            "errorRate" : self.error_rate(),
+            "p50Seconds" : self.latency(0.5),
+            "p95Seconds" : self.latency(0.95),
+
+            "coolingDown" : self.cooling_down()
+        }
+
+class RpcPool(JSONBaseProvider):
+    def __init__(self, urls, timeout, hedge_min_seconds):
+        super().__init__();
+
+        self.endpoints = [RpcEndpoint(url, timeout) for url in urls];
+        self.hedge_min_seconds = hedge_min_seconds;
+
+        self.executor = ThreadPoolExecutor(max_workers=POOL_SIZE);
+
+        # a hedge always has a worker, the budget below never lets more than MAX_INFLIGHT_HEDGES in
+        self.hedge_executor = ThreadPoolExecutor(max_workers=MAX_INFLIGHT_HEDGES);
+
+        self.inflight_hedges = 0;
+        self.hedges_lock = threading.Lock();
+
+    # submits a hedge to endpoint, or returns None if MAX_INFLIGHT_HEDGES are already running
+    def submit_hedge(self, endpoint, data):
+        with self.hedges_lock:
+            if (self.inflight_hedges >= MAX_INFLIGHT_HEDGES):
+                return None;
+
+            self.inflight_hedges += 1;
+
+            endpoint.hedges += 1;
+
+        future = self.hedge_executor.submit(endpoint.post, data, min(endpoint.timeout, HEDGE_TIMEOUT_SECONDS));
+        future.add_done_callback(self.hedge_done);
+
+        return future;
+
+    def hedge_done(self, future):
+        with self.hedges_lock:
+            self.inflight_hedges -= 1;
+
+    # providers in the order to try them, healthiest first and the ones cooling down last
+    def ranked_endpoints(self):
+        return sorted(self.endpoints, key=lambda endpoint: (endpoint.cooling_down(), endpoint.score()));
+
+    # sends data to the healthiest provider, failing over to the others in turn. when hedge is set and the first
+    # provider hasn't answered within its p95 latency, the next one is asked as well
+    def send(self, data, hedge):
+        endpoints = self.ranked_endpoints();
+
+        pending = {};
+        next_index = 0;
+        hedged = (hedge == False) or (len(endpoints) < 2);
+
+        last_error = None;
+
+        while (True):
+            if ((len(pending) == 0) and (next_index < len(endpoints))):
+                pending[self.executor.submit(endpoints[next_index].post, data)] = endpoints[next_index];
+                next_index += 1;
+
+            if (len(pending) == 0):
+                if (last_error is None):
+                    raise ValueError("no rpc endpoints");
+
+                raise last_error
+
+            timeout = None;
+
+            if ((hedged == False) and (next_index < len(endpoints))):
+                timeout = max(endpoints[next_index - 1].latency(0.95), self.hedge_min_seconds);
+
+            done, not_done = wait(list(pending.keys()), timeout=timeout, return_when=FIRST_COMPLETED);
+
+            if (len(done) == 0):
+                hedged = True;
+
+                hedge = self.submit_hedge(endpoints[next_index], data);
+
+                # over the hedge budget, keep waiting on the first provider (and fail over as usual)
+                if (hedge is None):
+                    continue;
+
+                pending[hedge] = endpoints[next_index];
+                next_index += 1;
+
+                continue;
+
+            for future in done:
+                del pending[future];
+
+                try:
+                    # a losing hedge keeps running in the background, its latency still counts towards its provider's stats
+                    return future.result();
+                except Exception as e:
+                    last_error = e;
+
+    def make_request(self, method, params):
+        return self.send(self.encode_rpc_request(method, params), method in HEDGED_METHODS);
+
+    # a list of json-rpc requests in one round trip, hedged when every call in it is a hedged read
+    def make_batch_request(self, payload):
+        return self.send(json.dumps(payload).encode("utf-8"), all([call["method"] in HEDGED_METHODS for call in payload]));
+
+    def isConnected(self):
+        return True;
+
+    def stats(self):
+        return [endpoint.stats() for endpoint in self.endpoints];
+
+# latency, error and hedge counts for each provider, as seen by this instance
+def v1_rpc_stats():
+    from uniswap.clients import get_rpc_pool
+
+    return jsonify(providers=get_rpc_pool().stats());
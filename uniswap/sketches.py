@@ -0,0 +1,278 @@
+import json
+import zlib
+import base64
+import hashlib
+
+import numpy as np
+
+# Fixed size, mergeable summaries of a stream of trades, kept per exchange per day by uniswap/daily_sketches.py.
+#
+# Each sketch serializes to a small json document (to_json / from_json) so it can be stored compressed on a
+# datastore entity, and merges with another sketch of the same kind to summarize both streams.
+
+def encode_sketch(sketch):
+    return zlib.compress(json.dumps(sketch.to_json(), separators=(",", ":")).encode("utf-8"));
+
+def decode_sketch(sketch_class, data):
+    return sketch_class.from_json(json.loads(zlib.decompress(data).decode("utf-8")));
+
+# Space-Saving heavy hitters (Metwally et al.) over weighted items: the capacity items with the largest total
+# weight, each with an upper bound on its total (count) and how much of that may be overestimated (error), so
+# count - error <= true total <= count. Any item that isn't tracked has a true total of at most min_count().
+class SpaceSaving:
+    DEFAULT_CAPACITY = 200
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity;
+
+        # item -> [count, error]
+        self.counters = {};
+
+    def min_count(self):
+        if (len(self.counters) < self.capacity):
+            return 0;
+
+        return min([counter[0] for counter in self.counters.values()]);
+
+    def update(self, item, weight):
+        counter = self.counters.get(item);
+
+        if (counter is not None):
+            counter[0] += weight;
+            return;
+
+        if (len(self.counters) < self.capacity):
+            self.counters[item] = [weight, 0];
+            return;
+
+        # replace the smallest counter, the new item may have had up to its count already
+        smallest = min(self.counters.keys(), key=lambda key: self.counters[key][0]);
+        smallest_count = self.counters.pop(smallest)[0];
+
+        self.counters[item] = [smallest_count + weight, smallest_count];
+
+    # mergeable summaries (Agarwal et al.): an item missing from a full sketch may have had up to that sketch's
+    # min_count there, so that's added to its count and error before keeping the capacity largest
+    def merge(self, other):
+        own_min = self.min_count();
+        other_min = other.min_count();
+
+        merged = {};
+
+        for item in set(self.counters.keys()) | set(other.counters.keys()):
+            own = self.counters.get(item, [own_min, own_min]);
+            theirs = other.counters.get(item, [other_min, other_min]);
+
+            merged[item] = [own[0] + theirs[0], own[1] + theirs[1]];
+
+        largest = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity];
+
+        self.counters = dict(largest);
+
+        return self;
+
+    # [(item, count, error)] of the k largest, largest first
+    def top(self, k):
+        largest = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)[:k];
+
+        return [(item, counter[0], counter[1]) for item, counter in largest];
+
+    def to_json(self):
+        # counts are wei, kept as strings so they survive any json reader
+        return {"capacity" : self.capacity, "counters" : dict([(item, [str(counter[0]), str(counter[1])]) for item, counter in self.counters.items()])};
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data["capacity"]);
+        sketch.counters = dict([(item, [int(counter[0]), int(counter[1])]) for item, counter in data["counters"].items()]);
+
+        return sketch;
+
+# HyperLogLog distinct counter (Flajolet et al.) with 2 ** precision one byte registers, so 4KB at the default
+# precision with a standard error of about 1.04 / sqrt(2 ** precision), 1.6%. Merging keeps the larger of each
+# register, which is exactly the sketch of both streams combined.
+class HyperLogLog:
+    DEFAULT_PRECISION = 12
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision;
+
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8);
+
+    def add(self, item):
+        hashed = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big");
+
+        # the first precision bits pick the register, the position of the first 1 bit in the rest is its rank
+        register = hashed >> (64 - self.precision);
+        rest = hashed & ((1 << (64 - self.precision)) - 1);
+
+        rank = (64 - self.precision) - rest.bit_length() + 1;
+
+        if (rank > self.registers[register]):
+            self.registers[register] = rank;
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers);
+
+        return self;
+
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers));
+
+    def count(self):
+        m = len(self.registers);
+
+        alpha = 0.7213 / (1 + 1.079 / m);
+
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)));
+
+        # linear counting while many registers are still empty. no large range correction, the hash is 64 bits
+        zeros = int(np.count_nonzero(self.registers == 0));
+
+        if ((estimate <= 2.5 * m) and (zeros > 0)):
+            estimate = m * np.log(m / zeros);
+
+        return int(round(estimate));
+
+    def to_json(self):
+        return {"precision" : self.precision, "registers" : base64.b64encode(self.registers.tobytes()).decode("ascii")};
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data["precision"]);
+        sketch.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy();
+
+        return sketch;
+
+# Merging t-digest (Dunning) of a stream of numbers: at most about compression centroids (mean, weight), small
+# ones near the tails where the k1 scale function keeps them tight and bigger ones in the middle, so extreme
+# quantiles stay accurate. Merging re-clusters both sets of centroids together.
+class TDigest:
+    DEFAULT_COMPRESSION = 100
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression;
+
+        self.means = np.zeros(0, dtype=np.float64);
+        self.weights = np.zeros(0, dtype=np.float64);
+
+        # values added since the last compress
+        self.buffer = [];
+
+        self.min = None;
+        self.max = None;
+
+    def add(self, value, weight=1):
+        value = float(value);
+
+        self.buffer.append((value, weight));
+
+        self.min = value if (self.min is None) else min(self.min, value);
+        self.max = value if (self.max is None) else max(self.max, value);
+
+        if (len(self.buffer) >= 5 * self.compression):
+            self.compress();
+
+    def total_weight(self):
+        return float(np.sum(self.weights)) + sum([weight for value, weight in self.buffer]);
+
+    # k1 scale function and its inverse, a centroid may span at most 1 unit of k
+    def scale(self, q):
+        return (self.compression / (2 * np.pi)) * np.arcsin(2 * q - 1);
+
+    def inverse_scale(self, k):
+        return (np.sin(k * 2 * np.pi / self.compression) + 1) / 2;
+
+    def compress(self):
+        if (len(self.buffer) > 0):
+            buffered = np.array(self.buffer, dtype=np.float64);
+
+            means = np.concatenate([self.means, buffered[:, 0]]);
+            weights = np.concatenate([self.weights, buffered[:, 1]]);
+
+            self.buffer = [];
+        else:
+            means = self.means;
+            weights = self.weights;
+
+        if (len(means) == 0):
+            return;
+
+        order = np.argsort(means, kind="mergesort");
+        means = means[order];
+        weights = weights[order];
+
+        total = np.sum(weights);
+
+        merged_means = [means[0]];
+        merged_weights = [weights[0]];
+
+        # cumulative weight before the current centroid, and the most it can grow to
+        weight_before = 0.0;
+        weight_limit = total * self.inverse_scale(self.scale(0.0) + 1);
+
+        for i in range(1, len(means)):
+            if (weight_before + merged_weights[-1] + weights[i] <= weight_limit):
+                merged_weights[-1] += weights[i];
+                merged_means[-1] += (means[i] - merged_means[-1]) * weights[i] / merged_weights[-1];
+            else:
+                weight_before += merged_weights[-1];
+                weight_limit = total * self.inverse_scale(self.scale(weight_before / total) + 1);
+
+                merged_means.append(means[i]);
+                merged_weights.append(weights[i]);
+
+        self.means = np.array(merged_means, dtype=np.float64);
+        self.weights = np.array(merged_weights, dtype=np.float64);
+
+    def merge(self, other):
+        other.compress();
+
+        self.buffer += list(zip(other.means.tolist(), other.weights.tolist()));
+
+        if (other.min is not None):
+            self.min = other.min if (self.min is None) else min(self.min, other.min);
+            self.max = other.max if (self.max is None) else max(self.max, other.max);
+
+        self.compress();
+
+        return self;
+
+    # the estimated value at each quantile (0 to 1) in qs, interpolating between centroid centers and out to the
+    # exact min and max at the ends. None when nothing's been added
+    def quantiles(self, qs):
+        self.compress();
+
+        if (len(self.means) == 0):
+            return [None for q in qs];
+
+        total = np.sum(self.weights);
+
+        # cumulative weight at the center of each centroid, with the min and max as the outer points
+        centers = np.cumsum(self.weights) - (self.weights / 2);
+
+        positions = np.concatenate([[0.0], centers, [total]]);
+        values = np.concatenate([[self.min], self.means, [self.max]]);
+
+        return np.interp(np.clip(np.asarray(qs, dtype=np.float64), 0, 1) * total, positions, values).tolist();
+
+    def to_json(self):
+        self.compress();
+
+        return {
+            "compression" : self.compression,
+            "means" : self.means.tolist(),
+            "weights" : self.weights.tolist(),
+            "min" : self.min,
+            "max" : self.max
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data["compression"]);
+        sketch.means = np.array(data["means"], dtype=np.float64);
+        sketch.weights = np.array(data["weights"], dtype=np.float64);
+        sketch.min = data["min"];
+        sketch.max = data["max"];
+
+        return sketch;
@@ -5,12 +5,14 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import bigquery
-from google.cloud import datastore
+from uniswap.clients import get_datastore_client
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
 
+from uniswap.daily_sketches import unique_traders
+from uniswap.daily_sketches import days_between
+
 from eth_utils import (
     add_0x_prefix,
     apply_to_return_value,
@@ -31,16 +33,22 @@ def v1_stats():
 	if (order_by is None):
 		return jsonify(error='missing parameter: orderBy'), 400
 
-	query = datastore.Client().query(kind='exchange');
+	query = get_datastore_client().query(kind='exchange');
 
 	exchanges = [];
 
 	query_iterator = query.fetch();
-	
-	for entity in query_iterator:
-		if (entity == None):
-			continue;
 
+	entities = [entity for entity in query_iterator if (entity != None)];
+
+	# distinct traders over the utc days the last 24h touch, from the daily sketches
+	end_time = int(time.time());
+
+	trader_days = days_between(end_time - (24 * 60 * 60), end_time);
+
+	traders = unique_traders(get_datastore_client(), [entity["address"] for entity in entities], trader_days);
+
+	for entity in entities:
 		eth_liquidity = int(entity["cur_eth_total"]);
 		erc20_liquidity = int(entity["cur_tokens_total"]);
 
@@ -52,6 +60,12 @@ def v1_stats():
 			"tokenDecimals" : entity["token_decimals"],
 			"ethLiquidity" : str(eth_liquidity),
 			"erc20Liquidity" : str(erc20_liquidity),
+			# 24h eth trade volume, kept on the exchange by the crawler (see uniswap/market_stats.py)
+			"tradeVolume" : entity.get("stats_volume_24h", "0"),
+			# over whole utc days (up to 48h), unlike the 24h tradeVolume
+			"uniqueTraders" : traders[entity["address"]],
+			"uniqueTradersStartDay" : trader_days[0],
+			"uniqueTradersEndDay" : trader_days[-1],
 		}
 
 		if ("theme" in entity):
@@ -59,7 +73,10 @@ def v1_stats():
 
 		exchanges.append(exchange);
 
-	exchanges.sort(key=sort_by_liquidity);
+	if (order_by == "volume"):
+		exchanges.sort(key=sort_by_volume);
+	else:
+		exchanges.sort(key=sort_by_liquidity);
 
 	return json.dumps(exchanges);
 
@@ -67,3 +84,8 @@ def sort_by_liquidity(exchange):
 	eth_liquidity = int(exchange["ethLiquidity"]);
 
 	return -eth_liquidity;
+
+def sort_by_volume(exchange):
+	trade_volume = int(exchange["tradeVolume"]);
+
+	return -trade_volume;
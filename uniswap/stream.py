@@ -0,0 +1,72 @@
+import json
+import queue
+
+from flask import request, jsonify, Response, stream_with_context
+
+from uniswap.trade_broker import get_trade_broker
+
+from eth_utils import to_checksum_address
+
+# Server-sent events stream of newly crawled trades, fed by uniswap/trade_broker.py.
+#
+# App Engine standard buffers whole responses, so this endpoint is served by the flexible environment "stream"
+# service (stream.yaml, routed by dispatch.yaml), which streams responses as they're written. Its instances
+# don't crawl, they hear about trades over the redis channel at STREAM_REDIS_URL, which both services need set.
+#
+# Each open stream holds one of the instance's gunicorn threads, so at most STREAM_MAX_SUBSCRIBERS are served
+# per instance and the rest get a 503, leaving the other threads free. Delivery is best-effort: clients that need
+# every trade should use the stream as a hint and page /api/v1/history for what they missed.
+
+# how long a client turned away should wait before trying again (likely on another instance)
+STREAM_RETRY_AFTER_SECONDS = 30
+
+STREAM_HEARTBEAT_SECONDS = 15
+
+def format_event(event_name, data):
+    return "event: " + event_name + "\ndata: " + json.dumps(data) + "\n\n";
+
+# stream new trades for an exchange as server-sent events
+def v1_stream():
+    exchange_address = request.args.get("exchangeAddress");
+
+    if (exchange_address is None):
+        return jsonify(error='missing parameter: exchangeAddress'), 400
+
+    try:
+        exchange_address = to_checksum_address(exchange_address);
+    except Exception:
+        return jsonify(error='invalid exchange address'), 400
+
+    broker = get_trade_broker();
+
+    subscription = broker.subscribe(exchange_address);
+
+    if (subscription is None):
+        response = jsonify(error='too many streams on this instance, try again later');
+        response.headers["Retry-After"] = str(STREAM_RETRY_AFTER_SECONDS);
+
+        return response, 503
+
+    def generate():
+        try:
+            while (True):
+                if (subscription.dropped):
+                    yield format_event("dropped", {"reason" : "subscriber fell too far behind"});
+                    return;
+
+                try:
+                    message = subscription.queue.get(timeout=STREAM_HEARTBEAT_SECONDS);
+                except queue.Empty:
+                    # comment line to keep proxies from closing an idle connection
+                    yield ": heartbeat\n\n";
+                    continue;
+
+                yield format_event("trade", message);
+        finally:
+            broker.unsubscribe(subscription);
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream");
+    response.headers["Cache-Control"] = "no-cache";
+    response.headers["X-Accel-Buffering"] = "no";
+
+    return response;
@@ -6,8 +6,24 @@ import sys
 
 from flask import request, jsonify
 
-from google.cloud import bigquery
-from google.cloud import datastore
+from uniswap.history_table import history_table_name
+from uniswap.history_table import history_filter
+from uniswap.history_table import timestamp_column
+from uniswap.history_table import amount_column
+from uniswap.history_table import normalized_select
+from uniswap.history_table import normalized_group_by
+
+from uniswap.config import TICKER_AGGREGATION
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.query_cache import run_query
+from uniswap.query_cache import snap_end_time
+
+from uniswap.write_buffer import get_write_buffer
+
+from uniswap.daily_sketches import unique_traders
+from uniswap.daily_sketches import days_between
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -25,15 +41,186 @@ from eth_utils import (
     to_wei,
 )
 
-# TODO refactor this into a single location
-PROJECT_ID = "uniswap-analytics"
-
-EXCHANGES_DATASET_ID = "exchanges_v1"
-
 TICKER_NUM_HOURS = 24
 
 CACHE_DURATION_SECONDS = 60 * 10 # 10 minutes for ticker cache
 
+# the ticker stats for an exchange between start_time and end_time, as stored in the ticker cache. computed in one
+# aggregate query unless TICKER_AGGREGATION is "python" or that query fails, then from every row in python
+def compute_ticker_stats(exchange_address, start_time, end_time):
+	if (TICKER_AGGREGATION == "sql"):
+		try:
+			rows = run_query(ticker_aggregate_sql(exchange_address, start_time, end_time), exchange_address=exchange_address, range_end=end_time);
+
+			return ticker_stats_from_aggregate(rows[0]);
+		except Exception as e:
+			print("ticker aggregate query failed, aggregating rows instead: " + str(e));
+
+	rows = run_query(ticker_rows_sql(exchange_address, start_time, end_time), exchange_address=exchange_address, range_end=end_time);
+
+	return aggregate_ticker_rows(rows);
+
+# every (distinct) row in the window, oldest first
+def ticker_rows_sql(exchange_address, start_time, end_time):
+	return """
+	         SELECT 
+	         		tx_hash, CAST(tx_order as INT64) as tx_order,
+	        		CAST(event as STRING) as event, """ + timestamp_column() + """ as timestamp,
+	        		CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens,
+	        		CAST(cur_eth_total as STRING) as eth_liquidity, CAST(cur_tokens_total as STRING) as tokens_liquidity,
+	        		""" + ", ".join(normalized_select(exchange_address, ["eth_norm"])) + """
+	         FROM """ + history_table_name(exchange_address) + """
+	          WHERE """ + history_filter(exchange_address, start_time, end_time) + """ group by """ + ", ".join(["event", "timestamp", "eth", "tokens", "cur_eth_total", "cur_tokens_total", "tx_hash", "tx_order"] + normalized_group_by(exchange_address, ["eth_norm"])) + """ order by tx_order asc, tx_hash asc"""
+
+def aggregate_ticker_rows(exchange_results):
+	start_exchange_rate = -1;
+	end_exchange_rate = -1;
+	
+	highest_price = -1;
+	lowest_price = sys.maxsize;
+
+	num_transactions = 0;
+
+	eth_trade_volume = 0;
+
+	# trade volume in whole eth
+	eth_trade_volume_norm = 0;
+	
+	last_trade_price = 0;
+	last_trade_eth_qty = 0;
+	last_trade_erc20_qty = 0;
+
+	weighted_avg_price_total = 0;
+
+	# iterate through the results from oldest to newest (tx_order asc)
+	for row in exchange_results:
+		row_event = row.get("event");
+		row_eth = int(row.get("eth"));
+		row_eth_liquidity = int(row.get("eth_liquidity"));
+
+		row_tokens = int(row.get("tokens"));
+		row_tokens_liquidity = int(row.get("tokens_liquidity"));
+
+		# the exchange rate after this transaction was executed
+		exchange_rate_after_transaction = calculate_marginal_rate(row_eth_liquidity, row_tokens_liquidity);
+		# the exchange rate before this transaction was executed
+		exchange_rate_before_transaction = calculate_marginal_rate(row_eth_liquidity - row_eth, row_tokens_liquidity - row_tokens);	
+
+		# track highest price
+		if (exchange_rate_after_transaction > highest_price):
+			highest_price = exchange_rate_after_transaction;
+
+		# track lowest price
+		if (exchange_rate_after_transaction < lowest_price):
+			lowest_price = exchange_rate_after_transaction;
+
+		# if we haven't set a start price yet, take the exchange rate before this transaction
+		if (start_exchange_rate < 0):
+			start_exchange_rate = exchange_rate_before_transaction
+
+		# override the end_price with each transaction to get the latest
+		end_exchange_rate = exchange_rate_after_transaction;
+
+		num_transactions += 1;
+
+		if (row_event == "EthPurchase" or row_event == "TokenPurchase"):
+			eth_trade_volume += abs(row_eth);
+			eth_trade_volume_norm += abs(row.get("eth_norm") or 0);
+
+			last_trade_price = exchange_rate_before_transaction;
+
+			last_trade_eth_qty = row_eth;
+			last_trade_erc20_qty = row_tokens;
+
+			# for calculating average weighted price, take the amount of eth times the rate that they traded at
+			weighted_avg_price_total += (abs(row_eth) * exchange_rate_before_transaction);
+
+	# calculate average weighted price
+	if (eth_trade_volume != 0):
+		weighted_avg_price_total = weighted_avg_price_total / eth_trade_volume;
+
+	return {
+		"end_exchange_rate" : end_exchange_rate,
+		"start_exchange_rate" : start_exchange_rate,
+
+		"eth_trade_volume" : str(eth_trade_volume),
+		"eth_trade_volume_norm" : eth_trade_volume_norm,
+		"weighted_avg_price_total" : weighted_avg_price_total,
+
+		"highest_price" : highest_price,
+		"lowest_price" : lowest_price,
+
+		"last_trade_price" : last_trade_price,
+		"last_trade_eth_qty" : str(last_trade_eth_qty),
+		"last_trade_erc20_qty" : str(last_trade_erc20_qty),
+
+		"num_transactions" : num_transactions
+	}
+
+# the same stats as aggregate_ticker_rows in a single result row: first / last rates and the last trade come from
+# ARRAY_AGG ... ORDER BY tx_order LIMIT 1, everything else from MAX / MIN / SUM / COUNT
+def ticker_aggregate_sql(exchange_address, start_time, end_time):
+	rate_after = "IFNULL(SAFE_DIVIDE(CAST(tokens_liquidity as FLOAT64), CAST(eth_liquidity as FLOAT64)), 0)";
+	rate_before = "IFNULL(SAFE_DIVIDE(CAST(tokens_liquidity - tokens as FLOAT64), CAST(eth_liquidity - eth as FLOAT64)), 0)";
+
+	return """
+		WITH distinct_rows AS (
+			SELECT DISTINCT
+				CAST(event as STRING) as event, tx_hash, CAST(tx_order as INT64) as tx_order,
+				""" + amount_column("eth") + """ as eth, """ + amount_column("tokens") + """ as tokens,
+				""" + amount_column("cur_eth_total") + """ as eth_liquidity, """ + amount_column("cur_tokens_total") + """ as tokens_liquidity,
+				""" + ", ".join(normalized_select(exchange_address, ["eth_norm"])) + """
+			FROM """ + history_table_name(exchange_address) + """
+			WHERE """ + history_filter(exchange_address, start_time, end_time) + """
+		),
+		rated_rows AS (
+			SELECT *,
+				""" + rate_after + """ as rate_after,
+				""" + rate_before + """ as rate_before,
+				(event = 'EthPurchase' or event = 'TokenPurchase') as is_trade
+			FROM distinct_rows
+		)
+		SELECT
+			COUNT(*) as num_transactions,
+			MAX(rate_after) as highest_price,
+			MIN(rate_after) as lowest_price,
+			ARRAY_AGG(rate_before ORDER BY tx_order asc LIMIT 1)[SAFE_OFFSET(0)] as start_exchange_rate,
+			ARRAY_AGG(rate_after ORDER BY tx_order desc LIMIT 1)[SAFE_OFFSET(0)] as end_exchange_rate,
+			CAST(IFNULL(SUM(IF(is_trade, ABS(eth), 0)), 0) as STRING) as eth_trade_volume,
+			IFNULL(SUM(IF(is_trade, ABS(eth_norm), 0)), 0) as eth_trade_volume_norm,
+			IFNULL(SUM(IF(is_trade, CAST(ABS(eth) as FLOAT64) * rate_before, 0)), 0) as weighted_price_total,
+			ARRAY_AGG(IF(is_trade, STRUCT(rate_before as price, CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens), NULL) IGNORE NULLS ORDER BY tx_order desc LIMIT 1)[SAFE_OFFSET(0)] as last_trade
+		FROM rated_rows""";
+
+# the aggregate query's row in the shape aggregate_ticker_rows returns, including its defaults for an empty window
+def ticker_stats_from_aggregate(row):
+	eth_trade_volume = int(row["eth_trade_volume"]);
+
+	weighted_avg_price_total = row["weighted_price_total"];
+
+	if (eth_trade_volume != 0):
+		weighted_avg_price_total = weighted_avg_price_total / eth_trade_volume;
+
+	last_trade = row["last_trade"] or {"price" : 0, "eth" : "0", "tokens" : "0"};
+
+	return {
+		"end_exchange_rate" : -1 if (row["end_exchange_rate"] is None) else row["end_exchange_rate"],
+		"start_exchange_rate" : -1 if (row["start_exchange_rate"] is None) else row["start_exchange_rate"],
+
+		"eth_trade_volume" : str(eth_trade_volume),
+		"eth_trade_volume_norm" : row["eth_trade_volume_norm"],
+		"weighted_avg_price_total" : weighted_avg_price_total,
+
+		"highest_price" : -1 if (row["highest_price"] is None) else row["highest_price"],
+		"lowest_price" : sys.maxsize if (row["lowest_price"] is None) else row["lowest_price"],
+
+		"last_trade_price" : last_trade["price"],
+		"last_trade_eth_qty" : str(int(last_trade["eth"])),
+		"last_trade_erc20_qty" : str(int(last_trade["tokens"])),
+
+		"num_transactions" : row["num_transactions"]
+	}
+
 # return summary data for an exchange for past TICKER_NUM_HOURS hours
 def v1_ticker():
 	exchange_address = request.args.get("exchangeAddress");
@@ -42,9 +229,10 @@ def v1_ticker():
 		return jsonify(error='missing parameter: exchangeAddress'), 400
 
 	# use current time as end time
-	end_time = int(time.time());
+	now = int(time.time());
+	end_time = now;
 
-	ds_client = datastore.Client();
+	ds_client = get_datastore_client();
 
 	# load the datastore cache
 	exchange_cache = load_exchange_cache(ds_client, exchange_address);
@@ -53,7 +241,7 @@ def v1_ticker():
 
 	# check how old the cache is
 	if ((exchange_cache is None) == False):
-		elapsed = end_time - exchange_cache["last_updated"];
+		elapsed = now - exchange_cache["last_updated"];
 
 		# use the cache
 		if (elapsed <= CACHE_DURATION_SECONDS):
@@ -69,144 +257,68 @@ def v1_ticker():
 	eth_liquidity = int(exchange_info["cur_eth_total"]);
 	erc20_liquidity = int(exchange_info["cur_tokens_total"]);
 	
-	# grab these values from the cache if we should
-	if (use_cache):
-		end_time = exchange_cache["end_time"];
-
-		start_time = exchange_cache["start_time"];
-
-		end_exchange_rate = exchange_cache["end_exchange_rate"];
-
-		start_exchange_rate = exchange_cache["start_exchange_rate"];
-
-		eth_trade_volume = exchange_cache["eth_trade_volume"];
-
-		weighted_avg_price_total = exchange_cache["weighted_avg_price_total"];
-
-		highest_price = exchange_cache["highest_price"];
-		lowest_price = exchange_cache["lowest_price"];
-
-		last_trade_price = exchange_cache["last_trade_price"];
-
-		last_trade_eth_qty = exchange_cache["last_trade_eth_qty"];
-		last_trade_erc20_qty = exchange_cache["last_trade_erc20_qty"];
-
-		num_transactions = exchange_cache["num_transactions"];
-	else:
-		# floor to last 15 minute mark. this ensures that all SQL queries in 15 minute windows are the same and use cached BigQuery results
-		# end_time = math.floor(end_time / 900) * 900;
+	if (use_cache == False):
+		# run to the next cache bucket mark (15 minutes by default). this ensures that all SQL queries in the same window are the same and use cached results
+		end_time = snap_end_time(end_time);
 		
 		# pull logs from TICKER_NUM_HOURS hours ago
 		start_time = end_time - (60 * 60 * TICKER_NUM_HOURS);
 
-		# pull the transactions from this exchange
-		bq_client = bigquery.Client()
-
-		exchange_table_id = "exchange_history_" + to_checksum_address(exchange_address);
-	 
-		exchange_table_name = "`" + PROJECT_ID + "." + EXCHANGES_DATASET_ID + "." + exchange_table_id + "`"
-
-		bq_query_sql = """
-	         SELECT 
-	         		tx_hash,
-	        		CAST(event as STRING) as event, CAST(timestamp as INT64) as timestamp,
-	        		CAST(eth as STRING) as eth, CAST(tokens as STRING) as tokens,
-	        		CAST(cur_eth_total as STRING) as eth_liquidity, CAST(cur_tokens_total as STRING) as tokens_liquidity
-	         FROM """ + exchange_table_name + """
-	          WHERE (timestamp >= """ + str(start_time) + """ and timestamp <= """ + str(end_time) + """)""" + """ group by event, timestamp, eth, tokens, cur_eth_total, cur_tokens_total, tx_hash """ + """ order by timestamp desc, tx_hash asc"""
+		ticker_stats = compute_ticker_stats(to_checksum_address(exchange_address), start_time, end_time);
 
-		print(bq_query_sql)
+		if (exchange_cache is None):
+			from google.cloud import datastore
 
-		# query all the blocks and their associated timestamps
-		exchange_query = bq_client.query(bq_query_sql)
+			exchange_cache = datastore.Entity(key=ds_client.key('cache', to_checksum_address(exchange_address)));
+			exchange_cache["address"] = to_checksum_address(exchange_address);
 
-		exchange_results = exchange_query.result();
-
-		start_exchange_rate = -1;
-		end_exchange_rate = -1;
-		
-		highest_price = -1;
-		lowest_price = sys.maxsize;
-
-		num_transactions = 0;
-
-		eth_trade_volume = 0;
-		
-		last_trade_price = 0;
-		last_trade_eth_qty = 0;
-		last_trade_erc20_qty = 0;
-
-		weighted_avg_price_total = 0;
-
-		# iterate through the results from oldest to newest (timestamp asc)
-		for row in exchange_results:
-			row_event = row.get("event");
-			row_eth = int(row.get("eth"));
-			row_eth_liquidity = int(row.get("eth_liquidity"));
-
-			row_tokens = int(row.get("tokens"));
-			row_tokens_liquidity = int(row.get("tokens_liquidity"));
-
-			# the exchange rate after this transaction was executed
-			exchange_rate_after_transaction = calculate_marginal_rate(row_eth_liquidity, row_tokens_liquidity);
-			# the exchange rate before this transaction was executed
-			exchange_rate_before_transaction = calculate_marginal_rate(row_eth_liquidity - row_eth, row_tokens_liquidity - row_tokens);	
-
-			# track highest price
-			if (exchange_rate_after_transaction > highest_price):
-				highest_price = exchange_rate_after_transaction;
-
-			# track lowest price
-			if (exchange_rate_after_transaction < lowest_price):
-				lowest_price = exchange_rate_after_transaction;
+		# update the cache
+		exchange_cache.update(ticker_stats);
 
-			# if we haven't set a start price yet, take the exchange rate before this transaction
-			if (start_exchange_rate < 0):
-				start_exchange_rate = exchange_rate_before_transaction
+		# from the daily sketches, so over the whole utc days the window touches
+		trader_days = days_between(start_time, end_time);
 
-			# override the end_price with each transaction to get the latest
-			end_exchange_rate = exchange_rate_after_transaction;
+		exchange_cache["unique_traders"] = unique_traders(ds_client, [to_checksum_address(exchange_address)], trader_days)[to_checksum_address(exchange_address)];
+		exchange_cache["unique_traders_start_day"] = trader_days[0];
+		exchange_cache["unique_traders_end_day"] = trader_days[-1];
 
-			num_transactions += 1;
+		exchange_cache["end_time"] = end_time;
+		exchange_cache["start_time"] = start_time;
 
-			if (row_event == "EthPurchase" or row_event == "TokenPurchase"):
-				eth_trade_volume += abs(row_eth);
+		# when we computed it, not the snapped end_time, or the cache would look up to a bucket older than it is
+		exchange_cache["last_updated"] = now;
 
-				last_trade_price = exchange_rate_before_transaction;
+		# written behind the response, the next flush persists it
+		get_write_buffer().put(exchange_cache);
 
-				last_trade_eth_qty = row_eth;
-				last_trade_erc20_qty = row_tokens;
+	# grab these values from the cache
+	end_time = exchange_cache["end_time"];
 
-				# for calculating average weighted price, take the amount of eth times the rate that they traded at
-				weighted_avg_price_total += (abs(row_eth) * exchange_rate_before_transaction);
+	start_time = exchange_cache["start_time"];
 
-		# calculate average weighted price
-		if (eth_trade_volume != 0):
-			weighted_avg_price_total = weighted_avg_price_total / eth_trade_volume;
+	end_exchange_rate = exchange_cache["end_exchange_rate"];
 
-		# update the cache
-		exchange_cache["end_time"] = end_time;
-		exchange_cache["start_time"] = start_time;
+	start_exchange_rate = exchange_cache["start_exchange_rate"];
 
-		exchange_cache["end_exchange_rate"] = end_exchange_rate;
-		exchange_cache["start_exchange_rate"] = start_exchange_rate;
+	eth_trade_volume = exchange_cache["eth_trade_volume"];
 
-		exchange_cache["eth_trade_volume"] = str(eth_trade_volume);
-		exchange_cache["weighted_avg_price_total"] = weighted_avg_price_total;
+	weighted_avg_price_total = exchange_cache["weighted_avg_price_total"];
 
-		exchange_cache["highest_price"] = highest_price;
-		exchange_cache["lowest_price"] = lowest_price;
+	highest_price = exchange_cache["highest_price"];
+	lowest_price = exchange_cache["lowest_price"];
 
-		exchange_cache["last_trade_price"] = last_trade_price;
+	last_trade_price = exchange_cache["last_trade_price"];
 
-		exchange_cache["last_updated"] = end_time;
+	last_trade_eth_qty = exchange_cache["last_trade_eth_qty"];
+	last_trade_erc20_qty = exchange_cache["last_trade_erc20_qty"];
 
-		exchange_cache["last_trade_eth_qty"] = str(last_trade_eth_qty);
-		exchange_cache["last_trade_erc20_qty"] = str(last_trade_erc20_qty);
+	num_transactions = exchange_cache["num_transactions"];
 
-		exchange_cache["num_transactions"] = num_transactions;
+	eth_trade_volume_norm = exchange_cache.get("eth_trade_volume_norm", 0);
 
-		ds_client.put(exchange_cache)
+	num_unique_traders = exchange_cache.get("unique_traders");
+	unique_traders_start_day = exchange_cache.get("unique_traders_start_day");
+	unique_traders_end_day = exchange_cache.get("unique_traders_end_day");
 
 	price_change = end_exchange_rate - start_exchange_rate;
 	price_change_percent = price_change / start_exchange_rate;
@@ -239,7 +351,16 @@ def v1_ticker():
 		"lastTradeErc20Qty" : str(last_trade_erc20_qty),
 
 		"tradeVolume" : str(eth_trade_volume),
-		"count" : num_transactions
+		"count" : num_transactions,
+		# over the whole utc days the window touches (up to 48h), unlike tradeVolume and count
+		"uniqueTraders" : num_unique_traders,
+		"uniqueTradersStartDay" : unique_traders_start_day,
+		"uniqueTradersEndDay" : unique_traders_end_day,
+
+		# whole eth / tokens, as normalized by the crawler
+		"ethLiquidityNorm" : exchange_info.get("cur_eth_norm"),
+		"erc20LiquidityNorm" : exchange_info.get("cur_tokens_norm"),
+		"tradeVolumeNorm" : eth_trade_volume_norm
 	}
 
 	if ("theme" in exchange_info):
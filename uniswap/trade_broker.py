@@ -0,0 +1,195 @@
+import json
+import time
+import queue
+import threading
+
+from uniswap.config import STREAM_REDIS_URL
+
+from uniswap.clients import get_client
+
+from uniswap.utils import calculate_marginal_rate
+
+# Fan out of newly crawled trades to the /api/v1/stream subscribers (see uniswap/stream.py).
+#
+# The crawler publishes every row it commits. With STREAM_REDIS_URL set, trades go out on a redis pub/sub
+# channel per exchange and every instance serving streams listens to all of them (one listener thread per
+# instance, started with its first subscriber), so a subscriber sees every trade whichever instance crawled it.
+# Without it, trades only reach subscribers on the instance whose crawler committed them.
+#
+# Each subscriber has a bounded queue; a subscriber that falls STREAM_QUEUE_SIZE messages behind is dropped (told
+# so, then disconnected) rather than holding up delivery or growing without bound. Delivery is best-effort either
+# way: redis pub/sub doesn't keep messages for listeners that are reconnecting, and nothing is replayed after a
+# client reconnects.
+
+STREAM_QUEUE_SIZE = 256
+
+STREAM_MAX_SUBSCRIBERS = 16
+
+# redis channel for an exchange's trades is this plus its address
+STREAM_CHANNEL_PREFIX = "trades:"
+
+# how long the listener waits before resubscribing after losing its redis connection
+STREAM_LISTEN_RETRY_SECONDS = 1
+
+class Subscription:
+    def __init__(self, topic, max_queued):
+        self.topic = topic;
+        self.queue = queue.Queue(maxsize=max_queued);
+        self.dropped = False;
+
+# redis pub/sub channels shared by every instance
+class RedisTradeChannel:
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url);
+
+    def publish(self, topic, messages):
+        pipeline = self.redis.pipeline(transaction=False);
+
+        for message in messages:
+            pipeline.publish(STREAM_CHANNEL_PREFIX + topic, json.dumps(message));
+
+        pipeline.execute();
+
+    # blocks, passing every message published on any channel to deliver(topic, message)
+    def listen(self, deliver):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True);
+        pubsub.psubscribe(STREAM_CHANNEL_PREFIX + "*");
+
+        try:
+            for item in pubsub.listen():
+                if (item["type"] != "pmessage"):
+                    continue;
+
+                deliver(item["channel"].decode("utf-8")[len(STREAM_CHANNEL_PREFIX):], json.loads(item["data"].decode("utf-8")));
+        finally:
+            pubsub.close();
+
+class TradeBroker:
+    def __init__(self, max_queued=STREAM_QUEUE_SIZE, max_subscribers=STREAM_MAX_SUBSCRIBERS, channel=None):
+        self.max_queued = max_queued;
+        self.max_subscribers = max_subscribers;
+        self.channel = channel;
+
+        # topic (exchange address) -> set of subscriptions
+        self.subscriptions = {};
+
+        self.lock = threading.Lock();
+
+        self.thread = None;
+
+    # a new subscription, or None if the instance already has max_subscribers
+    def subscribe(self, topic):
+        subscription = Subscription(topic, self.max_queued);
+
+        with self.lock:
+            if (sum([len(subscriptions) for subscriptions in self.subscriptions.values()]) >= self.max_subscribers):
+                return None;
+
+            self.subscriptions.setdefault(topic, set()).add(subscription);
+
+            if ((self.channel is not None) and (self.thread is None)):
+                self.thread = threading.Thread(target=self.run, name="trade-listener", daemon=True);
+                self.thread.start();
+
+        return subscription;
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.topic);
+
+            if (subscriptions is not None):
+                subscriptions.discard(subscription);
+
+                if (len(subscriptions) == 0):
+                    del self.subscriptions[subscription.topic];
+
+    # sends messages to every subscriber of topic, on every instance when there's a shared channel
+    def publish(self, topic, messages):
+        if (self.channel is not None):
+            self.channel.publish(topic, messages);
+            return;
+
+        for message in messages:
+            self.deliver(topic, message);
+
+    # hands a message to this instance's subscribers. never blocks, slow subscribers are dropped instead
+    def deliver(self, topic, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(topic, []));
+
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message);
+            except queue.Full:
+                print("dropping slow stream subscriber for " + topic);
+
+                subscription.dropped = True;
+
+                self.unsubscribe(subscription);
+
+    def subscriber_count(self, topic):
+        with self.lock:
+            return len(self.subscriptions.get(topic, []));
+
+    def run(self):
+        while (True):
+            try:
+                self.channel.listen(self.deliver);
+            except Exception as e:
+                print("trade listener disconnected: " + str(e));
+
+            time.sleep(STREAM_LISTEN_RETRY_SECONDS);
+
+def get_trade_broker():
+    return get_client("trade_broker", _create_trade_broker);
+
+def _create_trade_broker():
+    channel = None;
+
+    if (STREAM_REDIS_URL):
+        channel = RedisTradeChannel(STREAM_REDIS_URL);
+
+    return TradeBroker(channel=channel);
+
+def trade_message(row):
+    return {
+        "event" : row["event"],
+        "user" : row["user"],
+        "timestamp" : row["timestamp"],
+
+        "tx" : row["tx_hash"],
+        "block" : row["block"],
+        "transaction_index" : row["tx_index"],
+
+        "ethAmount" : row["eth"],
+        "curEthLiquidity" : row["cur_eth_total"],
+
+        "tokenAmount" : row["tokens"],
+        "curTokenLiquidity" : row["cur_tokens_total"],
+
+        # price after this transaction
+        "price" : calculate_marginal_rate(int(row["cur_eth_total"]), int(row["cur_tokens_total"])),
+
+        # the same in whole eth / tokens
+        "ethAmountNorm" : row.get("eth_norm"),
+        "tokenAmountNorm" : row.get("tokens_norm"),
+        "curEthLiquidityNorm" : row.get("cur_eth_norm"),
+        "curTokenLiquidityNorm" : row.get("cur_tokens_norm"),
+        "priceBefore" : row.get("price_before"),
+        "priceAfter" : row.get("price_after")
+    }
+
+# called by the crawler once rows have been committed for an exchange
+def publish_trades(exchange_address, rows):
+    broker = get_trade_broker();
+
+    # only this instance's subscribers can hear us without a shared channel
+    if ((broker.channel is None) and (broker.subscriber_count(exchange_address) == 0)):
+        return;
+
+    if (len(rows) == 0):
+        return;
+
+    broker.publish(exchange_address, [trade_message(row) for row in sorted(rows, key=lambda row: row["tx_order"])]);
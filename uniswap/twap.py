@@ -0,0 +1,80 @@
+import time
+
+from flask import request, jsonify
+
+from uniswap.clients import get_datastore_client
+
+from uniswap.price_index import get_price_index
+
+from uniswap.utils import load_exchange_info
+
+# time weighted average price over [startTime, endTime]
+def v1_twap():
+    exchange_info, index, start_time, end_time, error = load_window();
+
+    if (error is not None):
+        return error;
+
+    result = {
+        "symbol" : exchange_info["symbol"],
+        "startTime" : start_time,
+        "endTime" : end_time,
+        "twap" : index.twap(start_time, end_time)
+    }
+
+    return jsonify(result)
+
+# eth volume weighted average trade price over [startTime, endTime]
+def v1_vwap():
+    exchange_info, index, start_time, end_time, error = load_window();
+
+    if (error is not None):
+        return error;
+
+    vwap, eth_volume = index.vwap(start_time, end_time);
+
+    result = {
+        "symbol" : exchange_info["symbol"],
+        "startTime" : start_time,
+        "endTime" : end_time,
+        "vwap" : vwap,
+        "tradeVolume" : str(eth_volume)
+    }
+
+    return jsonify(result)
+
+# parses exchangeAddress, startTime and endTime (defaults to now) and loads the exchange's price index
+def load_window():
+    exchange_address = request.args.get("exchangeAddress");
+    start_time = request.args.get("startTime");
+    end_time = request.args.get("endTime");
+
+    if ((exchange_address is None) or (start_time is None)):
+        return None, None, None, None, (jsonify(error='exchangeAddress and startTime required'), 400)
+
+    try:
+        start_time = int(start_time);
+
+        if (end_time is None):
+            end_time = int(time.time());
+        else:
+            end_time = int(end_time);
+    except ValueError:
+        return None, None, None, None, (jsonify(error='startTime and endTime must be unix timestamps'), 400)
+
+    if (end_time < start_time):
+        return None, None, None, None, (jsonify(error='endTime must not be before startTime'), 400)
+
+    ds_client = get_datastore_client();
+
+    exchange_info = load_exchange_info(ds_client, exchange_address);
+
+    if (exchange_info == None):
+        return None, None, None, None, (jsonify(error='no exchange found for this address'), 404)
+
+    index = get_price_index(ds_client, exchange_info["address"]);
+
+    if (index is None):
+        return None, None, None, None, (jsonify(error='no price index for this exchange'), 404)
+
+    return exchange_info, index, start_time, end_time, None;
@@ -1,13 +1,14 @@
 import json
 import time
 
-import web3
-
 import sys
 
 from flask import request, jsonify
 
-from google.cloud import datastore
+from uniswap.clients import get_web3
+from uniswap.clients import get_datastore_client
+
+from uniswap.lp_shares import load_lp_balance
 
 from uniswap.utils import calculate_marginal_rate
 from uniswap.utils import load_exchange_info
@@ -24,10 +25,6 @@ from eth_utils import (
     to_wei,
 )
 
-# TODO refactor into shared utils
-PROVIDER_URL = "https://chainkit-1.dev.kyokan.io/eth";
-web3 = web3.Web3(web3.Web3.HTTPProvider(PROVIDER_URL))
-
 # return curret exchange price
 def v1_get_user():
     user_address = request.args.get("userAddress");
@@ -41,12 +38,25 @@ def v1_get_user():
     user_address = to_checksum_address(user_address)
     exchange_address = to_checksum_address(exchange_address)
 
-    # query the exchange contract
-    EXCHANGE_ABI = open("static/exchangeABI.json", "r").read();    
-    exchange_contract = web3.eth.contract(address=exchange_address, abi=EXCHANGE_ABI);
+    exchange_info = load_exchange_info(get_datastore_client(), exchange_address);
+
+    if (exchange_info == None):
+        return jsonify(error='no exchange found for this address'), 404
+
+    # the crawler indexes pool token transfers, so this is only an rpc call for exchanges that haven't been indexed
+    # yet (see uniswap/lp_shares.py)
+    if ("pool_token_supply" in exchange_info):
+        total_pool_tokens = int(exchange_info["pool_token_supply"]);
+        user_pool_tokens = load_lp_balance(get_datastore_client(), exchange_address, user_address);
+    else:
+        web3 = get_web3();
+
+        # query the exchange contract
+        EXCHANGE_ABI = open("static/exchangeABI.json", "r").read();    
+        exchange_contract = web3.eth.contract(address=exchange_address, abi=EXCHANGE_ABI);
 
-    total_pool_tokens = exchange_contract.functions.totalSupply().call();
-    user_pool_tokens = exchange_contract.functions.balanceOf(user_address).call();
+        total_pool_tokens = exchange_contract.functions.totalSupply().call();
+        user_pool_tokens = exchange_contract.functions.balanceOf(user_address).call();
 
     user_percent = 0;
 
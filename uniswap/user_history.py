@@ -0,0 +1,141 @@
+from flask import request, jsonify
+
+from uniswap.clients import get_datastore_client
+
+from eth_utils import is_address
+
+# Per-user trade index: one datastore user_trade entity per history row that has a user, written by the crawler
+# in the same batch it inserts into bigquery.
+#
+# Entities are indexed on (user, tx_order desc) only (see index.yaml), so /api/v1/user/history is an index scan
+# over one user's trades across every exchange, and doesn't get slower as total exchange volume grows. Key names
+# are derived from the row so a retried crawl batch overwrites rather than duplicates.
+
+USER_TRADE_KIND = "user_trade"
+
+USER_HISTORY_DEFAULT_COUNT = 100
+USER_HISTORY_MAX_COUNT = 1000
+
+# datastore's limit on entities per commit
+MAX_ENTITIES_PER_PUT = 500
+
+USER_TRADE_UNINDEXED = ["exchange", "event", "tx_hash", "tx_index", "block", "timestamp", "eth", "tokens", "cur_eth_total", "cur_tokens_total",
+    "eth_norm", "tokens_norm", "cur_eth_norm", "cur_tokens_norm", "price_before", "price_after"]
+
+def user_trade_key_name(exchange_address, row):
+    return ":".join([exchange_address, row["tx_hash"], row["event"], str(row["eth"]), str(row["tokens"])]);
+
+def user_trade_entity(ds_client, exchange_address, row):
+    from google.cloud import datastore
+
+    entity = datastore.Entity(key=ds_client.key(USER_TRADE_KIND, user_trade_key_name(exchange_address, row)), exclude_from_indexes=USER_TRADE_UNINDEXED);
+
+    entity.update({
+        "user" : row["user"].lower(),
+        "tx_order" : int(row["tx_order"]),
+
+        "exchange" : exchange_address,
+        "event" : row["event"],
+        "tx_hash" : row["tx_hash"],
+        "tx_index" : row["tx_index"],
+        "block" : row["block"],
+        "timestamp" : row["timestamp"],
+
+        "eth" : row["eth"],
+        "tokens" : row["tokens"],
+        "cur_eth_total" : row["cur_eth_total"],
+        "cur_tokens_total" : row["cur_tokens_total"],
+
+        "eth_norm" : row.get("eth_norm"),
+        "tokens_norm" : row.get("tokens_norm"),
+        "cur_eth_norm" : row.get("cur_eth_norm"),
+        "cur_tokens_norm" : row.get("cur_tokens_norm"),
+        "price_before" : row.get("price_before"),
+        "price_after" : row.get("price_after")
+    })
+
+    return entity;
+
+# called by the crawler with the rows it's committing for an exchange, before it checkpoints
+def index_user_trades(ds_client, exchange_address, rows):
+    entities = [user_trade_entity(ds_client, exchange_address, row) for row in rows if (row.get("user") is not None)];
+
+    for start in range(0, len(entities), MAX_ENTITIES_PER_PUT):
+        ds_client.put_multi(entities[start:start + MAX_ENTITIES_PER_PUT]);
+
+    return len(entities);
+
+# one user's trades across every exchange, newest first. pass the returned cursor back for the next page
+def v1_user_history():
+    user_address = request.args.get("userAddress");
+
+    if (user_address is None):
+        return jsonify(error='missing parameter: userAddress'), 400
+
+    if (is_address(user_address) == False):
+        return jsonify(error='invalid user address'), 400
+
+    try:
+        count = min(int(request.args.get("count", USER_HISTORY_DEFAULT_COUNT)), USER_HISTORY_MAX_COUNT);
+    except ValueError:
+        return jsonify(error='invalid parameter: count'), 400
+
+    if (count < 1):
+        return jsonify(error='invalid parameter: count'), 400
+
+    # datastore query cursors are already url safe base64
+    cursor = request.args.get("cursor");
+
+    if (cursor is not None):
+        cursor = cursor.encode("ascii");
+
+    ds_client = get_datastore_client();
+
+    # addresses are stored as they appear in the log topics, lowercase
+    query = ds_client.query(kind=USER_TRADE_KIND);
+    query.add_filter("user", "=", user_address.lower());
+    query.order = ["-tx_order"];
+
+    from google.api_core.exceptions import BadRequest
+
+    query_iterator = query.fetch(limit=count, start_cursor=cursor);
+
+    try:
+        page = list(next(query_iterator.pages, []));
+    except BadRequest:
+        return jsonify(error='invalid parameter: cursor'), 400
+
+    history = [];
+
+    for entity in page:
+        history.append({
+            "exchange" : entity["exchange"],
+            "event" : entity["event"],
+            "user" : entity["user"],
+            "timestamp" : entity["timestamp"],
+
+            "tx" : entity["tx_hash"],
+            "block" : entity["block"],
+            "transaction_index" : entity["tx_index"],
+
+            "ethAmount" : entity["eth"],
+            "curEthLiquidity" : entity["cur_eth_total"],
+
+            "tokenAmount" : entity["tokens"],
+            "curTokenLiquidity" : entity["cur_tokens_total"],
+
+            "ethAmountNorm" : entity.get("eth_norm"),
+            "tokenAmountNorm" : entity.get("tokens_norm"),
+            "curEthLiquidityNorm" : entity.get("cur_eth_norm"),
+            "curTokenLiquidityNorm" : entity.get("cur_tokens_norm"),
+            "priceBefore" : entity.get("price_before"),
+            "priceAfter" : entity.get("price_after")
+        })
+
+    next_cursor = None;
+
+    # a full page may have more after it
+    if ((len(history) == count) and (query_iterator.next_page_token is not None)):
+        next_cursor = query_iterator.next_page_token.decode("ascii");
+
+    return jsonify(history=history, cursor=next_cursor)
@@ -1,6 +1,9 @@
 import json
 import time
 
+from datetime import datetime
+from datetime import timedelta
+
 from eth_utils import (
     add_0x_prefix,
     apply_to_return_value,
@@ -13,8 +16,13 @@ from eth_utils import (
     to_wei,
 )
 
-BLOCKS_DATASET_ID = "blocks_v1"
-BLOCKS_TABLE_ID = "block_data"
+from uniswap.config import PROJECT_ID
+from uniswap.config import TASK_QUEUE_ID
+from uniswap.config import TASK_QUEUE_LOCATION
+from uniswap.config import BLOCKS_DATASET_ID
+from uniswap.config import BLOCKS_TABLE_ID
+
+from uniswap.clients import get_tasks_client
 
 def load_exchange_cache(ds_client, exchange_address):
     exchange_address = to_checksum_address(exchange_address);
@@ -32,6 +40,12 @@ def load_exchange_cache(ds_client, exchange_address):
         exchange_cache = entity;
         break;
 
+    # a newer version may still be waiting in the write-behind buffer
+    if (exchange_cache is not None):
+        from uniswap.write_buffer import get_write_buffer
+
+        exchange_cache = get_write_buffer().get(exchange_cache.key) or exchange_cache;
+
     return exchange_cache;
 
 def load_exchange_info(ds_client, exchange_address):
@@ -58,14 +72,6 @@ def calculate_marginal_rate(eth_liquidity, tokens_liquidity):
     else:
         return 0;
 
-def calculate_rate(eth_liquidity, tokens_liquidity, provider_fee):
-	input_eth_with_fee = 1 - provider_fee
-
-	numerator = input_eth_with_fee * tokens_liquidity
-	denominator = eth_liquidity + input_eth_with_fee
-	print(str(eth_liquidity) + "  " + str(tokens_liquidity));
-	return numerator / denominator;
-
 # Returns table for the blocks_info (block -> timestamp mapping)
 def get_block_info_table(bq_client):
     # get the block info dataset reference
@@ -74,4 +80,27 @@ def get_block_info_table(bq_client):
     # get the block info table reference
     block_table_ref = block_dataset_ref.table(BLOCKS_TABLE_ID);
 
-    return bq_client.get_table(block_table_ref);
\ No newline at end of file
+    return bq_client.get_table(block_table_ref);
+
+# Schedules a cloud task to call the given endpoint in delay_in_seconds
+def schedule_task(delay_in_seconds, endpoint):
+    from google.protobuf import timestamp_pb2
+
+    task_client = get_tasks_client();
+
+    # Convert "seconds from now" into an rfc3339 datetime string.
+    d = datetime.utcnow() + timedelta(seconds=delay_in_seconds);
+    timestamp = timestamp_pb2.Timestamp();
+    timestamp.FromDatetime(d);
+
+    parent = task_client.queue_path(PROJECT_ID, TASK_QUEUE_LOCATION, TASK_QUEUE_ID);
+
+    task = {
+        'app_engine_http_request': {
+            'http_method': 'GET',
+            'relative_uri': endpoint
+        },
+        'schedule_time' : timestamp
+    }
+
+    task_client.create_task(parent, task);
@@ -0,0 +1,99 @@
+import time
+import atexit
+import threading
+
+from uniswap.config import WRITE_BUFFER_FLUSH_SECONDS
+
+from uniswap.clients import get_client
+from uniswap.clients import get_datastore_client
+
+# Write-behind buffer for datastore entities that don't need to be durable before a request returns (eg the
+# ticker cache).
+#
+# put() only records the entity, coalesced by key so an entity written many times between flushes costs one
+# write. A background thread flushes everything pending with put_multi every WRITE_BUFFER_FLUSH_SECONDS, and
+# once more when the process exits. Entities that fail to flush are kept for the next flush unless a newer
+# version has been put since.
+#
+# Crawl checkpoints never go through here, they're written synchronously once their data has landed (see
+# market_stats.put_exchange_with_market_stats).
+
+# datastore's limit on entities per commit
+MAX_ENTITIES_PER_PUT = 500
+
+class WriteBehindBuffer:
+    def __init__(self, flush_seconds=WRITE_BUFFER_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds;
+
+        # key -> latest entity put for it
+        self.pending = {};
+
+        self.lock = threading.Lock();
+
+        # serializes flushes so an older version of an entity can't land after a newer one
+        self.flush_lock = threading.Lock();
+
+        self.thread = None;
+
+    def put(self, entity):
+        with self.lock:
+            self.pending[entity.key] = entity;
+
+            if (self.thread is None):
+                self.thread = threading.Thread(target=self.run, name="write-behind-buffer", daemon=True);
+                self.thread.start();
+
+    # the entity waiting to be written for key, if any, so readers can see their own writes
+    def get(self, key):
+        with self.lock:
+            return self.pending.get(key);
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending);
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                entities = list(self.pending.values());
+
+                self.pending = {};
+
+            if (len(entities) == 0):
+                return 0;
+
+            ds_client = get_datastore_client();
+
+            for start in range(0, len(entities), MAX_ENTITIES_PER_PUT):
+                batch = entities[start:start + MAX_ENTITIES_PER_PUT];
+
+                try:
+                    ds_client.put_multi(batch);
+                except Exception as e:
+                    print("Failed to flush " + str(len(entities) - start) + " buffered entities: " + str(e));
+
+                    # retry on the next flush, unless they've been replaced in the meantime
+                    with self.lock:
+                        for entity in entities[start:]:
+                            self.pending.setdefault(entity.key, entity);
+
+                    return start;
+
+            return len(entities);
+
+    def run(self):
+        while (True):
+            time.sleep(self.flush_seconds);
+
+            self.flush();
+
+def get_write_buffer():
+    return get_client("write_buffer", _create_write_buffer);
+
+def _create_write_buffer():
+    write_buffer = WriteBehindBuffer();
+
+    # flush whatever is left when the worker shuts down
+    atexit.register(write_buffer.flush);
+
+    return write_buffer;